@@ -0,0 +1,304 @@
+# Archivo: account_scheduler.py
+# Ubicación: raíz del proyecto
+# Descripción: Planificador que monitorea varias cuentas de correo en paralelo con un pool de hilos acotado,
+#              sondeo adaptado al tráfico y un cortacircuitos por servidor
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, STATE_VALUES, jittered
+
+
+class AccountLogger:
+    """Envuelve el logger para anteponer la cuenta a cada mensaje"""
+
+    def __init__(self, logger, email_addr):
+        self._logger = logger
+        self._prefix = f"[{email_addr}] "
+
+    def log(self, message, level="INFO"):
+        self._logger.log(self._prefix + message, level=level)
+
+
+class AccountState:
+    """Estado de planificación y estadísticas de una cuenta"""
+
+    def __init__(self, key, account):
+        self.key = key
+        self.account = account
+        self.next_run = 0.0
+        self.failures = 0
+        self.running = False
+        self.idle_supported = True
+        # Intervalo de sondeo vigente (None hasta el primer ciclo)
+        self.poll_interval = None
+        self.stats = {
+            'cycles': 0,
+            'errors': 0,
+            'idle_wakeups': 0,
+            'last_duration': None,
+            'last_success': None,
+            'last_error': None,
+        }
+
+
+class AccountScheduler:
+    # Hilos de trabajo como máximo (una cuenta ocupa un hilo mientras se revisa o espera en IDLE)
+    MAX_WORKERS = 8
+
+    # Sondeo adaptativo (segundos): POLL_INTERVAL al empezar, MIN_POLL_INTERVAL tras un ciclo con correos
+    # con caso y, mientras no llegue nada, cada vez POLL_BACKOFF_FACTOR veces más hasta MAX_POLL_INTERVAL.
+    # Cada espera varía un ±POLL_JITTER para que las cuentas no se sincronicen.
+    POLL_INTERVAL = 30
+    MIN_POLL_INTERVAL = 10
+    MAX_POLL_INTERVAL = 600
+    POLL_BACKOFF_FACTOR = 2
+    POLL_JITTER = 0.1
+
+    # Tras un error se espera ERROR_INTERVAL * 2^(fallos-1) (hasta MAX_BACKOFF) con jitter
+    ERROR_INTERVAL = 60
+    MAX_BACKOFF = 900
+
+    # Cada cuánto revisa el planificador la configuración y las cuentas pendientes
+    TICK = 1.0
+
+    def __init__(self, email_manager, config_manager, logger, max_workers=MAX_WORKERS):
+        """Inicializa el planificador de cuentas"""
+        self.email_manager = email_manager
+        self.config_manager = config_manager
+        self.logger = logger
+        self.max_workers = max_workers
+
+        self._states = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._idle_capacity_logged = False
+
+        # Recarga de casos pedida desde fuera del bucle (SIGHUP); se atiende en el siguiente paso
+        self.reload_requested = False
+
+    @staticmethod
+    def make_key(account):
+        """Construye la clave de una cuenta"""
+        return f"{account['provider']}|{account['email'].lower()}"
+
+    def _sync_accounts(self):
+        """Sincroniza el estado con las cuentas de la configuración; devuelve las vigentes"""
+        accounts = self.config_manager.get_accounts()
+        with self._lock:
+            current = set()
+            for account in accounts:
+                key = self.make_key(account)
+                current.add(key)
+                state = self._states.get(key)
+                if state is None:
+                    self._states[key] = AccountState(key, account)
+                else:
+                    # Contraseña o CC actualizados: se usan a partir del próximo ciclo
+                    state.account = account
+
+            # Las cuentas eliminadas se olvidan cuando terminan lo que estén haciendo
+            for key in list(self._states):
+                if key not in current and not self._states[key].running:
+                    del self._states[key]
+            return [self._states[key] for key in current]
+
+    def get_stats(self):
+        """Devuelve una copia de las estadísticas por cuenta"""
+        with self._lock:
+            return {key: dict(state.stats, failures=state.failures, running=state.running,
+                              poll_interval=state.poll_interval)
+                    for key, state in self._states.items()}
+
+    def run(self, stop_event):
+        """Planifica las cuentas hasta que se active stop_event; cierra el pool al terminar"""
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="account") as executor:
+            while not stop_event.is_set():
+                try:
+                    if self.reload_requested:
+                        self.reload_requested = False
+                        self.logger.log("Recarga de casos solicitada", level="INFO")
+                        self.email_manager.reload_cases()
+
+                    states = self._sync_accounts()
+                    use_idle = self._idle_enabled(len(states))
+
+                    now = time.monotonic()
+                    for state in states:
+                        if state.running or state.next_run > now:
+                            continue
+                        breaker = self._breaker_for(state.account)
+                        if not breaker.allow(now):
+                            # Servidor con el circuito abierto: la cuenta espera a la próxima prueba
+                            state.next_run = max(breaker.open_until, now + self.TICK)
+                            metrics.SCHEDULER_DECISIONS.inc(decision='circuit_skip')
+                            continue
+                        state.running = True
+                        executor.submit(self._run_account, state, stop_event, use_idle)
+                except Exception as e:
+                    self.logger.log(f"Error en el planificador de cuentas: {str(e)}", level="ERROR")
+
+                stop_event.wait(self.TICK)
+
+    def _breaker_for(self, account):
+        """Cortacircuitos del servidor IMAP de la cuenta (compartido por las cuentas del mismo servidor)"""
+        config = self.email_manager.get_provider_config(account['provider'])
+        server = f"{config['imap_server'] or account['provider']}:{config['imap_port']}"
+        with self._lock:
+            breaker = self._breakers.get(server)
+            if breaker is None:
+                breaker = self._breakers[server] = CircuitBreaker(server, on_change=self._on_circuit_change)
+                metrics.CIRCUIT_STATE.set(STATE_VALUES[STATE_CLOSED], server=server)
+            return breaker
+
+    def _record_breaker_result(self, breaker, error):
+        """Anota un ciclo fallido en el cortacircuitos del servidor
+
+        Solo los errores de red cuentan como fallo del servidor. Una contraseña incorrecta u otro
+        error de la cuenta demuestra que el servidor responde: no debe abrir el circuito para las
+        demás cuentas y, si era el ciclo de prueba, lo cierra. La cuenta sigue con su propia espera.
+        """
+        if self.email_manager.is_transport_error(error):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _on_circuit_change(self, breaker, state, delay):
+        """Publica y registra cada cambio de estado de un cortacircuitos"""
+        metrics.CIRCUIT_STATE.set(STATE_VALUES[state], server=breaker.name)
+        metrics.SCHEDULER_DECISIONS.inc(decision=f'circuit_{state}')
+        if state == STATE_OPEN:
+            self.logger.log(
+                f"Circuito abierto para {breaker.name} tras {breaker.failures} fallos seguidos; "
+                f"nueva prueba en {delay:.0f} segundos",
+                level="WARNING"
+            )
+        elif state == STATE_HALF_OPEN:
+            self.logger.log(f"Circuito semiabierto para {breaker.name}: se prueba un ciclo", level="INFO")
+        else:
+            self.logger.log(f"Circuito cerrado para {breaker.name}: el servidor vuelve a responder", level="INFO")
+
+    def _idle_enabled(self, account_count):
+        """Indica si se usa IDLE: lo pide la configuración y hay un hilo para cada cuenta"""
+        if self.config_manager.get_value('monitor_mode', 'idle') != 'idle':
+            return False
+        if account_count > self.max_workers:
+            # IDLE retiene un hilo por cuenta; con más cuentas que hilos se sondea
+            if not self._idle_capacity_logged:
+                self.logger.log(
+                    f"Hay {account_count} cuentas y {self.max_workers} hilos: se usará sondeo en lugar de IDLE",
+                    level="WARNING"
+                )
+                self._idle_capacity_logged = True
+            return False
+        return True
+
+    def run_once(self):
+        """Revisa todas las cuentas una vez en paralelo y espera a que terminen"""
+        states = self._sync_accounts()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="account") as executor:
+            for state in states:
+                state.running = True
+                executor.submit(self._run_account, state, None, False)
+        return all(state.failures == 0 for state in states)
+
+    def _run_account(self, state, stop_event, use_idle):
+        """Ejecuta un ciclo de una cuenta y, si corresponde, espera correo nuevo con IDLE"""
+        account = state.account
+        account_logger = AccountLogger(self.logger, account['email'])
+        breaker = self._breaker_for(account)
+        started = time.monotonic()
+        try:
+            # Sin palabras clave de asunto también se revisa si hay reglas o palabras clave de cuerpo
+            if self.email_manager.has_search_criteria(account_logger):
+                ok = self.email_manager.check_and_process_emails(
+                    account['provider'],
+                    account['email'],
+                    account['password'],
+                    self.email_manager.get_search_keywords(),
+                    account_logger,
+                    account['cc_users']
+                )
+                if ok is False:
+                    # El error ya se registró; solo se aplica la espera antes de reintentar
+                    error = self.email_manager.get_last_cycle_error(account['provider'], account['email'])
+                    self._record_breaker_result(breaker, error)
+                    self._record_failure(state, account_logger, str(error) if error else "ciclo fallido", started)
+                    return
+
+            finished = time.monotonic()
+            breaker.record_success()
+            state.failures = 0
+            state.stats['cycles'] += 1
+            state.stats['last_duration'] = finished - started
+            state.stats['last_success'] = time.time()
+            matches = self.email_manager.get_last_cycle_matches(account['provider'], account['email'])
+            interval = self._next_poll_interval(state, matches, account_logger)
+            state.next_run = finished + interval * random.uniform(1 - self.POLL_JITTER, 1 + self.POLL_JITTER)
+
+            if use_idle and stop_event is not None and state.idle_supported:
+                self._wait_with_idle(state, account_logger, stop_event)
+
+        except Exception as e:
+            account_logger.log(f"Error en el monitoreo: {str(e)}", level="ERROR")
+            self._record_breaker_result(breaker, e)
+            self._record_failure(state, account_logger, str(e), started)
+        finally:
+            state.running = False
+
+    def _next_poll_interval(self, state, matches, account_logger):
+        """Ajusta el intervalo de sondeo de la cuenta según los correos con caso del último ciclo"""
+        previous = state.poll_interval
+        if matches:
+            interval, decision = self.MIN_POLL_INTERVAL, 'poll_fast'
+        elif previous is None:
+            interval, decision = self.POLL_INTERVAL, 'poll_base'
+        else:
+            interval = min(previous * self.POLL_BACKOFF_FACTOR, self.MAX_POLL_INTERVAL)
+            decision = 'poll_slower' if interval > previous else 'poll_max'
+
+        state.poll_interval = interval
+        metrics.POLL_INTERVAL.set(interval, account=state.key)
+        metrics.SCHEDULER_DECISIONS.inc(decision=decision)
+        if interval != previous:
+            account_logger.log(
+                f"Intervalo de sondeo: {interval:.0f} segundos ({matches} correos con caso en el último ciclo)",
+                level="INFO"
+            )
+        return interval
+
+    def _record_failure(self, state, account_logger, error, started):
+        """Registra un fallo y aplaza la cuenta con espera exponencial y jitter"""
+        state.failures += 1
+        state.stats['errors'] += 1
+        state.stats['last_duration'] = time.monotonic() - started
+        state.stats['last_error'] = error
+        delay = jittered(min(self.ERROR_INTERVAL * 2 ** (state.failures - 1), self.MAX_BACKOFF))
+        state.next_run = time.monotonic() + delay
+        metrics.SCHEDULER_DECISIONS.inc(decision='retry_backoff')
+        account_logger.log(f"Reintento en {delay:.0f} segundos (fallos seguidos: {state.failures})",
+                           level="WARNING")
+
+    def _wait_with_idle(self, state, account_logger, stop_event):
+        """Espera correo nuevo con IMAP IDLE; al volver la cuenta queda lista para otro ciclo"""
+        account = state.account
+        result = self.email_manager.wait_for_new_mail(
+            account['provider'],
+            account['email'],
+            account['password'],
+            should_stop=stop_event.is_set
+        )
+        if result is None:
+            state.idle_supported = False
+            account_logger.log(
+                f"El servidor no soporta IDLE, se usará sondeo (entre {self.MIN_POLL_INTERVAL} y "
+                f"{self.MAX_POLL_INTERVAL} segundos según el tráfico)",
+                level="WARNING"
+            )
+            return
+        if result:
+            state.stats['idle_wakeups'] += 1
+            account_logger.log("IDLE: el servidor notificó correo nuevo", level="INFO")
+        state.next_run = 0.0
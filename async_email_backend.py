@@ -0,0 +1,739 @@
+# Archivo: async_email_backend.py
+# Ubicación: raíz del proyecto
+# Descripción: Backend asyncio de IMAP/SMTP: todas las conexiones comparten un bucle de eventos y cada operación
+#              tiene plazo; envoltorios síncronos con la interfaz de imaplib/smtplib que usa EmailManager
+
+import asyncio
+import base64
+import copy
+import email.generator
+import email.utils
+import imaplib
+import io
+import re
+import smtplib
+import ssl
+import threading
+
+# Segundos máximos de cada operación de red (conexión, respuesta del servidor)
+DEFAULT_TIMEOUT = 60
+
+# Segundos que se espera a que el hilo del bucle termine al cerrar el backend
+LOOP_STOP_TIMEOUT = 5
+
+# Formatos de respuesta IMAP (los mismos que reconoce imaplib)
+_TAGGED_RE = re.compile(rb'(?P<tag>A\d+) (?P<type>[A-Z]+)( (?P<data>.*))?', re.ASCII)
+_UNTAGGED_RE = re.compile(rb'\* (?P<type>[A-Z-]+)( (?P<data>.*))?', re.ASCII)
+_UNTAGGED_STATUS_RE = re.compile(rb'\* (?P<data>\d+) (?P<type>[A-Z-]+)( (?P<data2>.*))?', re.ASCII)
+_CONTINUATION_RE = re.compile(rb'\+( (?P<data>.*))?', re.ASCII)
+_LITERAL_RE = re.compile(rb'.*{(?P<size>\d+)}$', re.ASCII)
+_RESPONSE_CODE_RE = re.compile(rb'\[(?P<type>[A-Z-]+)( (?P<data>.*))?\]', re.ASCII)
+_NEW_MAIL_RE = re.compile(rb'^\* \d+ (EXISTS|RECENT)\b', re.IGNORECASE)
+
+# Transparencia SMTP (como smtplib): finales de línea CRLF y punto inicial duplicado
+_EOL_RE = re.compile(rb'(?:\r\n|\n|\r(?!\n))')
+_LEADING_PERIOD_RE = re.compile(rb'(?m)^\.')
+
+
+class _StreamProtocol(asyncio.Protocol):
+    """Conexión con búfer de recepción propio: permite saber sin leer si el servidor envió algo
+
+    readline y readexactly solo consumen datos cuando están completos, así que cancelarlos (por un
+    plazo vencido) no pierde nada.
+    """
+
+    def __init__(self):
+        self.transport = None
+        self.buffer = bytearray()
+        self.closed = False
+        self._waiter = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer.extend(data)
+        self._wake()
+
+    def eof_received(self):
+        self.closed = True
+        self._wake()
+
+    def connection_lost(self, exc):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def _wait_for_data(self):
+        self._waiter = asyncio.get_running_loop().create_future()
+        try:
+            await self._waiter
+        finally:
+            self._waiter = None
+
+    async def readline(self):
+        while True:
+            end = self.buffer.find(b'\n')
+            if end >= 0:
+                line = bytes(self.buffer[:end + 1])
+                del self.buffer[:end + 1]
+                return line
+            if self.closed:
+                raise ConnectionResetError("el servidor cerró la conexión")
+            await self._wait_for_data()
+
+    async def readexactly(self, size):
+        while len(self.buffer) < size:
+            if self.closed:
+                raise ConnectionResetError("el servidor cerró la conexión")
+            await self._wait_for_data()
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def write(self, data):
+        if self.closed or self.transport is None or self.transport.is_closing():
+            raise ConnectionResetError("la conexión está cerrada")
+        self.transport.write(data)
+
+    def has_pending_data(self):
+        return bool(self.buffer) or self.closed
+
+    def close(self):
+        if self.transport is not None:
+            try:
+                self.transport.close()
+            except RuntimeError:
+                # El bucle ya se cerró y con él la conexión
+                pass
+        self.closed = True
+
+
+async def _open_stream(host, port, timeout, ssl_context=None):
+    """Abre una conexión TCP (o TLS) y devuelve su protocolo"""
+    loop = asyncio.get_running_loop()
+    _, protocol = await asyncio.wait_for(
+        loop.create_connection(_StreamProtocol, host, port, ssl=ssl_context,
+                               server_hostname=host if ssl_context else None),
+        timeout)
+    return protocol
+
+
+class AsyncIMAPClient:
+    """Cliente IMAP4rev1 sobre asyncio que reproduce la semántica de imaplib
+
+    Las respuestas se guardan en untagged_responses y los métodos devuelven (estado, datos) con el mismo
+    formato que imaplib (tuplas (prefijo, literal) para los literales), de modo que el código que trabaja
+    con imaplib sirve sin cambios. Los errores de red y los plazos vencidos son imaplib.IMAP4.abort; las
+    respuestas BAD, imaplib.IMAP4.error.
+    """
+
+    def __init__(self, host, port, use_ssl=True, timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.capabilities = ()
+        self.untagged_responses = {}
+        self._protocol = None
+        self._tag_counter = 0
+        self._tagged = None
+
+    # --- E/S ---
+    async def connect(self):
+        """Abre la conexión, lee el saludo y obtiene las capacidades"""
+        context = ssl.create_default_context() if self.use_ssl else None
+        self._protocol = await _open_stream(self.host, self.port, self.timeout, context)
+        try:
+            await self._get_response(None)
+            if 'PREAUTH' not in self.untagged_responses and 'OK' not in self.untagged_responses:
+                raise imaplib.IMAP4.error(f"saludo IMAP inesperado: {self.untagged_responses}")
+            typ, data = await self.capability()
+            if data == [None]:
+                raise imaplib.IMAP4.error("el servidor no envió CAPABILITY")
+            self.capabilities = tuple(data[-1].decode('ascii', 'replace').upper().split())
+        except BaseException:
+            self.shutdown()
+            raise
+        return self
+
+    async def _read_line(self):
+        try:
+            line = await asyncio.wait_for(self._protocol.readline(), self.timeout)
+        except asyncio.TimeoutError:
+            # Con una respuesta a medias la conexión ya no sirve
+            self.shutdown()
+            raise imaplib.IMAP4.abort(f"sin respuesta del servidor en {self.timeout} segundos")
+        except OSError as e:
+            raise imaplib.IMAP4.abort(f"socket error: {e}")
+        return line.rstrip(b'\r\n')
+
+    async def _read_literal(self, size):
+        try:
+            return await asyncio.wait_for(self._protocol.readexactly(size), self.timeout)
+        except asyncio.TimeoutError:
+            self.shutdown()
+            raise imaplib.IMAP4.abort(f"literal incompleto tras {self.timeout} segundos")
+        except OSError as e:
+            raise imaplib.IMAP4.abort(f"socket error: {e}")
+
+    def _send(self, data):
+        try:
+            self._protocol.write(data)
+        except OSError as e:
+            raise imaplib.IMAP4.abort(f"socket error: {e}")
+
+    def _new_tag(self):
+        self._tag_counter += 1
+        return b'A%d' % self._tag_counter
+
+    def _append_untagged(self, typ, data):
+        self.untagged_responses.setdefault(typ, []).append(b'' if data is None else data)
+
+    async def _get_response(self, tag):
+        """Lee una respuesta; devuelve False si era una petición de continuación (+)"""
+        line = await self._read_line()
+        match = _TAGGED_RE.match(line)
+        if match and tag is not None and match.group('tag') == tag:
+            typ = match.group('type').decode('ascii')
+            data = match.group('data') or b''
+            self._tagged = (typ, [data])
+        else:
+            data2 = None
+            match = _UNTAGGED_RE.match(line)
+            if match is None:
+                match = _UNTAGGED_STATUS_RE.match(line)
+                if match is not None:
+                    data2 = match.group('data2')
+            if match is None:
+                if _CONTINUATION_RE.match(line):
+                    return False
+                raise imaplib.IMAP4.abort(f"respuesta inesperada: {line!r}")
+
+            typ = match.group('type').decode('ascii')
+            data = match.group('data') or b''
+            if data2:
+                data = data + b' ' + data2
+            literal = _LITERAL_RE.match(data)
+            while literal:
+                self._append_untagged(typ, (data, await self._read_literal(int(literal.group('size')))))
+                data = await self._read_line()
+                literal = _LITERAL_RE.match(data)
+            self._append_untagged(typ, data)
+
+        # Información entre corchetes: [UIDVALIDITY 123], [READ-WRITE]...
+        if typ in ('OK', 'NO', 'BAD'):
+            code = _RESPONSE_CODE_RE.match(data)
+            if code:
+                self._append_untagged(code.group('type').decode('ascii'), code.group('data'))
+        return True
+
+    def _check_bye(self):
+        bye = self.untagged_responses.get('BYE')
+        if bye:
+            raise imaplib.IMAP4.abort(bye[-1].decode('ascii', 'replace'))
+
+    async def _simple_command(self, name, *args, literal=None):
+        """Envía un comando y espera su respuesta etiquetada; devuelve (estado, [texto])
+
+        literal (bytes) se envía como literal síncrono detrás del último argumento, como imaplib.literal.
+        """
+        for typ in ('OK', 'NO', 'BAD'):
+            self.untagged_responses.pop(typ, None)
+
+        tag = self._new_tag()
+        data = tag + b' ' + name.encode('ascii')
+        for arg in args:
+            if arg is None:
+                continue
+            data += b' ' + (arg.encode('utf-8') if isinstance(arg, str) else arg)
+        if literal is not None:
+            data += b' {%d}' % len(literal)
+
+        logout = name == 'LOGOUT'
+        self._tagged = None
+        self._send(data + b'\r\n')
+        if literal is not None:
+            # Esperar la petición de continuación (o el rechazo) antes de enviar el literal
+            while await self._get_response(tag):
+                if self._tagged is not None:
+                    break
+            else:
+                self._send(literal + b'\r\n')
+
+        while self._tagged is None:
+            if not logout:
+                self._check_bye()
+            elif 'BYE' in self.untagged_responses:
+                return 'BYE', self.untagged_responses.pop('BYE')
+            await self._get_response(tag)
+        if not logout:
+            self._check_bye()
+
+        typ, result = self._tagged
+        if typ == 'BAD':
+            raise imaplib.IMAP4.error(f"{name} command error: {typ} {result}")
+        return typ, result
+
+    def response(self, code):
+        """Devuelve (y olvida) las respuestas recibidas de un tipo, como imaplib.IMAP4.response"""
+        return self._untagged_response(code, [None], code.upper())
+
+    def _untagged_response(self, typ, data, name):
+        if typ == 'NO':
+            return typ, data
+        if name not in self.untagged_responses:
+            return typ, [None]
+        return typ, self.untagged_responses.pop(name)
+
+    # --- Comandos ---
+    async def capability(self):
+        typ, data = await self._simple_command('CAPABILITY')
+        return self._untagged_response(typ, data, 'CAPABILITY')
+
+    async def login(self, user, password):
+        quoted = '"' + password.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        typ, data = await self._simple_command('LOGIN', user, quoted)
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(data[-1])
+        return typ, data
+
+    async def enable(self, capability):
+        if 'ENABLE' not in self.capabilities:
+            raise imaplib.IMAP4.error("Server does not support ENABLE")
+        return await self._simple_command('ENABLE', capability)
+
+    async def select(self, mailbox='INBOX', readonly=False):
+        self.untagged_responses = {}
+        typ, data = await self._simple_command('EXAMINE' if readonly else 'SELECT', mailbox)
+        if typ != 'OK':
+            return typ, data
+        return typ, self.untagged_responses.get('EXISTS', [None])
+
+    async def noop(self):
+        return await self._simple_command('NOOP')
+
+    async def search(self, charset, *criteria, literal=None):
+        args = ('CHARSET', charset) + criteria if charset else criteria
+        typ, data = await self._simple_command('SEARCH', *args, literal=literal)
+        return self._untagged_response(typ, data, 'SEARCH')
+
+    async def fetch(self, message_set, message_parts):
+        typ, data = await self._simple_command('FETCH', message_set, message_parts)
+        return self._untagged_response(typ, data, 'FETCH')
+
+    async def uid(self, command, *args, literal=None):
+        command = command.upper()
+        typ, data = await self._simple_command('UID', command, *args, literal=literal)
+        return self._untagged_response(typ, data, command if command in ('SEARCH', 'SORT', 'THREAD') else 'FETCH')
+
+    async def idle(self, timeout, should_stop=None, tick=1.0):
+        """Espera en IDLE hasta EXISTS/RECENT, el plazo o la parada (semántica de imap_idle.idle_wait)
+
+        Solo ocupa el bucle de eventos: mientras espera, el resto de conexiones siguen atendiéndose.
+        """
+        loop = asyncio.get_running_loop()
+        tag = self._new_tag()
+        new_mail = False
+        self._send(tag + b' IDLE\r\n')
+
+        while True:
+            line = await self._read_line()
+            if line.startswith(b'+'):
+                break
+            if line.startswith(tag + b' '):
+                return None
+            if _NEW_MAIL_RE.match(line):
+                new_mail = True
+
+        deadline = loop.time() + timeout
+        while not new_mail and loop.time() < deadline:
+            if should_stop and should_stop():
+                break
+            try:
+                line = await asyncio.wait_for(self._protocol.readline(),
+                                              min(tick, max(0, deadline - loop.time())))
+            except asyncio.TimeoutError:
+                continue
+            except OSError:
+                raise imaplib.IMAP4.abort('conexión cerrada por el servidor durante IDLE')
+            if line.upper().startswith(b'* BYE'):
+                raise imaplib.IMAP4.abort(line.rstrip(b'\r\n').decode('utf-8', errors='ignore'))
+            if _NEW_MAIL_RE.match(line):
+                new_mail = True
+
+        # Terminar el IDLE y consumir la respuesta etiquetada
+        self._send(b'DONE\r\n')
+        while True:
+            line = await self._read_line()
+            if line.startswith(tag + b' '):
+                if not line[len(tag):].strip().upper().startswith(b'OK'):
+                    raise imaplib.IMAP4.error(line.decode('utf-8', errors='ignore'))
+                return new_mail
+            if _NEW_MAIL_RE.match(line):
+                new_mail = True
+
+    async def logout(self):
+        try:
+            typ, data = await self._simple_command('LOGOUT')
+        except BaseException as e:
+            typ, data = 'NO', [f'{type(e)} - {e}']
+        self.shutdown()
+        return typ, data
+
+    def has_pending_data(self):
+        """Indica si el servidor envió algo fuera de un comando (EXISTS, BYE) o cerró la conexión"""
+        return self._protocol is None or self._protocol.has_pending_data()
+
+    def shutdown(self):
+        if self._protocol is not None:
+            self._protocol.close()
+
+
+class AsyncSMTPClient:
+    """Cliente SMTP sobre asyncio que reproduce la semántica de smtplib (respuestas y excepciones)"""
+
+    def __init__(self, host, port, timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.esmtp_features = {}
+        self._protocol = None
+
+    async def connect(self):
+        """Abre la conexión y lee el saludo del servidor"""
+        self._protocol = await _open_stream(self.host, self.port, self.timeout)
+        code, message = await self.getreply()
+        if code != 220:
+            self.close()
+            raise smtplib.SMTPConnectError(code, message)
+        return self
+
+    async def getreply(self):
+        """Lee una respuesta (posiblemente de varias líneas); devuelve (código, texto)"""
+        lines = []
+        while True:
+            try:
+                line = await asyncio.wait_for(self._protocol.readline(), self.timeout)
+            except asyncio.TimeoutError:
+                self.close()
+                raise TimeoutError(f"sin respuesta del servidor SMTP en {self.timeout} segundos")
+            except OSError:
+                self.close()
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            lines.append(line[4:].strip(b' \t\r\n'))
+            try:
+                code = int(line[:3])
+            except ValueError:
+                code = -1
+                break
+            if line[3:4] != b'-':
+                break
+        return code, b'\n'.join(lines)
+
+    def _send(self, data):
+        try:
+            self._protocol.write(data)
+        except OSError:
+            self.close()
+            raise smtplib.SMTPServerDisconnected('Server not connected')
+
+    async def docmd(self, command, argument=''):
+        self._send(f"{command} {argument}".strip().encode('ascii') + b'\r\n')
+        return await self.getreply()
+
+    async def ehlo(self, name=''):
+        self.esmtp_features = {}
+        code, message = await self.docmd('ehlo', name or 'localhost')
+        if code == 250:
+            for line in message.decode('latin-1').split('\n')[1:]:
+                feature, _, params = line.partition(' ')
+                self.esmtp_features[feature.lower()] = params.strip()
+        return code, message
+
+    async def starttls(self, context=None):
+        if 'starttls' not in self.esmtp_features:
+            raise smtplib.SMTPNotSupportedError("STARTTLS extension not supported by server.")
+        code, message = await self.docmd('STARTTLS')
+        if code != 220:
+            raise smtplib.SMTPResponseException(code, message)
+        loop = asyncio.get_running_loop()
+        context = context or ssl.create_default_context()
+        transport = await asyncio.wait_for(
+            loop.start_tls(self._protocol.transport, self._protocol, context, server_hostname=self.host),
+            self.timeout)
+        self._protocol.transport = transport
+        # Las extensiones anunciadas antes de TLS ya no valen
+        self.esmtp_features = {}
+        return code, message
+
+    async def login(self, user, password):
+        """AUTH PLAIN o, si el servidor no lo ofrece, AUTH LOGIN"""
+        if 'auth' not in self.esmtp_features:
+            raise smtplib.SMTPNotSupportedError("SMTP AUTH extension not supported by server.")
+        mechanisms = self.esmtp_features['auth'].upper().split()
+        last = None
+        for mechanism in ('PLAIN', 'LOGIN'):
+            if mechanism not in mechanisms:
+                continue
+            if mechanism == 'PLAIN':
+                token = base64.b64encode(f"\0{user}\0{password}".encode('utf-8')).decode('ascii')
+                code, message = await self.docmd('AUTH', f'PLAIN {token}')
+            else:
+                code, message = await self.docmd('AUTH', 'LOGIN ' + base64.b64encode(user.encode()).decode())
+                if code == 334:
+                    code, message = await self.docmd(base64.b64encode(password.encode()).decode())
+            if code in (235, 503):
+                return code, message
+            last = (code, message)
+        if last is None:
+            raise smtplib.SMTPException("No suitable authentication method found.")
+        raise smtplib.SMTPAuthenticationError(*last)
+
+    async def noop(self):
+        return await self.docmd('noop')
+
+    async def rset(self):
+        return await self.docmd('rset')
+
+    async def send_message(self, msg, from_addr=None, to_addrs=None):
+        """Envía un email.message.Message tomando remitente y destinatarios de sus cabeceras (como smtplib)"""
+        if from_addr is None:
+            sender = msg['Sender'] if 'Sender' in msg else msg['From']
+            from_addr = email.utils.getaddresses([sender])[0][1]
+        if to_addrs is None:
+            fields = [field for field in (msg['To'], msg['Bcc'], msg['Cc']) if field is not None]
+            to_addrs = [address for _, address in email.utils.getaddresses(fields)]
+        msg_copy = copy.copy(msg)
+        del msg_copy['Bcc']
+        del msg_copy['Resent-Bcc']
+        with io.BytesIO() as data:
+            email.generator.BytesGenerator(data).flatten(msg_copy, linesep='\r\n')
+            flattened = data.getvalue()
+        return await self.sendmail(from_addr, to_addrs, flattened)
+
+    async def sendmail(self, from_addr, to_addrs, msg):
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        code, message = await self.docmd('mail', f'FROM:<{from_addr}>')
+        if code != 250:
+            await self._abort_transaction(code)
+            raise smtplib.SMTPSenderRefused(code, message, from_addr)
+
+        refused = {}
+        for address in to_addrs:
+            code, message = await self.docmd('rcpt', f'TO:<{address}>')
+            if code not in (250, 251):
+                refused[address] = (code, message)
+            if code == 421:
+                self.close()
+                raise smtplib.SMTPRecipientsRefused(refused)
+        if len(refused) == len(to_addrs):
+            await self._abort_transaction(None)
+            raise smtplib.SMTPRecipientsRefused(refused)
+
+        code, message = await self.docmd('data')
+        if code != 354:
+            await self._abort_transaction(code)
+            raise smtplib.SMTPDataError(code, message)
+        data = _LEADING_PERIOD_RE.sub(b'..', _EOL_RE.sub(b'\r\n', msg))
+        if not data.endswith(b'\r\n'):
+            data += b'\r\n'
+        self._send(data + b'.\r\n')
+        code, message = await self.getreply()
+        if code != 250:
+            await self._abort_transaction(code)
+            raise smtplib.SMTPDataError(code, message)
+        return refused
+
+    async def _abort_transaction(self, code):
+        if code == 421:
+            self.close()
+            return
+        try:
+            await self.rset()
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+    async def quit(self):
+        result = await self.docmd('quit')
+        self.close()
+        return result
+
+    def close(self):
+        if self._protocol is not None:
+            self._protocol.close()
+
+
+class IMAPConnection:
+    """Envoltorio síncrono de AsyncIMAPClient con la interfaz de imaplib.IMAP4 que usa el bot"""
+
+    def __init__(self, backend, client):
+        self._backend = backend
+        self.client = client
+        # Literal para el próximo comando, como imaplib.IMAP4.literal
+        self.literal = None
+
+    @property
+    def capabilities(self):
+        return self.client.capabilities
+
+    @property
+    def untagged_responses(self):
+        return self.client.untagged_responses
+
+    def _run(self, coroutine):
+        return self._backend.run(coroutine)
+
+    def login(self, user, password):
+        return self._run(self.client.login(user, password))
+
+    def enable(self, capability):
+        return self._run(self.client.enable(capability))
+
+    def select(self, mailbox='INBOX', readonly=False):
+        return self._run(self.client.select(mailbox, readonly))
+
+    def response(self, code):
+        return self.client.response(code)
+
+    def noop(self):
+        return self._run(self.client.noop())
+
+    def search(self, charset, *criteria):
+        literal, self.literal = self.literal, None
+        return self._run(self.client.search(charset, *criteria, literal=literal))
+
+    def fetch(self, message_set, message_parts):
+        return self._run(self.client.fetch(message_set, message_parts))
+
+    def uid(self, command, *args):
+        literal, self.literal = self.literal, None
+        return self._run(self.client.uid(command, *args, literal=literal))
+
+    def idle_wait(self, timeout, should_stop=None, tick=1.0):
+        """IDLE esperando en el bucle de eventos (lo usa imap_idle.idle_wait)"""
+        return self._run(self.client.idle(timeout, should_stop, tick))
+
+    def has_pending_data(self):
+        return self.client.has_pending_data()
+
+    def logout(self):
+        return self._run(self.client.logout())
+
+    def shutdown(self):
+        self._backend.call_soon(self.client.shutdown)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        try:
+            self.logout()
+        except OSError:
+            pass
+
+
+class SMTPConnection:
+    """Envoltorio síncrono de AsyncSMTPClient con la interfaz de smtplib.SMTP que usa el bot"""
+
+    def __init__(self, backend, client):
+        self._backend = backend
+        self.client = client
+
+    def _run(self, coroutine):
+        return self._backend.run(coroutine)
+
+    def ehlo(self, name=''):
+        return self._run(self.client.ehlo(name))
+
+    def starttls(self, context=None):
+        return self._run(self.client.starttls(context))
+
+    def login(self, user, password):
+        return self._run(self.client.login(user, password))
+
+    def noop(self):
+        return self._run(self.client.noop())
+
+    def rset(self):
+        return self._run(self.client.rset())
+
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        return self._run(self.client.send_message(msg, from_addr, to_addrs))
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        if isinstance(msg, str):
+            msg = msg.encode('ascii')
+        return self._run(self.client.sendmail(from_addr, to_addrs, msg))
+
+    def quit(self):
+        return self._run(self.client.quit())
+
+    def close(self):
+        self._backend.call_soon(self.client.close)
+
+
+class AsyncEmailBackend:
+    """Bucle de eventos en un hilo propio donde viven todas las conexiones IMAP/SMTP del backend
+
+    connect_imap y connect_smtp devuelven envoltorios síncronos: el hilo que llama espera solo a su
+    operación mientras el bucle atiende a la vez a todas las demás conexiones. Las corrutinas de
+    AsyncIMAPClient/AsyncSMTPClient también se pueden lanzar juntas desde una corrutina con asyncio.gather.
+    El bucle se arranca con la primera operación y close() lo detiene (se vuelve a arrancar si hace falta).
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, daemon=True,
+                                                name="email-async-loop")
+                self._thread.start()
+            return self._loop
+
+    def run(self, coroutine):
+        """Ejecuta una corrutina en el bucle y espera su resultado (o su excepción)"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("run() no se puede llamar desde el propio bucle de eventos")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._get_loop()).result()
+
+    def call_soon(self, callback):
+        """Ejecuta una función sin E/S en el bucle (p. ej. cerrar un transporte) sin esperar"""
+        with self._lock:
+            loop = self._loop if self._thread is not None and self._thread.is_alive() else None
+        if loop is not None:
+            loop.call_soon_threadsafe(callback)
+        else:
+            callback()
+
+    def connect_imap(self, host, port, use_ssl=True):
+        """Abre una conexión IMAP (saludo y CAPABILITY hechos) y devuelve su envoltorio síncrono"""
+        client = AsyncIMAPClient(host, port, use_ssl, self.timeout)
+        return IMAPConnection(self, self.run(client.connect()))
+
+    def connect_smtp(self, host, port):
+        """Abre una conexión SMTP (saludo leído, sin EHLO) y devuelve su envoltorio síncrono"""
+        client = AsyncSMTPClient(host, port, self.timeout)
+        return SMTPConnection(self, self.run(client.connect()))
+
+    def close(self):
+        """Detiene el bucle de eventos (las conexiones se deben cerrar antes)"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._thread = None
+        if thread is None or not thread.is_alive():
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(LOOP_STOP_TIMEOUT)
+        if not thread.is_alive():
+            loop.close()
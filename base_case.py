@@ -2,17 +2,23 @@
 # Ubicación: raíz del proyecto
 # Descripción: Clase base reutilizable para los casos de respuesta automática
 
-from config_manager import ConfigManager
+from config_manager import ConfigManager, normalize_keywords
+from reply_templates import REPLY_TEMPLATES
+from body_text import BODY_PREFIX_BYTES
 
 
 class BaseCase:
     """Implementa comportamiento común para los casos"""
 
-    def __init__(self, name, description, config_key, response_message):
+    # Prioridad por defecto: ante varias coincidencias gana el caso con el número menor
+    DEFAULT_PRIORITY = 100
+
+    def __init__(self, name, description, config_key, response_message, priority=DEFAULT_PRIORITY):
         self._name = name
         self._description = description
         self._config_key = config_key
         self._response_message = response_message
+        self._priority = priority
 
     # --- Métodos de acceso ---
     def get_name(self):
@@ -21,20 +27,40 @@ class BaseCase:
     def get_description(self):
         return self._description
 
+    def get_config_key(self):
+        return self._config_key
+
+    def get_priority(self):
+        return self._priority
+
     def get_search_keywords(self):
         try:
-            config = ConfigManager().load_config()
-            keyword = config.get('search_params', {}).get(self._config_key, '').strip()
-            return [keyword] if keyword else []
+            search_params = ConfigManager().get_search_params()
+            return normalize_keywords(search_params.get(self._config_key, ''))
         except Exception as e:
             print(f"Error al cargar palabras clave para {self._config_key}: {e}")
             return []
 
+    def get_body_keywords(self):
+        """Palabras clave que se buscan en el comienzo del cuerpo cuando el asunto no decide el caso"""
+        try:
+            body_params = ConfigManager().get_body_params()
+            return normalize_keywords(body_params.get(self._config_key, ''))
+        except Exception as e:
+            print(f"Error al cargar palabras clave de cuerpo para {self._config_key}: {e}")
+            return []
+
+    def get_body_fetch_bytes(self):
+        """Bytes del cuerpo que necesita revisar el caso"""
+        return BODY_PREFIX_BYTES
+
     def get_response_message(self):
         return self._response_message
 
     def set_response_message(self, message):
         self._response_message = message
+        # Las plantillas MIME con el cuerpo anterior ya no sirven
+        REPLY_TEMPLATES.invalidate()
 
     # --- Procesamiento ---
     def process_email(self, email_data, logger):
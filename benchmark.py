@@ -0,0 +1,241 @@
+# Archivo: benchmark.py
+# Ubicación: raíz del proyecto
+# Descripción: Benchmark de extremo a extremo de check_and_process_emails contra servidores IMAP/SMTP locales
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import metrics
+from config_manager import ConfigManager, flush_all_pending
+from email_manager import EmailManager
+from fake_mail_servers import FakeIMAPServer, FakeSMTPServer, build_message
+
+# Nombre del proveedor que apunta a los servidores locales
+BENCH_PROVIDER = 'Benchmark'
+BENCH_EMAIL = 'bot@example.com'
+BENCH_PASSWORD = 'secret'
+
+# Etapas cuyo tiempo total se incluye en los resultados
+BENCH_STAGES = ('login', 'search', 'fetch_headers', 'fetch_body', 'match', 'journal', 'store', 'send', 'cycle')
+
+# Ciclos como máximo antes de dar el benchmark por atascado
+MAX_CYCLES = 1000
+
+
+class QuietLogger:
+    """Logger que solo cuenta mensajes por nivel (para no medir la consola)"""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.counts = {}
+
+    def log(self, message, level="INFO"):
+        self.counts[level] = self.counts.get(level, 0) + 1
+        if self.verbose or level == "ERROR":
+            print(f"[{level}] {message}")
+
+
+def parse_args(argv=None):
+    """Interpreta los argumentos del benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo del bot de correo")
+    parser.add_argument("--messages", type=int, default=500, help="Mensajes coincidentes a sembrar (N)")
+    parser.add_argument("--cases", type=int, default=2, help="Palabras clave / casos coincidentes (M)")
+    parser.add_argument("--noise", type=int, default=0, help="Mensajes adicionales que no coinciden")
+    parser.add_argument("--latency", type=float, default=0.002,
+                        help="Latencia inyectada por comando en los servidores (segundos)")
+    parser.add_argument("--output", default=None, help="Archivo JSON de resultados (por defecto bench_results/)")
+    parser.add_argument("--compare", default=None, help="JSON de una ejecución anterior para comparar")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Caída máxima tolerada de mensajes/s frente a --compare (0.10 = 10 %%)")
+    parser.add_argument("--backend", choices=("sync", "async"), default="sync",
+                        help="Backend de red del bot (email_backend): imaplib/smtplib o asyncio")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar los mensajes del bot")
+    return parser.parse_args(argv)
+
+
+def percentile(values, fraction):
+    """Percentil por el método del rango más cercano"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def git_revision():
+    """Commit actual del repositorio, si se puede obtener"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(messages, cases, noise=0, latency=0.002, verbose=False, backend='sync'):
+    """Siembra el buzón, procesa todo el correo y devuelve las métricas"""
+    imap_server = FakeIMAPServer(latency=latency, users={BENCH_EMAIL: BENCH_PASSWORD}).start()
+    smtp_server = FakeSMTPServer(latency=latency, users={BENCH_EMAIL: BENCH_PASSWORD}).start()
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    previous_dir = os.getcwd()
+    try:
+        # Config, punto de sincronización y bandeja de salida propios, sin tocar los del usuario
+        os.chdir(workdir)
+        ConfigManager.set_default_config_file(os.path.join(workdir, "config.json"))
+
+        # EmailManager elige el backend de red al crearse
+        ConfigManager().save_config({'email_backend': backend})
+        flush_all_pending()
+        email_manager = EmailManager()
+        # Las palabras clave se guardan en search_params bajo la clave de configuración de cada caso
+        available_cases = sorted(case.get_config_key() for case in email_manager.case_handler.cases.values())
+        if not available_cases:
+            raise RuntimeError("No hay casos cargados para el benchmark")
+
+        # Las M palabras clave se reparten entre los casos disponibles
+        keywords = [f"consulta{index}" for index in range(cases)]
+        search_params = {}
+        for index, keyword in enumerate(keywords):
+            search_params.setdefault(available_cases[index % len(available_cases)], []).append(keyword)
+        config_manager = ConfigManager()
+        config_manager.save_config({
+            'provider': BENCH_PROVIDER,
+            'email': BENCH_EMAIL,
+            'password': BENCH_PASSWORD,
+            'search_params': search_params,
+            'email_backend': backend
+        })
+        flush_all_pending()
+
+        imap_host, imap_port = imap_server.address
+        smtp_host, smtp_port = smtp_server.address
+        email_manager.provider_configs[BENCH_PROVIDER] = {
+            'imap_server': imap_host,
+            'imap_port': imap_port,
+            'imap_ssl': False,
+            'smtp_server': smtp_host,
+            'smtp_port': smtp_port,
+            'smtp_starttls': False,
+            # Sin límite efectivo: se mide el bot, no el limitador
+            'send_rate_per_minute': 10 ** 9,
+            'send_burst': 10 ** 6
+        }
+
+        for index in range(messages):
+            imap_server.inbox.append(build_message(f"Pedido {index}: {keywords[index % len(keywords)]}",
+                                                   sender=f"cliente{index}@example.com"))
+        for index in range(noise):
+            imap_server.inbox.append(build_message(f"Boletín {index}", sender=f"otro{index}@example.com"))
+
+        logger = QuietLogger(verbose)
+        search_titles = email_manager.get_search_keywords()
+        started = time.monotonic()
+        cycles = 0
+        while len(smtp_server.received) < messages and cycles < MAX_CYCLES:
+            cycles += 1
+            replies_before = len(smtp_server.received)
+            email_manager.check_and_process_emails(BENCH_PROVIDER, BENCH_EMAIL, BENCH_PASSWORD,
+                                                   search_titles, logger, [])
+            email_manager.send_queue.wait_empty()
+            # Un ciclo sin respuestas nuevas indica que ya no queda nada por procesar
+            if len(smtp_server.received) == replies_before:
+                break
+        email_manager.close_connections()
+        elapsed = time.monotonic() - started
+
+        replies = len(smtp_server.received)
+        latencies = [delivery['received_at'] - started for delivery in smtp_server.received]
+        imap_commands = imap_server.total_commands()
+        smtp_commands = smtp_server.total_commands()
+
+        return {
+            'replies': replies,
+            'cycles': cycles,
+            'elapsed_seconds': elapsed,
+            'messages_per_second': replies / elapsed if elapsed > 0 else None,
+            'reply_latency_p50': percentile(latencies, 0.50),
+            'reply_latency_p99': percentile(latencies, 0.99),
+            'imap_commands': imap_commands,
+            'smtp_commands': smtp_commands,
+            'imap_round_trips_per_message': imap_commands / messages if messages else None,
+            'smtp_round_trips_per_message': smtp_commands / messages if messages else None,
+            'imap_command_counts': dict(imap_server.command_counts),
+            'stage_seconds': {stage: metrics.STAGE_DURATION.snapshot(stage=stage)[1] for stage in BENCH_STAGES},
+            'errors_logged': logger.counts.get("ERROR", 0)
+        }
+    finally:
+        os.chdir(previous_dir)
+        imap_server.stop()
+        smtp_server.stop()
+
+
+def compare_results(current, previous, max_regression):
+    """Compara con una ejecución anterior; devuelve False si el rendimiento empeoró más de lo tolerado"""
+    ok = True
+    for metric in ('messages_per_second', 'reply_latency_p50', 'reply_latency_p99',
+                   'imap_round_trips_per_message', 'smtp_round_trips_per_message'):
+        before = previous['results'].get(metric)
+        after = current['results'].get(metric)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        print(f"{metric}: {before:.4f} -> {after:.4f} ({change:+.1%})")
+
+    before = previous['results'].get('messages_per_second')
+    after = current['results'].get('messages_per_second')
+    if before and after is not None and after < before * (1 - max_regression):
+        print(f"Regresión: mensajes/s cayó más de un {max_regression:.0%}")
+        ok = False
+    return ok
+
+
+def main(argv=None):
+    """Ejecuta el benchmark, guarda el JSON y devuelve el código de salida"""
+    args = parse_args(argv)
+    results = run_benchmark(args.messages, args.cases, args.noise, args.latency, args.verbose, args.backend)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'parameters': {
+            'messages': args.messages,
+            'cases': args.cases,
+            'noise': args.noise,
+            'latency': args.latency,
+            'backend': args.backend
+        },
+        'results': results
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs("bench_results", exist_ok=True)
+        output = os.path.join("bench_results", f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=4)
+
+    print(f"Respuestas: {results['replies']}/{args.messages} en {results['elapsed_seconds']:.2f} s "
+          f"({results['messages_per_second'] or 0:.1f} mensajes/s)")
+    if results['replies']:
+        print(f"Latencia de respuesta p50/p99: {results['reply_latency_p50']:.3f} s / "
+              f"{results['reply_latency_p99']:.3f} s")
+    print(f"Comandos por mensaje: IMAP {results['imap_round_trips_per_message']:.2f}, "
+          f"SMTP {results['smtp_round_trips_per_message']:.2f}")
+    print(f"Resultados guardados en {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            previous = json.load(file)
+        if not compare_results(report, previous, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
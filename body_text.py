@@ -0,0 +1,104 @@
+# Archivo: body_text.py
+# Ubicación: raíz del proyecto
+# Descripción: Decodificación del comienzo del cuerpo de un correo (BODY.PEEK[TEXT]<0.N>) para buscar palabras clave
+
+import binascii
+import codecs
+import html
+import re
+from email.message import Message
+from header_parser import parse_header_fields
+
+# Bytes del cuerpo que se descargan como máximo por mensaje
+BODY_PREFIX_BYTES = 4096
+
+# Niveles de multipart anidados que se recorren buscando la parte de texto
+MAX_MULTIPART_DEPTH = 3
+
+_TAG_RE = re.compile(r'<[^>]*>')
+_BASE64_JUNK_RE = re.compile(rb'[^A-Za-z0-9+/=]')
+
+
+def body_fetch_items(size=BODY_PREFIX_BYTES):
+    """Elemento de UID FETCH que pide los primeros size bytes del cuerpo sin marcar el mensaje como leído"""
+    return f'(UID BODY.PEEK[TEXT]<0.{int(size)}>)'
+
+
+def _content_info(content_type):
+    """Devuelve (tipo MIME, charset, boundary) de una cabecera Content-Type"""
+    message = Message()
+    message['Content-Type'] = content_type or 'text/plain'
+    return message.get_content_type(), message.get_content_charset() or 'utf-8', message.get_param('boundary')
+
+
+def _transfer_decode(data, transfer_encoding):
+    """Deshace la codificación de transferencia de un fragmento que puede estar cortado al final"""
+    encoding = (transfer_encoding or '').strip().lower()
+    if encoding == 'base64':
+        data = _BASE64_JUNK_RE.sub(b'', data)
+        # Solo grupos completos de 4 caracteres: el último puede estar a medias
+        data = data[:len(data) - len(data) % 4]
+        try:
+            return binascii.a2b_base64(data)
+        except binascii.Error:
+            return b''
+    if encoding == 'quoted-printable':
+        # Un "=" o "=X" final cortado se descarta en lugar de mostrarse
+        cut = data.rfind(b'=', max(0, len(data) - 2))
+        if cut >= 0 and not data[cut:].rstrip(b'\r\n').endswith(b'=') and len(data) - cut < 3:
+            data = data[:cut]
+        return binascii.a2b_qp(data)
+    return data
+
+
+def _charset_decode(data, charset):
+    """Decodifica con un decodificador incremental: una secuencia multibyte cortada al final no genera basura"""
+    try:
+        decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    return decoder.decode(data, final=False)
+
+
+def decode_text_prefix(raw, content_type='', transfer_encoding='', depth=0):
+    """Convierte el comienzo del cuerpo en texto plano
+
+    raw son los bytes de BODY[TEXT]<0.N>; content_type y transfer_encoding vienen de las cabeceras del
+    mensaje. En un multipart se usa la primera parte text/* (con sus propias cabeceras); el HTML se
+    reduce a texto quitando las etiquetas. Devuelve '' si no hay texto que revisar.
+    """
+    if not raw:
+        return ''
+    mime_type, charset, boundary = _content_info(content_type)
+
+    if mime_type.startswith('multipart/'):
+        if not boundary or depth >= MAX_MULTIPART_DEPTH:
+            return ''
+        delimiter = b'--' + boundary.encode('ascii', errors='ignore')
+        # El preámbulo va antes del primer delimitador; el prefijo puede terminar en mitad de una parte
+        for part in raw.split(delimiter)[1:]:
+            if part.startswith(b'--'):
+                break
+            header_end = part.find(b'\r\n\r\n')
+            separator_length = 4
+            if header_end < 0:
+                header_end = part.find(b'\n\n')
+                separator_length = 2
+            if header_end < 0:
+                # Cabeceras de la parte cortadas: no hay cuerpo que leer
+                break
+            headers = parse_header_fields(part[:header_end + separator_length].lstrip(b'\r\n'))
+            text = decode_text_prefix(part[header_end + separator_length:],
+                                      headers.get('content-type', 'text/plain'),
+                                      headers.get('content-transfer-encoding', ''), depth + 1)
+            if text:
+                return text
+        return ''
+
+    if not mime_type.startswith('text/'):
+        return ''
+
+    text = _charset_decode(_transfer_decode(raw, transfer_encoding), charset)
+    if mime_type == 'text/html':
+        text = html.unescape(_TAG_RE.sub(' ', text))
+    return text
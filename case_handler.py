@@ -3,46 +3,134 @@
 # Descripción: Manejador principal para cargar y ejecutar casos de respuesta automática
 
 import os
+import hashlib
 import importlib.util
+import threading
+from config_manager import ConfigManager
+from keyword_matcher import KeywordMatcher
+from rule_engine import RuleEngine
 
 
 class CaseHandler:
-    def __init__(self):
-        """Inicializa el manejador de casos"""
+    def __init__(self, dedup_cache=None, cases_dir=None):
+        """Inicializa el manejador de casos
+
+        dedup_cache (opcional) es la caché de correos ya respondidos que se consulta antes de ejecutar un caso.
+        cases_dir es el directorio de los archivos case*.py (por defecto, el del proyecto).
+        """
         self.cases = {}
+        self.cases_dir = cases_dir or os.path.dirname(os.path.abspath(__file__))
+        self.config_manager = ConfigManager()
+        self.dedup_cache = dedup_cache
+
+        # Huella de cada archivo cargado: {caso: (mtime_ns, tamaño, sha256)}
+        self._sources = {}
+        # Protege el intercambio del registro de casos y del buscador
+        self._lock = threading.Lock()
+
+        # Buscador compilado y la configuración con la que se construyó
+        self._matcher = None
+        self._matcher_params = None
+        # Prioridad y palabras clave de cada caso para esa configuración: {caso: (prioridad, palabras)}
+        self._keyword_entries = {}
+
+        # Buscador de palabras clave de cuerpo y la configuración con la que se construyó
+        self._body_matcher = None
+        self._body_matcher_params = None
+
+        # Reglas declarativas compiladas y la configuración de la que salieron
+        self._rule_engine = None
+        self._rule_engine_params = None
+
         self.load_cases()
 
     def load_cases(self):
-        """Carga todos los archivos de casos disponibles"""
+        """Carga los archivos de casos; solo vuelve a importar los que cambiaron desde la última carga
+
+        El nuevo registro se construye aparte y se intercambia de una vez, así que una búsqueda en
+        curso sigue viendo el registro anterior completo.
+        """
         try:
-            # Obtener todos los archivos case*.py en el directorio actual
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            case_files = [f for f in os.listdir(current_dir) if
-                          f.startswith('case') and f.endswith('.py') and f != 'case_handler.py']
+            # Obtener todos los archivos case*.py del directorio de casos
+            current_dir = self.cases_dir
+            case_files = sorted(f for f in os.listdir(current_dir) if
+                                f.startswith('case') and f.endswith('.py') and f != 'case_handler.py')
+        except Exception as e:
+            print(f"Error al cargar casos: {str(e)}")
+            return
 
-            for case_file in case_files:
-                try:
-                    # Extraer el número del caso del nombre del archivo
-                    case_name = case_file[:-3]  # Remover .py
-
-                    # Cargar el módulo dinámicamente
-                    case_path = os.path.join(current_dir, case_file)
-                    spec = importlib.util.spec_from_file_location(case_name, case_path)
-                    case_module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(case_module)
-
-                    # Verificar que el módulo tenga la clase Case
-                    if hasattr(case_module, 'Case'):
-                        self.cases[case_name] = case_module.Case()
-                        print(f"Caso cargado: {case_name}")
-                    else:
-                        print(f"Error: {case_file} no tiene la clase Case")
+        new_cases = {}
+        new_sources = {}
+        changed = set()
+        for case_file in case_files:
+            # Nombre del caso: el archivo sin .py
+            case_name = case_file[:-3]
+            case_path = os.path.join(current_dir, case_file)
+            previous = self._sources.get(case_name)
+            try:
+                stat = os.stat(case_path)
+                if previous and previous[:2] == (stat.st_mtime_ns, stat.st_size) and case_name in self.cases:
+                    # Sin cambios: se conserva el caso ya cargado
+                    new_cases[case_name] = self.cases[case_name]
+                    new_sources[case_name] = previous
+                    continue
 
-                except Exception as e:
-                    print(f"Error al cargar caso {case_file}: {str(e)}")
+                with open(case_path, 'rb') as file:
+                    source = file.read()
+                digest = hashlib.sha256(source).hexdigest()
+                if previous and previous[2] == digest and case_name in self.cases:
+                    # Solo cambió la fecha (p. ej. un touch o un checkout): no hace falta reimportar
+                    new_cases[case_name] = self.cases[case_name]
+                    new_sources[case_name] = (stat.st_mtime_ns, stat.st_size, digest)
+                    continue
 
-        except Exception as e:
-            print(f"Error al cargar casos: {str(e)}")
+                case_obj = self._load_case(case_name, case_path, source)
+                if case_obj is not None:
+                    new_cases[case_name] = case_obj
+                    new_sources[case_name] = (stat.st_mtime_ns, stat.st_size, digest)
+                    changed.add(case_name)
+                    print(f"Caso cargado: {case_name}")
+                    continue
+                print(f"Error: {case_file} no tiene la clase Case")
+
+            except Exception as e:
+                print(f"Error al cargar caso {case_file}: {str(e)}")
+
+            # Si la nueva versión no se pudo cargar se mantiene la anterior (y se reintenta en la próxima recarga)
+            if case_name in self.cases:
+                new_cases[case_name] = self.cases[case_name]
+                new_sources[case_name] = previous
+
+        removed = set(self.cases) - set(new_cases)
+        for case_name in sorted(removed):
+            print(f"Caso eliminado: {case_name}")
+
+        with self._lock:
+            self.cases = new_cases
+            self._sources = new_sources
+            if changed or removed:
+                # Solo se recalculan las palabras clave de los casos nuevos, cambiados o eliminados
+                for case_name in changed | removed:
+                    self._keyword_entries.pop(case_name, None)
+                self._matcher = None
+                self._body_matcher = None
+                self._rule_engine = None
+
+    @staticmethod
+    def _load_case(case_name, case_path, source):
+        """Ejecuta el código de un archivo de caso y devuelve su instancia de Case (o None si no la tiene)
+
+        Se compila el mismo contenido con el que se calculó la huella, sin pasar por la caché de
+        bytecode, que no distingue dos versiones guardadas en el mismo segundo con igual tamaño.
+        """
+        spec = importlib.util.spec_from_file_location(case_name, case_path)
+        case_module = importlib.util.module_from_spec(spec)
+        exec(compile(source, case_path, 'exec'), case_module.__dict__)
+
+        # Verificar que el módulo tenga la clase Case
+        if not hasattr(case_module, 'Case'):
+            return None
+        return case_module.Case()
 
     def get_available_cases(self):
         """Obtiene la lista de casos disponibles"""
@@ -60,7 +148,12 @@ class CaseHandler:
         return None
 
     def execute_case(self, case_name, email_data, logger):
-        """Ejecuta un caso específico"""
+        """Ejecuta un caso específico (nada si el correo ya se respondió)"""
+        dedup_keys = email_data.get('dedup_keys')
+        if self.dedup_cache is not None and dedup_keys and self.dedup_cache.contains(dedup_keys):
+            logger.log(f"El email '{email_data.get('subject', '')}' ya fue respondido, no se ejecuta {case_name}",
+                       level="WARNING")
+            return False
         if case_name in self.cases:
             try:
                 case_obj = self.cases[case_name]
@@ -73,21 +166,171 @@ class CaseHandler:
             return False
 
     def find_matching_case(self, subject, logger):
-        """Busca el primer caso que coincida con el asunto del email"""
-        for case_name, case_obj in self.cases.items():
+        """Busca el caso de mayor prioridad cuyas palabras clave aparezcan en el asunto del email"""
+        try:
+            match = self.get_matcher(logger).find_best(subject)
+        except Exception as e:
+            logger.log(f"Error al buscar caso para el asunto '{subject}': {str(e)}", level="ERROR")
+            return None
+
+        if match is None:
+            return None
+
+        case_name, keyword = match
+        logger.log(f"Caso encontrado: {case_name} para palabra clave: {keyword}", level="INFO")
+        return case_name
+
+    def find_matching_case_in_body(self, body_text, logger):
+        """Busca el caso de mayor prioridad cuyas palabras clave de cuerpo aparezcan en el texto"""
+        try:
+            match = self.get_body_matcher(logger).find_best(body_text)
+        except Exception as e:
+            logger.log(f"Error al buscar caso en el cuerpo del email: {str(e)}", level="ERROR")
+            return None
+
+        if match is None:
+            return None
+
+        case_name, keyword = match
+        logger.log(f"Caso encontrado: {case_name} para palabra clave de cuerpo: {keyword}", level="INFO")
+        return case_name
+
+    def get_body_fetch_bytes(self):
+        """Bytes del cuerpo que hay que descargar para los casos con palabras clave de cuerpo"""
+        sizes = [case_obj.get_body_fetch_bytes() for case_obj in self.cases.values()
+                 if case_obj.get_body_keywords()]
+        return max(sizes) if sizes else 0
+
+    def get_body_matcher(self, logger=None):
+        """Devuelve el buscador de palabras clave de cuerpo, reconstruyéndolo si cambió algo"""
+        body_params = self.config_manager.get_body_params()
+        with self._lock:
+            if self._body_matcher is None or body_params != self._body_matcher_params:
+                self._body_matcher = self._build_body_matcher(logger)
+                self._body_matcher_params = body_params
+            return self._body_matcher
+
+    def _build_body_matcher(self, logger=None):
+        entries = []
+        for case_name, case_obj in sorted(self.cases.items(), key=lambda item: (item[1].get_priority(), item[0])):
             try:
-                keywords = case_obj.get_search_keywords()
-                for keyword in keywords:
-                    if keyword.lower() in subject.lower():
-                        logger.log(f"Caso encontrado: {case_name} para palabra clave: {keyword}", level="INFO")
-                        return case_name
+                entries.append((case_obj.get_priority(), case_name, case_obj.get_body_keywords()))
             except Exception as e:
-                logger.log(f"Error al verificar caso {case_name}: {str(e)}", level="ERROR")
+                message = f"Error al obtener palabras clave de cuerpo del caso {case_name}: {str(e)}"
+                if logger:
+                    logger.log(message, level="ERROR")
+                else:
+                    print(message)
+        return KeywordMatcher(entries)
+
+    def match_rules(self, rows, logger):
+        """Asigna caso a un lote de correos (MessageRow) con las reglas declarativas; devuelve [caso o None]"""
+        engine = self.get_rule_engine(logger)
+        if not len(engine):
+            return [None] * len(rows)
+        try:
+            decisions = engine.evaluate_batch(rows)
+        except Exception as e:
+            logger.log(f"Error al evaluar las reglas: {str(e)}", level="ERROR")
+            return [None] * len(rows)
+
+        cases = []
+        for decision in decisions:
+            if decision is None:
+                cases.append(None)
                 continue
+            case_name, rule_name = decision
+            logger.log(f"Caso encontrado: {case_name} por la regla: {rule_name}", level="INFO")
+            cases.append(case_name)
+        return cases
 
-        return None
+    def has_rules(self, logger=None):
+        """Indica si hay reglas declarativas activas"""
+        return len(self.get_rule_engine(logger)) > 0
+
+    def get_rule_header_fields(self):
+        """Cabeceras adicionales que consultan las reglas"""
+        return self.get_rule_engine().header_fields
+
+    def get_rule_engine(self, logger=None):
+        """Devuelve las reglas compiladas, recompilándolas si cambió la configuración o los casos"""
+        rules = self.config_manager.get_rules()
+        with self._lock:
+            if self._rule_engine is not None and rules == self._rule_engine_params:
+                return self._rule_engine
+            # Una regla puede nombrar el caso por su archivo (case1) o por su clave de configuración (caso1)
+            aliases = {}
+            for case_name, case_obj in self.cases.items():
+                aliases[case_obj.get_config_key()] = case_name
+                aliases[case_name] = case_name
+            engine = RuleEngine(rules, aliases)
+            self._rule_engine = engine
+            self._rule_engine_params = rules
+
+        for error in engine.errors:
+            if logger:
+                logger.log(f"Error en la configuración de reglas: {error}", level="ERROR")
+            else:
+                print(f"Error en la configuración de reglas: {error}")
+        return engine
+
+    def get_matcher(self, logger=None):
+        """Devuelve el buscador compilado, reconstruyéndolo si cambiaron los casos o sus palabras clave"""
+        search_params = self.config_manager.get_search_params()
+        with self._lock:
+            if self._matcher is not None and search_params == self._matcher_params:
+                return self._matcher
+            if search_params != self._matcher_params:
+                # Con otra configuración cambian las palabras clave de todos los casos
+                self._keyword_entries = {}
+            self._matcher = self._build_matcher(logger)
+            self._matcher_params = search_params
+            return self._matcher
+
+    def _build_matcher(self, logger=None):
+        """Compila las palabras clave de todos los casos ordenados por prioridad y nombre
+
+        Reutiliza las palabras clave ya calculadas de los casos que no cambiaron.
+        """
+        entries = []
+        for case_name, case_obj in sorted(self.cases.items(), key=lambda item: (item[1].get_priority(), item[0])):
+            entry = self._keyword_entries.get(case_name)
+            if entry is None:
+                try:
+                    entry = self._keyword_entries[case_name] = (case_obj.get_priority(),
+                                                                case_obj.get_search_keywords())
+                except Exception as e:
+                    message = f"Error al obtener palabras clave del caso {case_name}: {str(e)}"
+                    if logger:
+                        logger.log(message, level="ERROR")
+                    else:
+                        print(message)
+                    continue
+            entries.append((entry[0], case_name, entry[1]))
+        return KeywordMatcher(entries)
+
+    def has_any_criteria(self, logger=None):
+        """Indica si hay algo con qué identificar correos: palabras clave de asunto o de cuerpo, o reglas"""
+        return bool(self.get_all_search_keywords() or self.get_all_body_keywords()) or self.has_rules(logger)
+
+    def get_all_search_keywords(self):
+        """Obtiene las palabras clave de todos los casos, sin repetir y en orden de prioridad"""
+        keywords = []
+        for case_name, case_obj in sorted(self.cases.items(), key=lambda item: (item[1].get_priority(), item[0])):
+            for keyword in case_obj.get_search_keywords():
+                if keyword not in keywords:
+                    keywords.append(keyword)
+        return keywords
+
+    def get_all_body_keywords(self):
+        """Obtiene las palabras clave de cuerpo de todos los casos, sin repetir y en orden de prioridad"""
+        keywords = []
+        for case_name, case_obj in sorted(self.cases.items(), key=lambda item: (item[1].get_priority(), item[0])):
+            for keyword in case_obj.get_body_keywords():
+                if keyword not in keywords:
+                    keywords.append(keyword)
+        return keywords
 
     def reload_cases(self):
-        """Recarga todos los casos disponibles"""
-        self.cases.clear()
+        """Recarga los casos disponibles (solo se reimportan los archivos que cambiaron)"""
         self.load_cases()
\ No newline at end of file
@@ -0,0 +1,108 @@
+# Archivo: circuit_breaker.py
+# Ubicación: raíz del proyecto
+# Descripción: Cortacircuitos por proveedor con espera exponencial y jitter para no insistir con un servidor caído
+
+import random
+import threading
+import time
+
+# Estados del cortacircuitos
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+# Valor numérico de cada estado para las métricas
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+# Fallos seguidos que abren el circuito y espera (segundos) antes de volver a probar
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_BASE_DELAY = 60
+DEFAULT_MAX_DELAY = 900
+
+
+def jittered(delay):
+    """Espera con "equal jitter": entre la mitad y el total, para que las cuentas no reintenten a la vez"""
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CircuitBreaker:
+    """Cortacircuitos de un proveedor
+
+    - Cerrado: se permiten todos los ciclos; failure_threshold fallos seguidos lo abren.
+    - Abierto: no se permite ninguno hasta que pasa la espera (exponencial con jitter según las
+      veces seguidas que se ha abierto).
+    - Semiabierto: pasada la espera se deja pasar un único ciclo de prueba; si va bien se cierra y
+      si falla se vuelve a abrir con una espera mayor.
+
+    on_change(breaker, estado, espera) se llama en cada cambio de estado (fuera del candado).
+    """
+
+    def __init__(self, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, on_change=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_change = on_change
+
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opens = 0
+        self.open_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self, now=None):
+        """Indica si se puede lanzar un ciclo ahora (en semiabierto, solo el de prueba)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN:
+                if now < self.open_until:
+                    return False
+                self.state = STATE_HALF_OPEN
+                self._probe_in_flight = True
+                changed = True
+            else:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+                changed = False
+        if changed:
+            self._notify(STATE_HALF_OPEN, 0.0)
+        return True
+
+    def record_success(self):
+        with self._lock:
+            changed = self.state != STATE_CLOSED
+            self.state = STATE_CLOSED
+            self.failures = 0
+            self.opens = 0
+            self._probe_in_flight = False
+        if changed:
+            self._notify(STATE_CLOSED, 0.0)
+
+    def record_failure(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state != STATE_HALF_OPEN and self.failures < self.failure_threshold:
+                return
+            if self.state == STATE_OPEN:
+                # Un ciclo que ya estaba en marcha al abrirse: no alarga la espera
+                return
+            self.opens += 1
+            delay = jittered(min(self.base_delay * 2 ** (self.opens - 1), self.max_delay))
+            self.state = STATE_OPEN
+            self.open_until = now + delay
+        self._notify(STATE_OPEN, delay)
+
+    def _notify(self, state, delay):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(self, state, delay)
+        except Exception as e:
+            print(f"Error en la notificación del cortacircuitos {self.name}: {str(e)}")
@@ -2,51 +2,363 @@
 # Ubicación: raíz del proyecto
 # Descripción: Gestiona la configuración y almacenamiento en JSON con soporte para casos dinámicos
 
+import atexit
+import copy
 import json
 import os
+import tempfile
+import threading
+import time
+from types import MappingProxyType
+
+# Segundos durante los que se confía en la copia en memoria sin volver a consultar el archivo
+CONFIG_RECHECK_INTERVAL = 1.0
+
+# Segundos que se espera antes de escribir un guardado diferido; los guardados seguidos se agrupan
+CONFIG_WRITE_DEBOUNCE = 0.5
+
+# Caché compartida por todo el proceso: ruta absoluta -> entrada con la configuración y su firma
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+
+# Candados de escritura por archivo, guardados diferidos pendientes y transacción abierta por hilo
+_write_locks = {}
+_pending_writes = {}
+_transaction_state = threading.local()
+
+
+class _CachedConfig:
+    """Configuración en memoria junto con la firma (mtime, tamaño) del archivo del que salió"""
+
+    def __init__(self, signature, data, pending=False):
+        self.signature = signature
+        self.data = data
+        self.snapshot = _freeze(data)
+        self.checked_at = time.monotonic()
+        # Con un guardado diferido pendiente la memoria manda sobre el archivo
+        self.pending = pending
+
+
+def _get_write_lock(path):
+    """Obtiene el candado reentrante que serializa las escrituras de un archivo"""
+    with _config_cache_lock:
+        lock = _write_locks.get(path)
+        if lock is None:
+            lock = _write_locks[path] = threading.RLock()
+        return lock
+
+
+def write_json_atomic(path, data):
+    """Escribe JSON de forma atómica: archivo temporal + fsync + rename + fsync del directorio
+
+    Un fallo a mitad de escritura deja intacto el archivo anterior.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=4, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    # Persistir también la entrada del directorio (no disponible en Windows)
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def _flush_pending(path):
+    """Escribe el guardado diferido pendiente de un archivo, si lo hay"""
+    with _get_write_lock(path):
+        pending = _pending_writes.pop(path, None)
+        if pending is None:
+            return True
+        data, timer, writer = pending
+        timer.cancel()
+        return writer(path, data)
+
+
+def _cancel_pending(path):
+    """Descarta el guardado diferido pendiente de un archivo (se va a escribir algo más nuevo)"""
+    with _get_write_lock(path):
+        pending = _pending_writes.pop(path, None)
+        if pending is not None:
+            pending[1].cancel()
+
+
+def _schedule_write(path, data, writer, delay):
+    """Programa writer(path, data) para dentro de delay segundos
+
+    Si ya hay un guardado pendiente del archivo solo se sustituyen los datos: se conserva su
+    temporizador, de modo que las escrituras frecuentes no aplazan el guardado indefinidamente.
+    """
+    with _get_write_lock(path):
+        pending = _pending_writes.get(path)
+        if pending is not None:
+            _pending_writes[path] = (data, pending[1], writer)
+            return
+        timer = threading.Timer(delay, _flush_pending, args=(path,))
+        timer.daemon = True
+        _pending_writes[path] = (data, timer, writer)
+        timer.start()
+
+
+def _write_json_logged(path, data):
+    try:
+        write_json_atomic(path, data)
+        return True
+    except Exception as e:
+        print(f"Error al guardar {os.path.basename(path)}: {str(e)}")
+        return False
+
+
+def write_json_debounced(path, data, delay=CONFIG_WRITE_DEBOUNCE):
+    """Escritura atómica diferida: las que lleguen antes de que venza el plazo se agrupan en una sola"""
+    _schedule_write(os.path.abspath(path), data, _write_json_logged, delay)
+
+
+def flush_pending_write(path):
+    """Escribe ya el guardado diferido pendiente de un archivo; devuelve False si falló"""
+    return _flush_pending(os.path.abspath(path))
+
+
+def _write_and_cache(path, data):
+    """Escribe el archivo y deja la caché apuntando a lo escrito"""
+    try:
+        write_json_atomic(path, data)
+    except Exception as e:
+        print(f"Error al guardar la configuración: {str(e)}")
+        with _config_cache_lock:
+            _config_cache.pop(path, None)
+        return False
+    with _config_cache_lock:
+        _config_cache[path] = _CachedConfig(_file_signature(path), data)
+    return True
+
+
+@atexit.register
+def flush_all_pending():
+    """Escribe todos los guardados diferidos pendientes (se ejecuta también al salir)"""
+    ok = True
+    for path in list(_pending_writes):
+        ok = _flush_pending(path) and ok
+    return ok
+
+
+class ConfigTransaction:
+    """Agrupa varias modificaciones de la configuración en una sola lectura y una sola escritura
+
+    Uso:
+        with config_manager.transaction() as tx:
+            tx.config['provider'] = 'Gmail'
+            tx.config['cc_users'] = [...]
+        if not tx.saved: ...
+
+    Las transacciones anidadas en el mismo hilo (incluidas las de los setters) se funden con
+    la exterior, que es la única que escribe. Si el bloque lanza una excepción no se guarda nada.
+    """
+
+    def __init__(self, manager, debounce=False):
+        self.manager = manager
+        self.debounce = debounce
+        self.config = None
+        self.saved = False
+        self._path = os.path.abspath(manager.config_file)
+        self._lock = _get_write_lock(self._path)
+        self._outer = None
+        self._original = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        open_transactions = getattr(_transaction_state, 'open', None)
+        if open_transactions is None:
+            open_transactions = _transaction_state.open = {}
+
+        self._outer = open_transactions.get(self._path)
+        if self._outer is not None:
+            self.config = self._outer.config
+        else:
+            self._original = self.manager._cached_entry().data
+            self.config = copy.deepcopy(self._original)
+            open_transactions[self._path] = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if self._outer is not None:
+                self.saved = exc_type is None
+                return False
+
+            del _transaction_state.open[self._path]
+            if exc_type is not None:
+                return False
+
+            # Sin cambios reales no se toca el disco
+            if self.config == self._original:
+                self.saved = True
+            else:
+                self.saved = self.manager.save_config(self.config, debounce=self.debounce)
+            return False
+        finally:
+            self._lock.release()
+
+
+def _freeze(value):
+    """Convierte diccionarios y listas en vistas inmutables (MappingProxyType y tuplas)"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _file_signature(path):
+    """Firma barata del archivo para detectar cambios sin leerlo"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def normalize_keywords(value):
+    """Convierte el valor configurado (texto o lista de textos) en una lista de palabras clave"""
+    if isinstance(value, str):
+        value = [value]
+    elif not isinstance(value, (list, tuple)):
+        return []
+    return [keyword.strip() for keyword in value if isinstance(keyword, str) and keyword.strip()]
 
 
 class ConfigManager:
-    def __init__(self, config_file="config.json"):
+    # Archivo usado cuando no se indica otro; el modo sin interfaz puede cambiarlo con --config
+    DEFAULT_CONFIG_FILE = "config.json"
+
+    def __init__(self, config_file=None):
         """Inicializa el gestor de configuración"""
-        self.config_file = config_file
+        self.config_file = config_file or self.DEFAULT_CONFIG_FILE
 
-    def load_config(self):
-        """Carga la configuración desde el archivo JSON"""
+    @classmethod
+    def set_default_config_file(cls, config_file):
+        """Cambia el archivo de configuración por defecto de todas las instancias nuevas"""
+        cls.DEFAULT_CONFIG_FILE = config_file
+
+    def _cached_entry(self):
+        """Devuelve la entrada de caché vigente, releyendo el archivo solo si cambió su firma"""
+        path = os.path.abspath(self.config_file)
+        with _config_cache_lock:
+            entry = _config_cache.get(path)
+            now = time.monotonic()
+            if entry is not None and (entry.pending or now - entry.checked_at < CONFIG_RECHECK_INTERVAL):
+                return entry
+
+            signature = _file_signature(path)
+            if entry is not None and entry.signature == signature:
+                entry.checked_at = now
+                return entry
+
+            data = self._read_file(path)
+            entry = _CachedConfig(signature, data)
+            _config_cache[path] = entry
+            return entry
+
+    def _read_file(self, path):
+        """Lee y parsea el archivo JSON de configuración"""
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as file:
-                    return json.load(file)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                return data if isinstance(data, dict) else {}
             else:
                 return {}
         except Exception as e:
             print(f"Error al cargar la configuración: {str(e)}")
             return {}
 
-    def save_config(self, config):
-        """Guarda la configuración en el archivo JSON"""
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as file:
-                json.dump(config, file, indent=4, ensure_ascii=False)
+    def load_config(self):
+        """Carga la configuración (copia modificable tomada de la caché en memoria)"""
+        return copy.deepcopy(self._cached_entry().data)
+
+    def load_snapshot(self):
+        """Obtiene una vista inmutable de la configuración sin copiarla ni leer el disco"""
+        return self._cached_entry().snapshot
+
+    def invalidate_cache(self):
+        """Descarta la copia en memoria para forzar la relectura del archivo"""
+        path = os.path.abspath(self.config_file)
+        if path in _pending_writes:
+            self.flush()
+        with _config_cache_lock:
+            _config_cache.pop(path, None)
+
+    def transaction(self, debounce=False):
+        """Abre una transacción: una lectura, varias modificaciones y una única escritura atómica"""
+        return ConfigTransaction(self, debounce)
+
+    def save_config(self, config, debounce=False):
+        """Guarda la configuración de forma atómica y actualiza la caché
+
+        Con debounce=True la escritura se aplaza CONFIG_WRITE_DEBOUNCE segundos y los guardados
+        que lleguen mientras tanto se agrupan en una sola escritura; las lecturas ven el valor
+        nuevo de inmediato.
+        """
+        path = os.path.abspath(self.config_file)
+        data = copy.deepcopy(config)
+        with _get_write_lock(path):
+            if not debounce:
+                _cancel_pending(path)
+                return _write_and_cache(path, data)
+
+            with _config_cache_lock:
+                _config_cache[path] = _CachedConfig(None, data, pending=True)
+            _schedule_write(path, data, _write_and_cache, CONFIG_WRITE_DEBOUNCE)
             return True
-        except Exception as e:
-            print(f"Error al guardar la configuración: {str(e)}")
-            return False
+
+    def flush(self):
+        """Escribe ya cualquier guardado diferido pendiente de este archivo"""
+        return flush_pending_write(self.config_file)
 
     def get_value(self, key, default=None):
-        """Obtiene un valor específico de la configuración"""
-        config = self.load_config()
-        return config.get(key, default)
+        """Obtiene un valor específico de la configuración (vista inmutable)"""
+        return self.load_snapshot().get(key, default)
+
+    def get_path(self, key, default=None):
+        """Obtiene una ruta de la configuración; las relativas se toman respecto al archivo de configuración
+
+        Así los datos del bot no dependen del directorio de trabajo (bajo systemd es /). Una ruta vacía
+        se devuelve tal cual (algunos archivos son opcionales).
+        """
+        value = self.get_value(key, default)
+        if not value:
+            return value
+        value = os.path.expanduser(value)
+        if os.path.isabs(value):
+            return value
+        return os.path.join(os.path.dirname(os.path.abspath(self.config_file)), value)
 
     def set_value(self, key, value):
         """Establece un valor específico en la configuración"""
-        config = self.load_config()
-        config[key] = value
-        return self.save_config(config)
+        with self.transaction() as tx:
+            tx.config[key] = value
+        return tx.saved
 
     def get_email_config(self):
         """Obtiene la configuración de correo electrónico"""
-        config = self.load_config()
+        config = self.load_snapshot()
         return {
             'provider': config.get('provider', ''),
             'email': config.get('email', ''),
@@ -55,22 +367,97 @@ class ConfigManager:
 
     def set_email_config(self, provider, email, password):
         """Establece la configuración de correo electrónico"""
-        config = self.load_config()
-        config['provider'] = provider
-        config['email'] = email
-        config['password'] = password
-        return self.save_config(config)
+        with self.transaction() as tx:
+            tx.config['provider'] = provider
+            tx.config['email'] = email
+            tx.config['password'] = password
+        return tx.saved
+
+    def get_accounts(self):
+        """Obtiene todas las cuentas a monitorear
+
+        La cuenta principal (provider/email/password) va primero y después las de la lista
+        'accounts'; se omiten las incompletas, las desactivadas ('enabled': false) y las repetidas.
+        Cada cuenta usa sus propios 'cc_users' o, si no tiene, los globales.
+        """
+        config = self.load_snapshot()
+        default_cc = list(config.get('cc_users', []))
+        candidates = [config] + list(config.get('accounts', ()))
+
+        accounts = []
+        seen = set()
+        for account in candidates:
+            if not all([account.get('provider'), account.get('email'), account.get('password')]):
+                continue
+            if not account.get('enabled', True):
+                continue
+            key = (account['provider'], account['email'].lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            cc_users = account.get('cc_users') if account is not config else None
+            accounts.append({
+                'provider': account['provider'],
+                'email': account['email'],
+                'password': account['password'],
+                'cc_users': list(cc_users) if cc_users is not None else default_cc
+            })
+        return accounts
+
+    def add_account(self, provider, email, password, cc_users=None):
+        """Añade (o actualiza) una cuenta adicional a monitorear"""
+        with self.transaction() as tx:
+            accounts = tx.config.setdefault('accounts', [])
+            account = {'provider': provider, 'email': email, 'password': password}
+            if cc_users is not None:
+                account['cc_users'] = list(cc_users)
+
+            for index, existing in enumerate(accounts):
+                if existing.get('provider') == provider and existing.get('email', '').lower() == email.lower():
+                    accounts[index] = account
+                    break
+            else:
+                accounts.append(account)
+        return tx.saved
+
+    def remove_account(self, provider, email):
+        """Elimina una cuenta adicional"""
+        with self.transaction() as tx:
+            accounts = tx.config.get('accounts', [])
+            tx.config['accounts'] = [account for account in accounts
+                                     if not (account.get('provider') == provider and
+                                             account.get('email', '').lower() == email.lower())]
+        return tx.saved
 
     def get_search_params(self):
-        """Obtiene todos los parámetros de búsqueda"""
-        config = self.load_config()
-        return config.get('search_params', {})
+        """Obtiene todos los parámetros de búsqueda (vista inmutable)"""
+        return self.load_snapshot().get('search_params', MappingProxyType({}))
 
     def set_search_params(self, search_params):
         """Establece todos los parámetros de búsqueda"""
-        config = self.load_config()
-        config['search_params'] = search_params
-        return self.save_config(config)
+        with self.transaction() as tx:
+            tx.config['search_params'] = search_params
+        return tx.saved
+
+    def get_body_params(self):
+        """Obtiene las palabras clave de cuerpo de cada caso (vista inmutable)"""
+        return self.load_snapshot().get('body_params', MappingProxyType({}))
+
+    def set_body_params(self, body_params):
+        """Establece todas las palabras clave de cuerpo"""
+        with self.transaction() as tx:
+            tx.config['body_params'] = body_params
+        return tx.saved
+
+    def get_rules(self):
+        """Obtiene las reglas declarativas de asignación de casos (vista inmutable)"""
+        return self.load_snapshot().get('rules', ())
+
+    def set_rules(self, rules):
+        """Establece todas las reglas declarativas"""
+        with self.transaction() as tx:
+            tx.config['rules'] = rules
+        return tx.saved
 
     def get_case_keyword(self, case_name):
         """Obtiene la palabra clave para un caso específico"""
@@ -78,37 +465,34 @@ class ConfigManager:
         return search_params.get(case_name, '')
 
     def set_case_keyword(self, case_name, keyword):
-        """Establece la palabra clave para un caso específico"""
-        config = self.load_config()
-        if 'search_params' not in config:
-            config['search_params'] = {}
+        """Establece la palabra clave (o lista de palabras clave) para un caso específico"""
+        with self.transaction() as tx:
+            search_params = tx.config.setdefault('search_params', {})
 
-        if keyword.strip():
-            config['search_params'][case_name] = keyword.strip()
-        else:
-            # Si la palabra clave está vacía, eliminar la entrada
-            if case_name in config['search_params']:
-                del config['search_params'][case_name]
+            keywords = normalize_keywords(keyword)
+            if keywords:
+                search_params[case_name] = keywords[0] if isinstance(keyword, str) else keywords
+            else:
+                # Si la palabra clave está vacía, eliminar la entrada
+                search_params.pop(case_name, None)
 
-        return self.save_config(config)
+        return tx.saved
 
     def remove_case_keyword(self, case_name):
         """Elimina la palabra clave de un caso específico"""
-        config = self.load_config()
-        if 'search_params' in config and case_name in config['search_params']:
-            del config['search_params'][case_name]
-            return self.save_config(config)
-        return True
+        with self.transaction() as tx:
+            tx.config.get('search_params', {}).pop(case_name, None)
+        return tx.saved
 
     def get_all_case_keywords(self):
         """Obtiene todas las palabras clave configuradas con sus casos"""
         search_params = self.get_search_params()
-        return [(case_name, keyword) for case_name, keyword in search_params.items() if keyword.strip()]
+        return [(case_name, keyword) for case_name, value in search_params.items()
+                for keyword in normalize_keywords(value)]
 
     def has_email_config(self):
-        """Verifica si existe configuración completa de correo"""
-        email_config = self.get_email_config()
-        return all([email_config['provider'], email_config['email'], email_config['password']])
+        """Verifica si existe al menos una cuenta de correo completa"""
+        return bool(self.get_accounts())
 
     def has_search_params(self):
         """Verifica si existen parámetros de búsqueda configurados"""
@@ -129,12 +513,12 @@ class ConfigManager:
             validation_result['errors'].append("Configuración de correo incompleta")
 
         # Validar parámetros de búsqueda
-        if not self.has_search_params():
+        if not (self.has_search_params() or self.get_body_params() or self.get_rules()):
             validation_result['warnings'].append("No hay parámetros de búsqueda configurados")
 
         # Verificar integridad del archivo de configuración
         try:
-            config = self.load_config()
+            config = self._read_file(os.path.abspath(self.config_file))
             if not isinstance(config, dict):
                 validation_result['valid'] = False
                 validation_result['errors'].append("Archivo de configuración corrupto")
@@ -160,9 +544,7 @@ class ConfigManager:
             backup_file = f"{self.config_file}.backup"
 
         try:
-            config = self.load_config()
-            with open(backup_file, 'w', encoding='utf-8') as file:
-                json.dump(config, file, indent=4, ensure_ascii=False)
+            write_json_atomic(backup_file, self.load_config())
             return True
         except Exception as e:
             print(f"Error al crear copia de seguridad: {str(e)}")
@@ -0,0 +1,141 @@
+# Archivo: dedup_cache.py
+# Ubicación: raíz del proyecto
+# Descripción: Caché acotada (LRU + caducidad) de correos ya respondidos, opcionalmente respaldada en disco
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Correos recordados como máximo y durante cuánto tiempo (segundos)
+DEDUP_MAX_ENTRIES = 50000
+DEDUP_TTL = 14 * 24 * 3600
+
+# Archivo por defecto; 'dedup_cache_file' en la configuración lo cambia (relativo al archivo de configuración;
+# vacío = solo en memoria)
+DEFAULT_DEDUP_FILE = "dedup_cache.log"
+
+# El archivo se reescribe cuando tiene más de este múltiplo de líneas respecto a las entradas vivas
+DEDUP_COMPACT_FACTOR = 2
+
+
+def make_dedup_keys(provider, email_addr, message_id=None, uidvalidity=None, uid=None):
+    """Claves de un correo: por Message-ID (sobrevive a la renumeración de UIDs) y por UID"""
+    account = f"{provider}|{email_addr.lower()}"
+    keys = []
+    if message_id:
+        keys.append(f"{account}|mid|{message_id.strip()}")
+    if uidvalidity is not None and uid is not None:
+        keys.append(f"{account}|uid|{uidvalidity}|{uid}")
+    return keys
+
+
+class DedupCache:
+    """Recuerda qué correos ya se respondieron para no volver a procesarlos
+
+    En memoria solo se guarda un resumen de 16 bytes de cada clave con su caducidad. Si hay archivo,
+    cada alta se añade al final como "caducidad resumen" y se carga al arrancar; el archivo se
+    compacta cuando acumula demasiadas líneas caducadas o repetidas.
+    """
+
+    def __init__(self, path=DEFAULT_DEDUP_FILE, max_entries=DEDUP_MAX_ENTRIES, ttl=DEDUP_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._file_lines = 0
+        self._lock = threading.Lock()
+        if self.path:
+            self._load()
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _load(self):
+        now = time.time()
+        try:
+            with open(self.path, 'r', encoding='ascii') as file:
+                for line in file:
+                    self._file_lines += 1
+                    expires_at, _, digest = line.strip().partition(' ')
+                    try:
+                        expires_at = float(expires_at)
+                    except ValueError:
+                        # Línea cortada por una caída a mitad de escritura
+                        continue
+                    if digest and expires_at > now:
+                        self._entries[digest] = expires_at
+                        self._entries.move_to_end(digest)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error al cargar la caché de correos respondidos: {str(e)}")
+            return
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def contains(self, keys):
+        """Indica si alguna de las claves está registrada y sin caducar"""
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                digest = self._digest(key)
+                expires_at = self._entries.get(digest)
+                if expires_at is None:
+                    continue
+                if expires_at <= now:
+                    del self._entries[digest]
+                    continue
+                self._entries.move_to_end(digest)
+                return True
+        return False
+
+    def add(self, keys):
+        """Registra claves (todas en una sola escritura al archivo)"""
+        if not keys:
+            return
+        expires_at = time.time() + self.ttl
+        digests = [self._digest(key) for key in keys]
+        with self._lock:
+            for digest in digests:
+                self._entries[digest] = expires_at
+                self._entries.move_to_end(digest)
+            self._evict()
+            if not self.path:
+                return
+            try:
+                with open(self.path, 'a', encoding='ascii') as file:
+                    file.write(''.join(f"{expires_at:.0f} {digest}\n" for digest in digests))
+                self._file_lines += len(digests)
+                if self._file_lines > DEDUP_COMPACT_FACTOR * max(len(self._entries), 1000):
+                    self._compact()
+            except Exception as e:
+                print(f"Error al guardar la caché de correos respondidos: {str(e)}")
+
+    def _compact(self):
+        """Reescribe el archivo solo con las entradas vivas (de forma atómica)"""
+        now = time.time()
+        for digest in [digest for digest, expires_at in self._entries.items() if expires_at <= now]:
+            del self._entries[digest]
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.dedup-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='ascii') as file:
+                file.write(''.join(f"{expires_at:.0f} {digest}\n" for digest, expires_at in self._entries.items()))
+            os.replace(temp_path, self.path)
+            self._file_lines = len(self._entries)
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
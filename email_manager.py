@@ -5,74 +5,174 @@
 import smtplib
 import imaplib
 import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.header import Header, decode_header
 import email
 import base64
 from datetime import datetime, date
 import email.utils
+import re
+import copy
+import functools
+import threading
+import time
 from case_handler import CaseHandler
+from imap_pool import IMAPSessionPool
+from smtp_pool import SMTPConnectionPool
+from sync_state import SyncStateManager, DEFAULT_SYNC_STATE_FILE
+from imap_idle import idle_wait, reset_new_mail_notifications, IDLE_REFRESH_SECONDS
+from send_queue import SendQueue, OutboundMessage, DEFAULT_SEND_WORKERS, DEFAULT_SEND_RATE_PER_MINUTE, \
+    DEFAULT_SEND_BURST
+from config_manager import ConfigManager
+from outbox import Outbox, DEFAULT_OUTBOX_FILE
+from reply_templates import REPLY_TEMPLATES
+from search_planner import SearchPlanner
+from header_parser import header_fetch_items, parse_header_fields, decode_header_value
+from rule_engine import MessageRow
+from dedup_cache import DedupCache, DEFAULT_DEDUP_FILE, make_dedup_keys
+from body_text import body_fetch_items, decode_text_prefix
+from async_email_backend import AsyncEmailBackend
+import metrics
+
+# Cantidad máxima de UIDs por cada UID FETCH de cabeceras
+HEADER_FETCH_CHUNK_SIZE = 250
+
+# Segundos que se espera a que la cola de envío se vacíe al cerrar las conexiones
+SEND_QUEUE_DRAIN_TIMEOUT = 60
+
+# Errores de red (conexión, TLS, tiempo de espera, conexión cortada); los demás (LOGIN rechazado,
+# NO/BAD del servidor...) demuestran que el servidor responde
+TRANSPORT_ERRORS = (imaplib.IMAP4.abort, OSError)
+
+# Backend de red: 'sync' (imaplib/smtplib, un hilo bloqueado por conexión) o 'async' (todas las
+# conexiones en un bucle de eventos asyncio, ver async_email_backend)
+DEFAULT_EMAIL_BACKEND = 'sync'
+
+_UID_RE = re.compile(rb'UID (\d+)')
+_EMPTY_SECTION_RE = re.compile(rb'\](<\d+>)? (""|NIL)')
+
+# Configuraciones predeterminadas para proveedores comunes (send_rate_per_minute/send_burst
+# limitan el ritmo de envío por cuenta para no chocar con los límites del proveedor)
+DEFAULT_PROVIDER_CONFIGS = {
+    'Gmail': {
+        'smtp_server': 'smtp.gmail.com',
+        'smtp_port': 587,
+        'imap_server': 'imap.gmail.com',
+        'imap_port': 993,
+        'send_rate_per_minute': 20,
+        'send_burst': 5
+    },
+    'Outlook': {
+        'smtp_server': 'smtp-mail.outlook.com',
+        'smtp_port': 587,
+        'imap_server': 'outlook.office365.com',
+        'imap_port': 993,
+        'send_rate_per_minute': 30,
+        'send_burst': 5
+    },
+    'Yahoo': {
+        'smtp_server': 'smtp.mail.yahoo.com',
+        'smtp_port': 587,
+        'imap_server': 'imap.mail.yahoo.com',
+        'imap_port': 993,
+        'send_rate_per_minute': 10,
+        'send_burst': 3
+    },
+    'Otro': {
+        'smtp_server': '',
+        'smtp_port': 587,
+        'imap_server': '',
+        'imap_port': 993,
+        'send_rate_per_minute': 30,
+        'send_burst': 5
+    }
+}
 
 
 class EmailManager:
     def __init__(self):
         """Inicializa el gestor de correo electrónico"""
-        # Definir configuraciones predeterminadas para proveedores comunes
-        self.provider_configs = {
-            'Gmail': {
-                'smtp_server': 'smtp.gmail.com',
-                'smtp_port': 587,
-                'imap_server': 'imap.gmail.com',
-                'imap_port': 993
-            },
-            'Outlook': {
-                'smtp_server': 'smtp-mail.outlook.com',
-                'smtp_port': 587,
-                'imap_server': 'outlook.office365.com',
-                'imap_port': 993
-            },
-            'Yahoo': {
-                'smtp_server': 'smtp.mail.yahoo.com',
-                'smtp_port': 587,
-                'imap_server': 'imap.mail.yahoo.com',
-                'imap_port': 993
-            },
-            'Otro': {
-                'smtp_server': '',
-                'smtp_port': 587,
-                'imap_server': '',
-                'imap_port': 993
-            }
-        }
+        # Configuraciones de proveedores (copia propia, se puede ampliar por instancia)
+        self.provider_configs = copy.deepcopy(DEFAULT_PROVIDER_CONFIGS)
+
+        # Backend asyncio opcional para las conexiones IMAP/SMTP
+        backend = ConfigManager().get_value('email_backend', DEFAULT_EMAIL_BACKEND)
+        self.async_backend = AsyncEmailBackend() if backend == 'async' else None
+
+        # Correos ya respondidos: evita responder dos veces si el correo vuelve a aparecer como no leído
+        dedup_file = ConfigManager().get_path('dedup_cache_file', DEFAULT_DEDUP_FILE)
+        self.dedup_cache = DedupCache(dedup_file or None)
 
         # Inicializar el manejador de casos
-        self.case_handler = CaseHandler()
+        self.case_handler = CaseHandler(dedup_cache=self.dedup_cache)
+
+        # Pool de sesiones IMAP persistentes para no repetir TLS + LOGIN + SELECT en cada ciclo
+        self.imap_pool = IMAPSessionPool(self._open_imap_session)
+
+        # Pool de conexiones SMTP autenticadas reutilizadas entre respuestas y ciclos
+        self.smtp_pool = SMTPConnectionPool(self._open_smtp_connection)
+
+        # Puntos de sincronización por buzón para buscar solo el correo nuevo
+        self.sync_state = SyncStateManager(ConfigManager().get_path('sync_state_file', DEFAULT_SYNC_STATE_FILE))
+
+        # Planificador de búsquedas IMAP (recuerda qué servidores aceptan CHARSET UTF-8)
+        self.search_planner = SearchPlanner()
+
+        # Correos con caso y error del último ciclo de cada cuenta (el planificador ajusta con ellos el
+        # sondeo y el cortacircuitos del servidor)
+        self._cycle_matches = {}
+        self._cycle_errors = {}
+
+        # Bandeja de salida persistente: cada respuesta se registra antes de marcar el correo como leído
+        self.outbox = Outbox(ConfigManager().get_path('outbox_file', DEFAULT_OUTBOX_FILE))
+        self._outbox_in_flight = set()
+        self._outbox_lock = threading.Lock()
+
+        # Las respuestas se envían desde una cola para no frenar el procesamiento IMAP
+        self.send_queue = SendQueue(
+            self.send_email,
+            self._send_rate,
+            workers=ConfigManager().get_value('send_workers', DEFAULT_SEND_WORKERS)
+        )
+        metrics.SEND_QUEUE_PENDING.set_function(self.send_queue.pending)
 
     def get_provider_config(self, provider):
         """Obtiene la configuración para un proveedor específico"""
         return self.provider_configs.get(provider, self.provider_configs['Otro'])
 
+    def get_last_cycle_matches(self, provider, email_addr):
+        """Correos con caso encontrados en el último ciclo de la cuenta (0 si no hubo o falló)"""
+        return self._cycle_matches.get((provider, self._sanitize_string(email_addr).lower()), 0)
+
+    def get_last_cycle_error(self, provider, email_addr):
+        """Excepción que hizo fallar el último ciclo de la cuenta (None si terminó bien)"""
+        return self._cycle_errors.get((provider, self._sanitize_string(email_addr).lower()))
+
+    @staticmethod
+    def is_transport_error(error):
+        """Indica si un error es de red (y no de la cuenta o del servidor que sí respondió)"""
+        return isinstance(error, TRANSPORT_ERRORS)
+
+    def _send_rate(self, provider):
+        """Ritmo de envío del proveedor: (mensajes por minuto, ráfaga)"""
+        config = self.get_provider_config(provider)
+        return (config.get('send_rate_per_minute', DEFAULT_SEND_RATE_PER_MINUTE),
+                config.get('send_burst', DEFAULT_SEND_BURST))
+
     def test_smtp_connection(self, provider, email_addr, password):
         """Prueba la conexión SMTP con los parámetros proporcionados"""
         try:
             # Obtener configuración del proveedor
             config = self.get_provider_config(provider)
-            server = config['smtp_server']
-            port = config['smtp_port']
 
             # Asegurarse de que las credenciales sean strings y eliminar caracteres problemáticos
             email_addr = self._sanitize_string(email_addr)
             password = self._sanitize_string(password)
 
-            # Crear un contexto SSL
-            context = ssl.create_default_context()
-
-            # Conectar al servidor SMTP
-            smtp = smtplib.SMTP(server, port)
-            smtp.ehlo()
-            smtp.starttls(context=context)
+            # Conectar al servidor SMTP (STARTTLS salvo que el proveedor lo desactive, p. ej. servidores locales)
+            smtp = self._connect_smtp(config)
             smtp.ehlo()
+            if config.get('smtp_starttls', True):
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
 
             # Iniciar sesión con las credenciales
             smtp.login(email_addr, password)
@@ -91,18 +191,13 @@ class EmailManager:
         try:
             # Obtener configuración del proveedor
             config = self.get_provider_config(provider)
-            server = config['imap_server']
-            port = config['imap_port']
 
             # Asegurarse de que las credenciales sean strings y eliminar caracteres problemáticos
             email_addr = self._sanitize_string(email_addr)
             password = self._sanitize_string(password)
 
-            # Crear un contexto SSL
-            context = ssl.create_default_context()
-
             # Conectar al servidor IMAP
-            imap = imaplib.IMAP4_SSL(server, port, ssl_context=context)
+            imap = self._connect_imap(config)
 
             # Iniciar sesión con las credenciales
             imap.login(email_addr, password)
@@ -119,64 +214,52 @@ class EmailManager:
     def send_email(self, provider, email_addr, password, to, subject, body, cc_list=None):
         """Envía un correo electrónico a través de SMTP"""
         try:
-            # Obtener configuración del proveedor
-            config = self.get_provider_config(provider)
-            server = config['smtp_server']
-            port = config['smtp_port']
-
             # Sanitizar credenciales
             email_addr = self._sanitize_string(email_addr)
             password = self._sanitize_string(password)
 
-            # Crear un mensaje MIME
-            msg = MIMEMultipart()
-            msg['From'] = email_addr
-            msg['To'] = to
-            msg['Subject'] = Header(subject, 'utf-8')
-
-            # Añadir cabecera CC si la lista existe
-            if cc_list:
-                msg['Cc'] = ", ".join(cc_list)
-
-            # Adjuntar el cuerpo del mensaje con codificación UTF-8
-            msg.attach(MIMEText(body, 'plain', 'utf-8'))
-
-            # Crear un contexto SSL
-            context = ssl.create_default_context()
-
-            # Conectar al servidor SMTP
-            with smtplib.SMTP(server, port) as smtp:
-                smtp.ehlo()
-                smtp.starttls(context=context)
-                smtp.ehlo()
-
-                # Iniciar sesión y enviar el correo
-                smtp.login(email_addr, password)
-                smtp.send_message(msg)
+            msg = self.build_message(email_addr, to, subject, body, cc_list)
 
+            # Enviar por una conexión del pool; si el servidor la cerró se reintenta una vez con otra nueva
+            with metrics.STAGE_DURATION.time(stage='send'):
+                for attempt in range(2):
+                    try:
+                        with self.smtp_pool.connection(provider, email_addr, password) as smtp:
+                            smtp.send_message(msg)
+                        break
+                    except smtplib.SMTPServerDisconnected:
+                        if attempt:
+                            raise
+
+            metrics.SENDS.inc(result='ok')
             return True
 
         except Exception as e:
             print(f"Error al enviar correo: {str(e)}")
+            metrics.SENDS.inc(result='error')
             return False
 
+    @staticmethod
+    def build_message(email_addr, to, subject, body, cc_list=None):
+        """Construye el mensaje MIME de una respuesta
+
+        El cuerpo codificado y la cabecera CC salen de la caché de plantillas; solo se añaden
+        las cabeceras propias de cada destinatario.
+        """
+        return REPLY_TEMPLATES.get(body, cc_list).build(email_addr, to, subject)
+
     def read_emails(self, provider, email_addr, password, mailbox='INBOX', limit=10):
         """Lee correos de un buzón IMAP específico"""
         try:
             # Obtener configuración del proveedor
             config = self.get_provider_config(provider)
-            server = config['imap_server']
-            port = config['imap_port']
 
             # Sanitizar credenciales
             email_addr = self._sanitize_string(email_addr)
             password = self._sanitize_string(password)
 
-            # Crear un contexto SSL
-            context = ssl.create_default_context()
-
             # Conectar al servidor IMAP
-            with imaplib.IMAP4_SSL(server, port, ssl_context=context) as imap:
+            with self._connect_imap(config) as imap:
                 # Iniciar sesión
                 imap.login(email_addr, password)
 
@@ -211,171 +294,554 @@ class EmailManager:
 
     # --- FUNCIÓN MODIFICADA ---
     def check_and_process_emails(self, provider, email_addr, password, search_titles, logger, cc_list=None):
-        """Función principal que revisa emails y procesa los que coinciden usando el sistema modular"""
-        try:
-            # Obtener configuración del proveedor
-            config = self.get_provider_config(provider)
-            server = config['imap_server']
-            port = config['imap_port']
+        """Función principal que revisa emails y procesa los que coinciden usando el sistema modular
 
+        Devuelve False si el ciclo falló (conexión, autenticación...) para que se pueda reintentar más tarde.
+        """
+        with metrics.STAGE_DURATION.time(stage='cycle'):
+            ok = self._process_mailbox(provider, email_addr, password, search_titles, logger, cc_list)
+        metrics.CYCLES.inc(result='ok' if ok else 'error')
+        return ok
+
+    def _process_mailbox(self, provider, email_addr, password, search_titles, logger, cc_list=None):
+        """Ciclo de revisión de un buzón (ver check_and_process_emails)"""
+        try:
             # Sanitizar credenciales
             email_addr = self._sanitize_string(email_addr)
             password = self._sanitize_string(password)
-
-            # Crear un contexto SSL
-            context = ssl.create_default_context()
-
-            # Conectar al servidor IMAP
-            with imaplib.IMAP4_SSL(server, port, ssl_context=context) as imap:
-                # Iniciar sesión
-                imap.login(email_addr, password)
-
-                # Seleccionar el buzón de correo
-                imap.select('INBOX')
+            cycle_key = (provider, email_addr.lower())
+            self._cycle_matches[cycle_key] = 0
+            self._cycle_errors[cycle_key] = None
+
+            # Obtener una sesión IMAP del pool (ya autenticada y con INBOX seleccionado)
+            with self.imap_pool.session(provider, email_addr, password, 'INBOX') as imap:
+                # Punto de sincronización del buzón: solo interesan los UIDs posteriores al último procesado
+                sync_key = self.sync_state.make_key(provider, email_addr, 'INBOX')
+                mailbox_state = getattr(imap, 'mailbox_state', {})
+                uidvalidity = mailbox_state.get('uidvalidity')
+                checkpoint = self.sync_state.get_checkpoint(sync_key, uidvalidity)
+                if checkpoint is None and self.sync_state.get_checkpoint(sync_key):
+                    logger.log("UIDVALIDITY cambió en el servidor, se reinicia la sincronización", level="WARNING")
+                last_uid = checkpoint['last_uid'] if checkpoint else 0
+
+                # Respuestas pendientes de ciclos anteriores (o de antes de un reinicio) cuyo reintento ya toca
+                self._dispatch_outbox(provider, email_addr, password, logger)
+
+                # Con una sesión recién seleccionada, UIDNEXT/HIGHESTMODSEQ dicen si hubo cambios sin buscar
+                freshly_selected = mailbox_state.pop('fresh', False)
+                if checkpoint and freshly_selected and self._mailbox_unchanged(mailbox_state, checkpoint):
+                    logger.log("Sin cambios en el buzón desde el último punto de sincronización", level="INFO")
+                    return True
 
                 # --- LÓGICA DE BÚSQUEDA MEJORADA ---
                 today = date.today().strftime("%d-%b-%Y")
 
                 # Criterios base: no leído y desde hoy
-                search_criteria = ['(UNSEEN)', f'(SINCE "{today}")']
-
-                # Añadir criterios de asunto si existen
-                if search_titles:
-                    subject_queries = [f'(SUBJECT "{title.strip()}")' for title in search_titles if title.strip()]
-
-                    if len(subject_queries) > 1:
-                        # Si hay múltiples asuntos, unirlos con OR
-                        search_criteria.append(f'(OR {" ".join(subject_queries)})')
-                    elif subject_queries:
-                        # Si solo hay uno, añadirlo directamente
-                        search_criteria.append(subject_queries[0])
-
-                # Unir todos los criterios en una sola consulta
-                final_query = ' '.join(search_criteria)
-                logger.log(f"Ejecutando busqueda IMAP con criterio: {final_query}", level="INFO")
-
-                # Buscar emails usando la consulta final y charset UTF-8
-                status, messages = imap.search('UTF-8', final_query)
+                base_criteria = ['UNSEEN', 'SINCE', today]
+
+                # Limitar la búsqueda a los mensajes posteriores al punto de sincronización
+                if last_uid:
+                    base_criteria += ['UID', f'{last_uid + 1}:*']
+
+                # Cualquier EXISTS posterior a esta búsqueda indicará correo nuevo para IDLE
+                reset_new_mail_notifications(imap)
+
+                # El planificador une los asuntos con OR binarios, reparte en varios SEARCH y, si el servidor
+                # no sirve, deja el filtrado del asunto al buscador de casos sobre las cabeceras
+                config = self.get_provider_config(provider)
+                server_key = (config['imap_server'], config['imap_port'])
+                # Las palabras clave de cuerpo también amplían la búsqueda (BODY) para no perder esos correos
+                body_keywords = self.case_handler.get_all_body_keywords()
+                body_fetch_bytes = self.case_handler.get_body_fetch_bytes() if body_keywords else 0
+                # Las reglas miran remitente, cabeceras o fechas: con reglas el servidor no puede filtrar
+                rules_active = self.case_handler.has_rules(logger)
+                with metrics.STAGE_DURATION.time(stage='search'):
+                    found_uids, client_side = self.search_planner.search(
+                        imap, server_key, base_criteria, () if rules_active else search_titles, logger,
+                        () if rules_active else body_keywords)
+                if client_side or rules_active:
+                    logger.log("Búsqueda sin filtro de asunto: los casos se identifican en el cliente", level="INFO")
                 # --- FIN DE LÓGICA DE BÚSQUEDA MEJORADA ---
 
-                # Obtener la lista de IDs de mensajes
-                message_ids = messages[0].split()
+                # Obtener la lista de UIDs de mensajes ("n:*" siempre incluye el último mensaje, aunque sea antiguo)
+                message_uids = [uid for uid in found_uids if int(uid) > last_uid]
 
-                if not message_ids:
-                    logger.log("No se encontraron correos nuevos que coincidan con los criterios.", level="INFO")
-                    return
+                # UIDs que deben reintentarse en el siguiente ciclo y que frenan el avance del punto de sincronización
+                retry_uids = set()
 
-                logger.log(f"Encontrados {len(message_ids)} emails que coinciden con la búsqueda", level="INFO")
-
-                # Procesar cada email
-                for msg_id in message_ids:
-                    try:
-                        # Obtener solo las cabeceras del email SIN marcarlo como leído
-                        status, header_data = imap.fetch(msg_id, '(BODY.PEEK[HEADER])')
-
-                        if status != 'OK' or not header_data:
-                            logger.log(f"No se pudieron obtener las cabeceras del email {msg_id}", level="WARNING")
+                if not message_uids:
+                    logger.log("No se encontraron correos nuevos que coincidan con los criterios.", level="INFO")
+                    self._advance_checkpoint(sync_key, mailbox_state, last_uid, message_uids, retry_uids)
+                    return True
+
+                logger.log(f"Encontrados {len(message_uids)} emails que coinciden con la búsqueda", level="INFO")
+
+                # Procesar los emails por bloques: un único UID FETCH de cabeceras por bloque
+                for start in range(0, len(message_uids), HEADER_FETCH_CHUNK_SIZE):
+                    chunk = message_uids[start:start + HEADER_FETCH_CHUNK_SIZE]
+
+                    # Correos ya respondidos (un STORE fallido, o \Seen quitado por otro cliente): no se vuelven
+                    # a procesar, solo se marcan otra vez como leídos
+                    answered_uids = [uid for uid in chunk if self.dedup_cache.contains(
+                        make_dedup_keys(provider, email_addr, None, uidvalidity, self._uid_str(uid)))]
+                    if answered_uids:
+                        chunk = [uid for uid in chunk if uid not in answered_uids]
+
+                    with metrics.STAGE_DURATION.time(stage='fetch_headers'):
+                        fetched_headers = self._fetch_headers_batch(imap, chunk, logger)
+
+                    # Parsear solo las cabeceras pedidas, sin construir objetos Message
+                    parsed = []
+                    for uid in chunk:
+                        uid = self._uid_str(uid)
+                        raw_headers = fetched_headers.get(uid)
+                        if raw_headers is None:
+                            logger.log(f"No se pudieron obtener las cabeceras del email {uid}", level="WARNING")
+                            retry_uids.add(uid)
                             continue
-
-                        # Parsear solo las cabeceras
-                        raw_headers = header_data[0][1]
-                        headers = email.message_from_bytes(raw_headers, policy=email.policy.default)
-
-                        # Obtener y decodificar el subject del email
-                        subject = self._decode_header_value(headers.get('Subject', ''))
-                        sender = headers.get('From', '')
-
-                        logger.log(f"Revisando email: '{subject}' de {sender}", level="INFO")
-
-                        # Buscar caso coincidente usando el sistema modular
-                        matching_case = self.case_handler.find_matching_case(subject, logger)
-
-                        if matching_case:
-                            logger.log(f"Email encontrado para caso: {matching_case}", level="INFO")
-
-                            # Marcar como leído
-                            status, result = self._mark_as_read(imap, msg_id)
-                            if status:
-                                logger.log(f"Email marcado como leído: {result}", level="INFO")
-
-                                # Preparar datos del email para el caso
-                                email_data = {
-                                    'sender': sender,
-                                    'subject': subject,
-                                    'msg_id': msg_id.decode() if isinstance(msg_id, bytes) else str(msg_id)
-                                }
-
-                                # Ejecutar el caso correspondiente
-                                response_data = self.case_handler.execute_case(matching_case, email_data, logger)
-
-                                if response_data:
-                                    # Enviar respuesta automática (con CC si está configurado)
-                                    if self._send_case_reply(provider, email_addr, password, response_data, logger,
-                                                             cc_list):
-                                        logger.log(f"Respuesta automática enviada usando {matching_case}", level="INFO")
-                                    else:
-                                        logger.log(f"Error al enviar respuesta automática", level="ERROR")
-                                else:
-                                    logger.log(f"Error al procesar {matching_case}", level="ERROR")
+                        try:
+                            headers = parse_header_fields(raw_headers)
+                            # Mismo Message-ID ya respondido (también tras una renumeración de UIDs)
+                            if self.dedup_cache.contains(make_dedup_keys(provider, email_addr,
+                                                                         headers.get('message-id'))):
+                                answered_uids.append(uid)
+                                continue
+                            parsed.append((uid, headers, MessageRow(headers)))
+                        except Exception as e:
+                            logger.log(f"Error al procesar email individual: {str(e)}", level="ERROR")
+                            retry_uids.add(uid)
+
+                    # Las reglas declarativas se evalúan sobre todo el bloque de una vez
+                    with metrics.STAGE_DURATION.time(stage='match'):
+                        rule_cases = self.case_handler.match_rules([row for _, _, row in parsed], logger)
+
+                    # Primera pasada: identificar el caso de cada email sin tocar el servidor
+                    matched_emails = []
+                    body_candidates = []
+                    for (uid, headers, row), rule_case in zip(parsed, rule_cases):
+                        try:
+                            # El asunto ya está decodificado; el remitente se conserva con su nombre
+                            subject = row.subject
+                            sender = decode_header_value(headers.get('from', ''))
+
+                            logger.log(f"Revisando email: '{subject}' de {sender}", level="INFO")
+
+                            email_data = {
+                                'sender': sender,
+                                'subject': subject,
+                                'msg_id': uid,
+                                'uid': uid,
+                                'message_id': headers.get('message-id', ''),
+                                'date': headers.get('date', ''),
+                                'auto_submitted': headers.get('auto-submitted', ''),
+                                'dedup_keys': make_dedup_keys(provider, email_addr, headers.get('message-id'),
+                                                              uidvalidity, uid)
+                            }
+
+                            # Si ninguna regla decide, buscar caso coincidente por palabras clave del asunto
+                            matching_case = rule_case
+                            if not matching_case:
+                                with metrics.STAGE_DURATION.time(stage='match'):
+                                    matching_case = self.case_handler.find_matching_case(subject, logger)
+
+                            if matching_case:
+                                metrics.MESSAGES.inc(result='matched')
+                                metrics.MATCHES.inc(case=matching_case)
+                                logger.log(f"Email encontrado para caso: {matching_case}", level="INFO")
+                                matched_emails.append((uid, matching_case, email_data))
+                            elif body_fetch_bytes:
+                                # El asunto no decide: se revisará el comienzo del cuerpo
+                                body_candidates.append((uid, email_data, headers))
+                            else:
+                                metrics.MESSAGES.inc(result='unmatched')
+                                # Este log ahora es menos probable, ya que el servidor ya filtró por asunto
+                                logger.log(f"Email no coincide con ningún caso específico de respuesta: '{subject}'",
+                                           level="INFO")
+
+                        except Exception as e:
+                            logger.log(f"Error al procesar email individual: {str(e)}", level="ERROR")
+                            retry_uids.add(uid)
+
+                    # Solo los correos sin caso por el asunto descargan (un prefijo de) su cuerpo
+                    if body_candidates:
+                        matched_emails.extend(self._match_bodies(imap, body_candidates, body_fetch_bytes,
+                                                                 retry_uids, logger))
+
+                    self._cycle_matches[cycle_key] += len(matched_emails)
+                    if answered_uids:
+                        logger.log(f"{len(answered_uids)} emails ya respondidos anteriormente, se omiten",
+                                   level="INFO")
+                    if not matched_emails and not answered_uids:
+                        continue
+
+                    # Segunda pasada: ejecutar los casos y registrar todas las respuestas en la bandeja de
+                    # salida con una sola transacción, antes de tocar el servidor
+                    journal_entries = []
+                    answered_keys = []
+                    to_mark = [self._uid_str(uid) for uid in answered_uids]
+                    for uid, matching_case, email_data in matched_emails:
+                        try:
+                            # Ejecutar el caso correspondiente
+                            response_data = self.case_handler.execute_case(matching_case, email_data, logger)
+
+                            if response_data:
+                                journal_entries.append(self._build_outbox_entry(
+                                    provider, email_addr, uidvalidity, uid, matching_case, email_data,
+                                    response_data, cc_list))
+                                answered_keys.extend(email_data['dedup_keys'])
                             else:
-                                logger.log(f"Error al marcar email como leído: {result}", level="ERROR")
-                        else:
-                            # Este log ahora es menos probable, ya que el servidor ya filtró por asunto
-                            logger.log(f"Email no coincide con ningún caso específico de respuesta: '{subject}'",
-                                       level="INFO")
+                                logger.log(f"Error al procesar {matching_case}", level="ERROR")
+                            to_mark.append(uid)
 
+                        except Exception as e:
+                            logger.log(f"Error al procesar email individual: {str(e)}", level="ERROR")
+                            retry_uids.add(uid)
+
+                    try:
+                        with metrics.STAGE_DURATION.time(stage='journal'):
+                            new_keys = self.outbox.record(journal_entries)
                     except Exception as e:
-                        logger.log(f"Error al procesar email individual: {str(e)}", level="ERROR")
+                        # Sin diario no se marca nada: los correos siguen sin leer y se reintentan
+                        logger.log(f"Error al registrar respuestas en la bandeja de salida: {str(e)}", level="ERROR")
+                        retry_uids.update(to_mark)
+                        continue
+                    if len(new_keys) < len(journal_entries):
+                        logger.log(f"{len(journal_entries) - len(new_keys)} respuestas ya estaban registradas",
+                                   level="INFO")
+                    # Ya en el diario: aunque el STORE falle, el siguiente ciclo no vuelve a procesarlos
+                    self.dedup_cache.add(answered_keys)
+
+                    # Tercera pasada: marcar como leídos con un único UID STORE. Las respuestas ya están a salvo
+                    # en el diario; los que no se marquen se vuelven a ver en el siguiente ciclo sin duplicarse
+                    with metrics.STAGE_DURATION.time(stage='store'):
+                        marked_uids, mark_failures = self._mark_as_read_batch(imap, to_mark, logger)
+                    for uid, error in mark_failures.items():
+                        logger.log(f"Error al marcar email {uid} como leído: {error}", level="ERROR")
+                        retry_uids.add(uid)
+                    if marked_uids:
+                        logger.log(f"{len(marked_uids)} emails marcados como leídos", level="INFO")
+
+                    # Cuarta pasada: encolar las respuestas registradas
+                    self._dispatch_outbox(provider, email_addr, password, logger)
+
+                self._advance_checkpoint(sync_key, mailbox_state, last_uid, message_uids, retry_uids)
+            return True
 
         except Exception as e:
+            self._cycle_errors[(provider, email_addr.lower())] = e
             logger.log(f"Error en check_and_process_emails: {str(e)}", level="ERROR")
+            return False
 
-    def _send_case_reply(self, provider, email_addr, password, response_data, logger, cc_list=None):
-        """Envía una respuesta automática usando los datos del caso"""
-        try:
-            recipient = response_data.get('recipient', '')
-            subject = response_data.get('subject', '')
-            body = response_data.get('body', '')
+    @staticmethod
+    def _mailbox_unchanged(mailbox_state, checkpoint):
+        """Indica si el estado del SELECT demuestra que no hay mensajes nuevos desde el punto guardado"""
+        highestmodseq = mailbox_state.get('highestmodseq')
+        if highestmodseq is not None and highestmodseq == checkpoint.get('highestmodseq'):
+            return True
+        uidnext = mailbox_state.get('uidnext')
+        return uidnext is not None and uidnext <= checkpoint['last_uid'] + 1
 
-            # Extraer solo la dirección de email del remitente
-            if '<' in recipient and '>' in recipient:
-                recipient = recipient.split('<')[1].split('>')[0].strip()
+    def _advance_checkpoint(self, sync_key, mailbox_state, last_uid, message_uids, retry_uids):
+        """Avanza el punto de sincronización hasta el mayor UID procesado sin saltarse ningún reintento"""
+        uidvalidity = mailbox_state.get('uidvalidity')
+        if uidvalidity is None:
+            return
 
-            # Enviar la respuesta
-            return self.send_email(provider, email_addr, password, recipient, subject, body, cc_list)
+        # Todo lo anterior a UIDNEXT del SELECT ya fue cubierto por la búsqueda, que es posterior
+        upper = max([int(uid) for uid in message_uids] + [mailbox_state.get('uidnext', 1) - 1])
+        if retry_uids:
+            upper = min(upper, min(int(uid) for uid in retry_uids) - 1)
 
-        except Exception as e:
-            logger.log(f"Error al enviar respuesta del caso: {str(e)}", level="ERROR")
-            return False
+        self.sync_state.update_checkpoint(sync_key, uidvalidity, max(last_uid, upper),
+                                          mailbox_state.get('highestmodseq'))
+
+    def _open_imap_session(self, provider, email_addr, password, mailbox):
+        """Abre una conexión IMAP autenticada y con el buzón seleccionado (usada por el pool)"""
+        config = self.get_provider_config(provider)
+        started = time.perf_counter()
+
+        imap = self._connect_imap(config)
+        try:
+            imap.login(email_addr, password)
+
+            # Con CONDSTORE el SELECT informa HIGHESTMODSEQ
+            if 'CONDSTORE' in imap.capabilities and 'ENABLE' in imap.capabilities:
+                try:
+                    imap.enable('CONDSTORE')
+                except imaplib.IMAP4.error:
+                    pass
 
-    def _decode_header_value(self, header_value):
-        """Decodifica un valor de cabecera que puede estar codificado"""
-        if not header_value:
-            return ""
+            status, data = imap.select(mailbox)
+            if status != 'OK':
+                raise imaplib.IMAP4.error(f"No se pudo seleccionar {mailbox}: {data}")
+            imap.mailbox_state = self._read_mailbox_state(imap)
+        except Exception:
+            try:
+                imap.shutdown()
+            except Exception:
+                pass
+            raise
+        finally:
+            metrics.STAGE_DURATION.observe(time.perf_counter() - started, stage='login')
+        return imap
+
+    def _connect_imap(self, config):
+        """Abre la conexión IMAP del proveedor (SSL salvo que 'imap_ssl' sea False, p. ej. servidores locales)"""
+        if self.async_backend is not None:
+            return self.async_backend.connect_imap(config['imap_server'], config['imap_port'],
+                                                   config.get('imap_ssl', True))
+        if not config.get('imap_ssl', True):
+            return imaplib.IMAP4(config['imap_server'], config['imap_port'])
+        context = ssl.create_default_context()
+        return imaplib.IMAP4_SSL(config['imap_server'], config['imap_port'], ssl_context=context)
+
+    @staticmethod
+    def _read_mailbox_state(imap):
+        """Extrae UIDVALIDITY, UIDNEXT y HIGHESTMODSEQ de la respuesta al SELECT"""
+        state = {'fresh': True}
+        for name in ('UIDVALIDITY', 'UIDNEXT', 'HIGHESTMODSEQ'):
+            _, data = imap.response(name)
+            if data and data[0]:
+                try:
+                    state[name.lower()] = int(data[-1])
+                except (TypeError, ValueError):
+                    pass
+        return state
+
+    def wait_for_new_mail(self, provider, email_addr, password, timeout=IDLE_REFRESH_SECONDS,
+                          should_stop=None, mailbox='INBOX'):
+        """Espera correo nuevo con IMAP IDLE sobre la sesión persistente
+
+        Devuelve True si llegó correo, False si venció el plazo o se pidió parar,
+        y None si el servidor no soporta IDLE (se debe seguir sondeando).
+        """
+        email_addr = self._sanitize_string(email_addr)
+        password = self._sanitize_string(password)
+
+        with self.imap_pool.session(provider, email_addr, password, mailbox) as imap:
+            return idle_wait(imap, timeout, should_stop)
+
+    def _open_smtp_connection(self, provider, email_addr, password):
+        """Abre una conexión SMTP con STARTTLS y autenticada (usada por el pool)"""
+        config = self.get_provider_config(provider)
+
+        smtp = self._connect_smtp(config)
+        try:
+            smtp.ehlo()
+            if config.get('smtp_starttls', True):
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            smtp.login(email_addr, password)
+        except Exception:
+            smtp.close()
+            raise
+        return smtp
+
+    def _connect_smtp(self, config):
+        """Abre la conexión SMTP del proveedor (sin EHLO ni autenticación)"""
+        if self.async_backend is not None:
+            return self.async_backend.connect_smtp(config['smtp_server'], config['smtp_port'])
+        return smtplib.SMTP(config['smtp_server'], config['smtp_port'])
+
+    def close_connections(self):
+        """Envía las respuestas pendientes y cierra las sesiones persistentes abiertas"""
+        if not self.send_queue.stop(SEND_QUEUE_DRAIN_TIMEOUT):
+            print(f"Quedan {self.send_queue.pending()} respuestas sin enviar en la cola")
+        self.imap_pool.close_all()
+        self.smtp_pool.close_all()
+        if self.async_backend is not None:
+            self.async_backend.close()
+        self.sync_state.flush()
+
+    def _build_outbox_entry(self, provider, email_addr, uidvalidity, uid, case_name, email_data, response_data,
+                            cc_list=None):
+        """Prepara el registro de la bandeja de salida para la respuesta de un caso"""
+        recipient = response_data.get('recipient', '')
+
+        # Extraer solo la dirección de email del remitente
+        if '<' in recipient and '>' in recipient:
+            recipient = recipient.split('<')[1].split('>')[0].strip()
+
+        return {
+            'message_key': self.outbox.make_key(provider, email_addr, email_data.get('message_id'),
+                                                uidvalidity, uid),
+            'provider': provider,
+            'email_addr': email_addr,
+            'case_name': case_name,
+            'recipient': recipient,
+            'subject': response_data.get('subject', ''),
+            'body': response_data.get('body', ''),
+            'cc_list': cc_list or []
+        }
 
+    def _dispatch_outbox(self, provider, email_addr, password, logger):
+        """Encola las respuestas pendientes de la cuenta cuyo próximo intento ya llegó"""
+        try:
+            due_entries = self.outbox.due(provider, email_addr)
+        except Exception as e:
+            logger.log(f"Error al leer la bandeja de salida: {str(e)}", level="ERROR")
+            return
+
+        for entry in due_entries:
+            key = entry['message_key']
+            with self._outbox_lock:
+                # Una respuesta ya en la cola de envío no se vuelve a encolar
+                if key in self._outbox_in_flight:
+                    continue
+                self._outbox_in_flight.add(key)
+
+            if entry['attempts']:
+                logger.log(f"Reintentando respuesta a {entry['recipient']} (intento {entry['attempts'] + 1})",
+                           level="INFO")
+            self.send_queue.enqueue(OutboundMessage(
+                provider, email_addr, password, entry['recipient'], entry['subject'], entry['body'],
+                entry['cc_list'],
+                on_done=functools.partial(self._on_outbox_sent, key, entry['case_name'], entry['recipient'], logger)
+            ))
+
+    def _on_outbox_sent(self, key, case_name, recipient, logger, sent):
+        """Anota en la bandeja de salida el resultado de un envío (lo llama la cola de envío)"""
+        metrics.REPLIES.inc(case=case_name or '', result='sent' if sent else 'failed')
         try:
-            decoded_parts = decode_header(header_value)
-            decoded_text = ""
-
-            for part, encoding in decoded_parts:
-                if isinstance(part, bytes):
-                    if encoding:
-                        decoded_text += part.decode(encoding)
-                    else:
-                        decoded_text += part.decode('utf-8', errors='ignore')
-                else:
-                    decoded_text += part
-
-            return decoded_text
+            if sent:
+                self.outbox.mark_sent(key)
+                logger.log(f"Respuesta automática enviada a {recipient}", level="INFO")
+            else:
+                self.outbox.mark_retry(key, "Error al enviar")
+                logger.log(f"Error al enviar respuesta automática a {recipient}, se reintentará", level="ERROR")
         except Exception as e:
-            print(f"Error al decodificar cabecera: {str(e)}")
-            return str(header_value)
+            logger.log(f"Error al actualizar la bandeja de salida: {str(e)}", level="ERROR")
+        finally:
+            with self._outbox_lock:
+                self._outbox_in_flight.discard(key)
+    
+    def _match_bodies(self, imap, candidates, size, retry_uids, logger):
+        """Busca el caso en el comienzo del cuerpo de los correos cuyo asunto no coincidió
+
+        candidates es una lista de (uid, email_data, cabeceras); devuelve [(uid, caso, email_data)].
+        """
+        uids = [uid for uid, _, _ in candidates]
+        with metrics.STAGE_DURATION.time(stage='fetch_body'):
+            bodies = self._fetch_sections_batch(imap, uids, body_fetch_items(size), "los cuerpos", logger)
+
+        matched = []
+        for uid, email_data, headers in candidates:
+            raw_body = bodies.get(uid)
+            if raw_body is None:
+                logger.log(f"No se pudo obtener el cuerpo del email {uid}", level="WARNING")
+                retry_uids.add(uid)
+                continue
+            try:
+                body_text = decode_text_prefix(raw_body, headers.get('content-type', ''),
+                                               headers.get('content-transfer-encoding', ''))
+                with metrics.STAGE_DURATION.time(stage='match'):
+                    matching_case = self.case_handler.find_matching_case_in_body(body_text, logger)
+            except Exception as e:
+                logger.log(f"Error al revisar el cuerpo del email {uid}: {str(e)}", level="ERROR")
+                retry_uids.add(uid)
+                continue
+
+            metrics.MESSAGES.inc(result='matched' if matching_case else 'unmatched')
+            if matching_case:
+                metrics.MATCHES.inc(case=matching_case)
+                logger.log(f"Email encontrado para caso (por el cuerpo): {matching_case}", level="INFO")
+                email_data['body_text'] = body_text
+                matched.append((uid, matching_case, email_data))
+            else:
+                logger.log(f"Email no coincide con ningún caso específico de respuesta: '{email_data['subject']}'",
+                           level="INFO")
+        return matched
+
+    @staticmethod
+    def _uid_str(uid):
+        return uid.decode() if isinstance(uid, bytes) else str(uid)
+
+    def _fetch_headers_batch(self, imap, uids, logger):
+        """Obtiene las cabeceras de varios mensajes con un solo UID FETCH; devuelve {uid: cabeceras}"""
+        fetch_items = header_fetch_items(self.case_handler.get_rule_header_fields())
+        return self._fetch_sections_batch(imap, uids, fetch_items, "las cabeceras", logger)
+
+    def _fetch_sections_batch(self, imap, uids, fetch_items, description, logger):
+        """Obtiene una sección (cabeceras, cuerpo...) de varios mensajes con un UID FETCH; devuelve {uid: datos}"""
+        sections_by_uid = {}
+        if not uids:
+            return sections_by_uid
+
+        message_set = self._build_message_set(uids)
+        status, data = imap.uid('FETCH', message_set, fetch_items)
+        if status != 'OK' or not data:
+            logger.log(f"No se pudieron obtener {description} del bloque {message_set}: {status}", level="WARNING")
+            return sections_by_uid
+
+        # imaplib devuelve tuplas (prefijo, literal) seguidas del resto de la respuesta como bytes;
+        # el servidor puede enviar el UID antes o después del literal
+        for index, item in enumerate(data):
+            if not isinstance(item, tuple):
+                # Una sección vacía puede llegar como "" o NIL en lugar de como literal
+                match = _UID_RE.search(item) if isinstance(item, bytes) else None
+                if match and _EMPTY_SECTION_RE.search(item):
+                    sections_by_uid[match.group(1).decode()] = b''
+                continue
+            match = _UID_RE.search(item[0])
+            if not match and index + 1 < len(data) and isinstance(data[index + 1], bytes):
+                match = _UID_RE.search(data[index + 1])
+            if match:
+                sections_by_uid[match.group(1).decode()] = item[1]
+
+        return sections_by_uid
+
+    @staticmethod
+    def _build_message_set(uids):
+        """Compacta una lista de UIDs en un conjunto IMAP con rangos (1:5,8,10:12)"""
+        numbers = sorted({int(uid) for uid in uids})
+        ranges = []
+        start = previous = numbers[0]
+        for number in numbers[1:]:
+            if number == previous + 1:
+                previous = number
+                continue
+            ranges.append(f"{start}:{previous}" if start != previous else str(start))
+            start = previous = number
+        ranges.append(f"{start}:{previous}" if start != previous else str(start))
+        return ','.join(ranges)
+
+    def _mark_as_read_batch(self, imap_connection, uids, logger):
+        """Marca varios emails como leídos con un único UID STORE silencioso
+
+        Devuelve el conjunto de UIDs marcados y un diccionario {uid: error} con los que fallaron.
+        Si el lote falla se reintenta mensaje a mensaje para saber exactamente cuáles no se marcaron.
+        """
+        if not uids:
+            return set(), {}
 
-    def _mark_as_read(self, imap_connection, msg_id):
-        """Marca un email específico como leído"""
+        try:
+            message_set = self._build_message_set(uids)
+            status, result = imap_connection.uid('STORE', message_set, '+FLAGS.SILENT', '(\\Seen)')
+            if status == 'OK':
+                return set(uids), {}
+            batch_error = f"Estado no OK: {status} {result}"
+        except (imaplib.IMAP4.abort, OSError):
+            # Con la conexión rota no tiene sentido reintentar uno a uno
+            raise
+        except Exception as e:
+            batch_error = str(e)
+
+        logger.log(f"Error en el marcado por lotes ({batch_error}), reintentando mensaje a mensaje",
+                   level="WARNING")
+        marked, failures = set(), {}
+        for uid in uids:
+            status, result = self._mark_as_read(imap_connection, uid)
+            if status:
+                marked.add(uid)
+            else:
+                failures[uid] = result
+        return marked, failures
+
+    def _mark_as_read(self, imap_connection, uid):
+        """Marca un email específico (por UID) como leído"""
         try:
             # Añadir la flag \Seen al mensaje para marcarlo como leído
-            status, result = imap_connection.store(msg_id, '+FLAGS', '\\Seen')
+            status, result = imap_connection.uid('STORE', uid, '+FLAGS', '\\Seen')
             if status != 'OK':
                 return False, f"Estado no OK: {status}"
 
@@ -420,4 +886,12 @@ class EmailManager:
 
     def get_case_info(self, case_name):
         """Obtiene información de un caso específico"""
-        return self.case_handler.get_case_info(case_name)
\ No newline at end of file
+        return self.case_handler.get_case_info(case_name)
+
+    def get_search_keywords(self):
+        """Obtiene las palabras clave de búsqueda de todos los casos"""
+        return self.case_handler.get_all_search_keywords()
+
+    def has_search_criteria(self, logger=None):
+        """Indica si hay criterios para identificar correos (sin ellos no se revisa el buzón)"""
+        return self.case_handler.has_any_criteria(logger)
\ No newline at end of file
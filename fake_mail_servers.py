@@ -0,0 +1,720 @@
+# Archivo: fake_mail_servers.py
+# Ubicación: raíz del proyecto
+# Descripción: Servidores IMAP4rev1 y SMTP locales en proceso para pruebas y benchmarks
+
+import base64
+import email
+import email.header
+import email.utils
+import re
+import select
+import socketserver
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+
+class FakeMailbox:
+    """Buzón en memoria compartido por todas las sesiones del servidor IMAP"""
+
+    def __init__(self, name='INBOX', uidvalidity=1):
+        self.name = name
+        self.uidvalidity = uidvalidity
+        self.uidnext = 1
+        self.highestmodseq = 1
+        self.messages = []
+        self.condition = threading.Condition()
+
+    def append(self, raw_message, flags=(), internaldate=None):
+        """Añade un mensaje al buzón y despierta a las sesiones en IDLE"""
+        if isinstance(raw_message, str):
+            raw_message = raw_message.encode('utf-8')
+        with self.condition:
+            self.highestmodseq += 1
+            message = {
+                'uid': self.uidnext,
+                'flags': set(flags),
+                'raw': raw_message,
+                'internaldate': internaldate or datetime.now(timezone.utc),
+                'modseq': self.highestmodseq,
+                'appended_at': time.monotonic(),
+            }
+            self.uidnext += 1
+            self.messages.append(message)
+            self.condition.notify_all()
+            return message['uid']
+
+    def find_by_uid(self, uid):
+        """Obtiene un mensaje por su UID"""
+        for message in self.messages:
+            if message['uid'] == uid:
+                return message
+        return None
+
+
+class _IMAPTokenizer:
+    """Tokeniza argumentos IMAP (átomos, cadenas entre comillas, listas y literales)"""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def tokens(self):
+        result = []
+        stack = [result]
+        while self.pos < len(self.data):
+            char = self.data[self.pos]
+            if char == ' ':
+                self.pos += 1
+            elif char == '(':
+                new_list = []
+                stack[-1].append(new_list)
+                stack.append(new_list)
+                self.pos += 1
+            elif char == ')':
+                if len(stack) > 1:
+                    stack.pop()
+                self.pos += 1
+            elif char == '"':
+                self.pos += 1
+                value = []
+                while self.pos < len(self.data) and self.data[self.pos] != '"':
+                    if self.data[self.pos] == '\\' and self.pos + 1 < len(self.data):
+                        self.pos += 1
+                    value.append(self.data[self.pos])
+                    self.pos += 1
+                self.pos += 1
+                stack[-1].append(_Quoted(''.join(value)))
+            else:
+                # Átomo; una sección entre corchetes puede contener espacios y paréntesis (HEADER.FIELDS (...))
+                match = re.compile(r'[^ ()"\[]+(\[[^\]]*\](<[\d.]+>)?)?|\[[^\]]*\]').match(self.data, self.pos)
+                stack[-1].append(match.group(0))
+                self.pos = match.end()
+        return result
+
+
+class _Quoted(str):
+    """Cadena que venía entre comillas en el comando"""
+
+
+def _parse_sequence_set(text, maximum):
+    """Convierte un conjunto de secuencia IMAP (1:3,5,7:*) en un predicado"""
+    ranges = []
+    for part in str(text).split(','):
+        if ':' in part:
+            start, end = part.split(':', 1)
+            start = maximum if start == '*' else int(start)
+            end = maximum if end == '*' else int(end)
+            ranges.append((min(start, end), max(start, end)))
+        else:
+            value = maximum if part == '*' else int(part)
+            ranges.append((value, value))
+    return lambda number: any(start <= number <= end for start, end in ranges)
+
+
+class FakeIMAPHandler(socketserver.StreamRequestHandler):
+    """Atiende una sesión IMAP4rev1 con el subconjunto de comandos que usa el bot"""
+
+    def setup(self):
+        super().setup()
+        self.selected = None
+        self.authenticated = False
+        self.utf8_enabled = False
+
+    # --- E/S ---
+    def _send(self, line):
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        self.wfile.write(line + b'\r\n')
+        self.wfile.flush()
+
+    def _read_command(self):
+        """Lee una línea de comando completa resolviendo literales {n}"""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        data = line.rstrip(b'\r\n')
+        while True:
+            match = re.search(rb'\{(\d+)\+?\}$', data)
+            if not match:
+                break
+            self._send('+ Ready for literal data')
+            literal = self.rfile.read(int(match.group(1)))
+            data = data[:match.start()] + b'"' + literal.replace(b'"', b'\\"') + b'"'
+            data += self.rfile.readline().rstrip(b'\r\n')
+        return data.decode('utf-8', errors='replace')
+
+    def handle(self):
+        self._send('* OK [CAPABILITY %s] Fake IMAP4rev1 listo' % self.server.capability_string())
+        while True:
+            try:
+                line = self._read_command()
+            except (ConnectionError, OSError):
+                return
+            if line is None:
+                return
+            if not line.strip():
+                continue
+            parts = line.split(' ', 2)
+            tag = parts[0]
+            command = parts[1].upper() if len(parts) > 1 else ''
+            arguments = parts[2] if len(parts) > 2 else ''
+            use_uid = False
+            if command == 'UID':
+                sub_parts = arguments.split(' ', 1)
+                command = sub_parts[0].upper()
+                arguments = sub_parts[1] if len(sub_parts) > 1 else ''
+                use_uid = True
+
+            self.server.record_command(('UID ' if use_uid else '') + command)
+            if self.server.latency:
+                time.sleep(self.server.latency)
+
+            handler = getattr(self, f'_cmd_{command.lower()}', None)
+            if handler is None:
+                self._send(f'{tag} BAD Comando desconocido')
+                continue
+            try:
+                if handler(tag, arguments, use_uid) == 'LOGOUT':
+                    return
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                self._send(f'{tag} BAD {e}')
+
+    # --- Comandos ---
+    def _cmd_capability(self, tag, arguments, use_uid):
+        self._send('* CAPABILITY ' + self.server.capability_string())
+        self._send(f'{tag} OK CAPABILITY completado')
+
+    def _cmd_noop(self, tag, arguments, use_uid):
+        self._send_pending_exists()
+        self._send(f'{tag} OK NOOP completado')
+
+    def _cmd_logout(self, tag, arguments, use_uid):
+        self._send('* BYE Cerrando sesión')
+        self._send(f'{tag} OK LOGOUT completado')
+        return 'LOGOUT'
+
+    def _cmd_login(self, tag, arguments, use_uid):
+        tokens = _IMAPTokenizer(arguments).tokens()
+        if len(tokens) < 2 or not self.server.check_credentials(tokens[0], tokens[1]):
+            self._send(f'{tag} NO [AUTHENTICATIONFAILED] Credenciales inválidas')
+            return
+        self.authenticated = True
+        self._send(f'{tag} OK [CAPABILITY {self.server.capability_string()}] LOGIN completado')
+
+    def _cmd_authenticate(self, tag, arguments, use_uid):
+        mechanism = arguments.split(' ')[0].upper()
+        if mechanism != 'PLAIN':
+            self._send(f'{tag} NO Mecanismo no soportado')
+            return
+        self._send('+ ')
+        response = self.rfile.readline().strip()
+        try:
+            _, user, password = base64.b64decode(response).decode('utf-8').split('\x00')
+        except Exception:
+            self._send(f'{tag} BAD Respuesta AUTHENTICATE inválida')
+            return
+        if not self.server.check_credentials(user, password):
+            self._send(f'{tag} NO [AUTHENTICATIONFAILED] Credenciales inválidas')
+            return
+        self.authenticated = True
+        self._send(f'{tag} OK AUTHENTICATE completado')
+
+    def _cmd_enable(self, tag, arguments, use_uid):
+        enabled = [item for item in arguments.upper().split() if item in ('CONDSTORE', 'UTF8=ACCEPT')]
+        if 'UTF8=ACCEPT' in enabled:
+            self.utf8_enabled = True
+        self._send('* ENABLED ' + ' '.join(enabled))
+        self._send(f'{tag} OK ENABLE completado')
+
+    def _cmd_select(self, tag, arguments, use_uid):
+        if not self.authenticated:
+            self._send(f'{tag} NO No autenticado')
+            return
+        tokens = _IMAPTokenizer(arguments).tokens()
+        mailbox = self.server.mailboxes.get(str(tokens[0]).upper() if tokens else 'INBOX')
+        if mailbox is None:
+            self._send(f'{tag} NO Buzón inexistente')
+            return
+        self.selected = mailbox
+        self.known_exists = len(mailbox.messages)
+        self._send(f'* {len(mailbox.messages)} EXISTS')
+        self._send('* 0 RECENT')
+        self._send('* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)')
+        self._send(f'* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs válidos')
+        self._send(f'* OK [UIDNEXT {mailbox.uidnext}] Siguiente UID')
+        if 'CONDSTORE' in self.server.capabilities:
+            self._send(f'* OK [HIGHESTMODSEQ {mailbox.highestmodseq}] Modseq más alto')
+        self._send(f'{tag} OK [READ-WRITE] SELECT completado')
+
+    _cmd_examine = _cmd_select
+
+    def _cmd_status(self, tag, arguments, use_uid):
+        tokens = _IMAPTokenizer(arguments).tokens()
+        mailbox = self.server.mailboxes.get(str(tokens[0]).upper())
+        if mailbox is None:
+            self._send(f'{tag} NO Buzón inexistente')
+            return
+        values = {
+            'MESSAGES': len(mailbox.messages),
+            'UIDNEXT': mailbox.uidnext,
+            'UIDVALIDITY': mailbox.uidvalidity,
+            'UNSEEN': sum(1 for m in mailbox.messages if '\\Seen' not in m['flags']),
+            'HIGHESTMODSEQ': mailbox.highestmodseq,
+        }
+        items = [str(item).upper() for item in (tokens[1] if len(tokens) > 1 else [])]
+        body = ' '.join(f'{item} {values[item]}' for item in items if item in values)
+        self._send(f'* STATUS {mailbox.name} ({body})')
+        self._send(f'{tag} OK STATUS completado')
+
+    def _cmd_search(self, tag, arguments, use_uid):
+        if self.selected is None:
+            self._send(f'{tag} BAD Ningún buzón seleccionado')
+            return
+        tokens = _IMAPTokenizer(arguments).tokens()
+        if tokens and str(tokens[0]).upper() == 'CHARSET':
+            charset = str(tokens[1]).upper()
+            if charset not in ('US-ASCII', 'UTF-8') or (charset == 'UTF-8' and not self.server.utf8_search):
+                self._send(f'{tag} NO [BADCHARSET (US-ASCII)] Charset no soportado')
+                return
+            tokens = tokens[2:]
+        messages = list(self.selected.messages)
+        results = []
+        for sequence, message in enumerate(messages, start=1):
+            if self._matches_all(tokens, message, sequence, messages):
+                results.append(message['uid'] if use_uid else sequence)
+        self._send('* SEARCH' + ''.join(f' {number}' for number in results))
+        self._send(f'{tag} OK SEARCH completado')
+
+    def _cmd_fetch(self, tag, arguments, use_uid):
+        if self.selected is None:
+            self._send(f'{tag} BAD Ningún buzón seleccionado')
+            return
+        sequence_set, _, items = arguments.partition(' ')
+        item_tokens = _IMAPTokenizer(items).tokens()
+        if item_tokens and isinstance(item_tokens[0], list):
+            item_tokens = item_tokens[0]
+        for sequence, message in self._select_messages(sequence_set, use_uid):
+            self._send_fetch(sequence, message, item_tokens, use_uid)
+        self._send(f'{tag} OK FETCH completado')
+
+    def _cmd_store(self, tag, arguments, use_uid):
+        if self.selected is None:
+            self._send(f'{tag} BAD Ningún buzón seleccionado')
+            return
+        sequence_set, _, rest = arguments.partition(' ')
+        action, _, flag_text = rest.partition(' ')
+        flags = set(flag_text.strip('()').split())
+        action = action.upper()
+        silent = action.endswith('.SILENT')
+        action = action.replace('.SILENT', '')
+        with self.selected.condition:
+            for sequence, message in self._select_messages(sequence_set, use_uid):
+                if action == '+FLAGS':
+                    message['flags'] |= flags
+                elif action == '-FLAGS':
+                    message['flags'] -= flags
+                else:
+                    message['flags'] = set(flags)
+                self.selected.highestmodseq += 1
+                message['modseq'] = self.selected.highestmodseq
+                if not silent:
+                    flag_list = ' '.join(sorted(message['flags']))
+                    uid_part = f'UID {message["uid"]} ' if use_uid else ''
+                    self._send(f'* {sequence} FETCH ({uid_part}FLAGS ({flag_list}))')
+        self._send(f'{tag} OK STORE completado')
+
+    def _cmd_idle(self, tag, arguments, use_uid):
+        if 'IDLE' not in self.server.capabilities:
+            self._send(f'{tag} BAD IDLE no soportado')
+            return
+        self._send('+ idling')
+        connection = self.request
+        while True:
+            self._send_pending_exists()
+            readable, _, _ = select.select([connection], [], [], 0.02)
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return 'LOGOUT'
+                if line.strip().upper() == b'DONE':
+                    break
+        self._send(f'{tag} OK IDLE terminado')
+
+    # --- Utilidades ---
+    def _send_pending_exists(self):
+        if self.selected is None:
+            return
+        current = len(self.selected.messages)
+        if current != getattr(self, 'known_exists', current):
+            self._send(f'* {current} EXISTS')
+            self._send(f'* {max(0, current - self.known_exists)} RECENT')
+        self.known_exists = current
+
+    def _select_messages(self, sequence_set, use_uid):
+        messages = list(self.selected.messages)
+        if use_uid:
+            highest = messages[-1]['uid'] if messages else 0
+            predicate = _parse_sequence_set(sequence_set, highest)
+            return [(seq, m) for seq, m in enumerate(messages, start=1) if predicate(m['uid'])]
+        predicate = _parse_sequence_set(sequence_set, len(messages))
+        return [(seq, m) for seq, m in enumerate(messages, start=1) if predicate(seq)]
+
+    def _send_fetch(self, sequence, message, items, use_uid):
+        parts = []
+        literals = []
+        requested = [str(item).upper() if not isinstance(item, list) else item for item in items]
+        if use_uid and 'UID' not in requested:
+            requested.insert(0, 'UID')
+        for item in requested:
+            if isinstance(item, list):
+                continue
+            if item == 'UID':
+                parts.append(f'UID {message["uid"]}')
+            elif item == 'FLAGS':
+                parts.append('FLAGS (%s)' % ' '.join(sorted(message['flags'])))
+            elif item == 'MODSEQ':
+                parts.append(f'MODSEQ ({message["modseq"]})')
+            elif item == 'RFC822' or item.startswith('BODY'):
+                section_name, content = self._fetch_section(message, item, items)
+                literals.append((section_name, content))
+                if not item.startswith('BODY.PEEK'):
+                    message['flags'].add('\\Seen')
+
+        prefix = f'* {sequence} FETCH (' + ' '.join(parts)
+        if not literals:
+            self._send(prefix + ')')
+            return
+        data = prefix.encode('utf-8')
+        for index, (section_name, content) in enumerate(literals):
+            separator = b' ' if (parts or index) else b''
+            data += separator + f'{section_name} {{{len(content)}}}\r\n'.encode('utf-8') + content
+        self._send(data + b')')
+
+    def _fetch_section(self, message, item, items):
+        raw = message['raw']
+        header_end = raw.find(b'\r\n\r\n')
+        if header_end < 0:
+            header_end = raw.find(b'\n\n')
+            separator_length = 2
+        else:
+            separator_length = 4
+        header = raw[:header_end + separator_length] if header_end >= 0 else raw
+        text = raw[header_end + separator_length:] if header_end >= 0 else b''
+
+        if item == 'RFC822':
+            return 'RFC822', raw
+        section = item[item.index('[') + 1:item.index(']')] if '[' in item else ''
+        partial = re.search(r'<(\d+)\.(\d+)>$', item)
+        name = 'BODY[%s]' % section
+        if section == 'HEADER':
+            content = header
+        elif section.startswith('HEADER.FIELDS'):
+            wanted = {field.upper() for field in re.findall(r'[\w-]+', section[len('HEADER.FIELDS'):])}
+            content = self._filter_header(header, wanted)
+        elif section == 'TEXT':
+            content = text
+        else:
+            content = raw
+        if partial:
+            start, length = int(partial.group(1)), int(partial.group(2))
+            content = content[start:start + length]
+            name += f'<{start}>'
+        return name, content
+
+    @staticmethod
+    def _filter_header(header, wanted):
+        lines = header.replace(b'\r\n', b'\n').split(b'\n')
+        result = []
+        keep = False
+        for line in lines:
+            if not line:
+                continue
+            if line[:1] in (b' ', b'\t'):
+                if keep:
+                    result.append(line)
+                continue
+            name = line.split(b':', 1)[0].decode('ascii', errors='ignore').upper()
+            keep = name in wanted
+            if keep:
+                result.append(line)
+        return b'\r\n'.join(result) + b'\r\n\r\n'
+
+    def _matches_all(self, tokens, message, sequence, messages):
+        position = 0
+        while position < len(tokens):
+            matched, position = self._evaluate(tokens, position, message, sequence, messages)
+            if not matched:
+                return False
+        return True
+
+    def _evaluate(self, tokens, position, message, sequence, messages):
+        token = tokens[position]
+        if isinstance(token, list):
+            return self._matches_all(token, message, sequence, messages), position + 1
+        key = str(token).upper()
+        headers = email.message_from_bytes(message['raw'])
+
+        if key == 'ALL':
+            return True, position + 1
+        if key == 'UNSEEN':
+            return '\\Seen' not in message['flags'], position + 1
+        if key == 'SEEN':
+            return '\\Seen' in message['flags'], position + 1
+        if key == 'NOT':
+            matched, position = self._evaluate(tokens, position + 1, message, sequence, messages)
+            return not matched, position
+        if key == 'OR':
+            left, position = self._evaluate(tokens, position + 1, message, sequence, messages)
+            right, position = self._evaluate(tokens, position, message, sequence, messages)
+            return left or right, position
+        if key == 'SINCE':
+            since = datetime.strptime(str(tokens[position + 1]), '%d-%b-%Y').date()
+            return message['internaldate'].date() >= since, position + 2
+        if key == 'UID':
+            highest = messages[-1]['uid'] if messages else 0
+            return _parse_sequence_set(tokens[position + 1], highest)(message['uid']), position + 2
+        if key == 'MODSEQ':
+            return message['modseq'] >= int(str(tokens[position + 1])), position + 2
+        if key in ('SUBJECT', 'FROM', 'TO'):
+            value = str(email.header.make_header(email.header.decode_header(headers.get(key.title(), ''))))
+            return str(tokens[position + 1]).lower() in value.lower(), position + 2
+        if key == 'HEADER':
+            value = headers.get(str(tokens[position + 1]), '')
+            return str(tokens[position + 2]).lower() in value.lower(), position + 3
+        if key in ('BODY', 'TEXT'):
+            # Como un servidor real, se busca en el texto ya decodificado (base64, quoted-printable)
+            payload = message['raw'].decode('utf-8', errors='ignore')
+            for part in headers.walk():
+                if part.get_content_maintype() == 'text':
+                    payload += '\n' + (part.get_payload(decode=True) or b'').decode(
+                        part.get_content_charset() or 'utf-8', errors='ignore')
+            return str(tokens[position + 1]).lower() in payload.lower(), position + 2
+        if re.fullmatch(r'[\d:*,]+', key):
+            return _parse_sequence_set(key, len(messages))(sequence), position + 1
+        raise ValueError(f'Criterio no soportado: {key}')
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    """Servidor IMAP4rev1 en proceso con latencia configurable"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, users=None, latency=0.0,
+                 capabilities=('IMAP4rev1', 'IDLE', 'UIDPLUS', 'ENABLE', 'CONDSTORE', 'AUTH=PLAIN'),
+                 utf8_search=True):
+        super().__init__((host, port), FakeIMAPHandler)
+        self.users = dict(users or {'bot@example.com': 'secret'})
+        self.latency = latency
+        self.capabilities = list(capabilities)
+        self.utf8_search = utf8_search
+        self.mailboxes = {'INBOX': FakeMailbox('INBOX')}
+        self.command_counts = Counter()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def inbox(self):
+        return self.mailboxes['INBOX']
+
+    @property
+    def address(self):
+        return self.server_address[0], self.server_address[1]
+
+    def capability_string(self):
+        return ' '.join(self.capabilities)
+
+    def check_credentials(self, user, password):
+        return self.users.get(str(user)) == str(password)
+
+    def record_command(self, command):
+        with self._stats_lock:
+            self.command_counts[command] += 1
+
+    def total_commands(self):
+        with self._stats_lock:
+            return sum(self.command_counts.values())
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _envelope_address(argument):
+    """Dirección de un argumento de MAIL/RCPT ("FROM:<a@b> SIZE=10" -> "a@b")"""
+    match = re.search(r'<([^>]*)>', argument)
+    return match.group(1) if match else argument.partition(':')[2].strip()
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """Atiende una sesión SMTP con EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, RSET y NOOP"""
+
+    def _send(self, line):
+        self.wfile.write(line.encode('utf-8') + b'\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        self._send('220 fake.smtp ESMTP listo')
+        authenticated = False
+        envelope = {'from': None, 'to': []}
+        while True:
+            try:
+                line = self.rfile.readline()
+            except (ConnectionError, OSError):
+                return
+            if not line:
+                return
+            command_line = line.decode('utf-8', errors='replace').rstrip('\r\n')
+            verb = command_line.split(' ', 1)[0].upper()
+            argument = command_line[len(verb):].strip()
+            self.server.record_command(verb)
+            if self.server.latency:
+                time.sleep(self.server.latency)
+
+            if verb in ('EHLO', 'HELO'):
+                self._send('250-fake.smtp')
+                self._send('250-AUTH PLAIN LOGIN')
+                self._send('250 8BITMIME')
+            elif verb == 'AUTH':
+                authenticated = self._authenticate(argument)
+            elif verb == 'MAIL':
+                if not authenticated:
+                    self._send('530 Autenticación requerida')
+                    continue
+                envelope = {'from': _envelope_address(argument), 'to': []}
+                self._send('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(_envelope_address(argument))
+                self._send('250 OK')
+            elif verb == 'DATA':
+                self._send('354 Termine con <CRLF>.<CRLF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    if data_line.startswith(b'..'):
+                        data_line = data_line[1:]
+                    lines.append(data_line)
+                self.server.deliver(envelope, b''.join(lines))
+                envelope = {'from': None, 'to': []}
+                self._send('250 OK mensaje aceptado')
+            elif verb == 'RSET':
+                envelope = {'from': None, 'to': []}
+                self._send('250 OK')
+            elif verb == 'NOOP':
+                self._send('250 OK')
+            elif verb == 'QUIT':
+                self._send('221 Adiós')
+                return
+            else:
+                self._send('502 Comando no implementado')
+
+    def _authenticate(self, argument):
+        parts = argument.split(' ')
+        mechanism = parts[0].upper()
+        try:
+            if mechanism == 'PLAIN':
+                if len(parts) > 1:
+                    encoded = parts[1]
+                else:
+                    self._send('334 ')
+                    encoded = self.rfile.readline().strip().decode('ascii')
+                _, user, password = base64.b64decode(encoded).decode('utf-8').split('\x00')
+            elif mechanism == 'LOGIN':
+                if len(parts) > 1:
+                    user = base64.b64decode(parts[1]).decode('utf-8')
+                else:
+                    self._send('334 VXNlcm5hbWU6')
+                    user = base64.b64decode(self.rfile.readline().strip()).decode('utf-8')
+                self._send('334 UGFzc3dvcmQ6')
+                password = base64.b64decode(self.rfile.readline().strip()).decode('utf-8')
+            else:
+                self._send('504 Mecanismo no soportado')
+                return False
+        except Exception:
+            self._send('501 Respuesta de autenticación inválida')
+            return False
+
+        if self.server.users.get(user) != password:
+            self._send('535 Credenciales inválidas')
+            return False
+        self.server.record_command('LOGIN')
+        self._send('235 Autenticación correcta')
+        return True
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """Servidor SMTP en proceso que almacena los mensajes recibidos"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, users=None, latency=0.0):
+        super().__init__((host, port), FakeSMTPHandler)
+        self.users = dict(users or {'bot@example.com': 'secret'})
+        self.latency = latency
+        self.received = []
+        self.command_counts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.server_address[0], self.server_address[1]
+
+    def record_command(self, command):
+        with self._lock:
+            self.command_counts[command] += 1
+
+    def deliver(self, envelope, data):
+        with self._lock:
+            self.received.append({
+                'from': envelope['from'],
+                'to': list(envelope['to']),
+                'data': data,
+                'received_at': time.monotonic(),
+            })
+
+    def total_commands(self):
+        with self._lock:
+            return sum(self.command_counts.values())
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def build_message(subject, sender='cliente@example.com', recipient='bot@example.com', body='Hola',
+                  message_id=None, extra_headers=None):
+    """Construye un mensaje RFC 5322 simple para sembrar el buzón"""
+    # Los asuntos no ASCII se codifican (RFC 2047) como haría un cliente de correo real
+    if not subject.isascii():
+        subject = email.header.Header(subject, 'utf-8').encode()
+    headers = [
+        f'From: {sender}',
+        f'To: {recipient}',
+        f'Subject: {subject}',
+        f'Date: {email.utils.formatdate(localtime=True)}',
+        f'Message-ID: {message_id or email.utils.make_msgid(domain="example.com")}',
+        'MIME-Version: 1.0',
+        'Content-Type: text/plain; charset="utf-8"',
+        'Content-Transfer-Encoding: 8bit',
+    ]
+    for name, value in (extra_headers or {}).items():
+        headers.append(f'{name}: {value}')
+    return ('\r\n'.join(headers) + '\r\n\r\n' + body + '\r\n').encode('utf-8')
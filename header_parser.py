@@ -0,0 +1,87 @@
+# Archivo: header_parser.py
+# Ubicación: raíz del proyecto
+# Descripción: Descarga mínima de cabeceras (HEADER.FIELDS) y parser ligero con decodificación RFC 2047 memorizada
+
+import functools
+from email.header import decode_header
+
+# Únicas cabeceras que necesita el procesamiento de correo (las de contenido, para decodificar el cuerpo)
+HEADER_FIELDS = ('SUBJECT', 'FROM', 'MESSAGE-ID', 'DATE', 'AUTO-SUBMITTED', 'CONTENT-TYPE',
+                 'CONTENT-TRANSFER-ENCODING')
+
+
+def header_fetch_items(extra_fields=()):
+    """Elemento de UID FETCH que pide solo esas cabeceras (y las extra) sin marcar el mensaje como leído"""
+    extra = sorted({field.upper() for field in extra_fields} - set(HEADER_FIELDS))
+    return '(UID BODY.PEEK[HEADER.FIELDS (%s)])' % ' '.join(HEADER_FIELDS + tuple(extra))
+
+
+# Valores decodificados que se conservan (los asuntos se repiten mucho entre correos)
+DECODE_CACHE_SIZE = 4096
+
+
+def parse_header_fields(raw_headers):
+    """Parsea un bloque de cabeceras; devuelve {nombre en minúsculas: valor sin plegar}
+
+    Solo separa líneas y une las de continuación: no construye un objeto Message ni decodifica
+    nada. Si una cabecera se repite se conserva la primera.
+    """
+    if isinstance(raw_headers, bytes):
+        try:
+            text = raw_headers.decode('utf-8')
+        except UnicodeDecodeError:
+            # Cabeceras de 8 bits sin codificar: latin-1 nunca falla
+            text = raw_headers.decode('latin-1')
+    else:
+        text = raw_headers or ''
+
+    headers = {}
+    name = None
+    for line in text.replace('\r\n', '\n').split('\n'):
+        if not line:
+            # Una línea vacía termina el bloque de cabeceras
+            if headers or name:
+                break
+            continue
+        if line[0] in ' \t':
+            # Línea de continuación de la cabecera anterior
+            if name is not None and headers.get(name) is not None:
+                headers[name] += ' ' + line.strip()
+            continue
+        field, separator, value = line.partition(':')
+        if not separator:
+            name = None
+            continue
+        name = field.strip().lower()
+        if name in headers:
+            # Repetida: se ignoran también sus líneas de continuación
+            name = None
+            continue
+        headers[name] = value.strip()
+    return headers
+
+
+@functools.lru_cache(maxsize=DECODE_CACHE_SIZE)
+def decode_header_value(header_value):
+    """Decodifica las palabras codificadas RFC 2047 de un valor de cabecera"""
+    if not header_value:
+        return ""
+    # Camino rápido: sin palabras codificadas no hay nada que decodificar
+    if '=?' not in header_value:
+        return header_value
+
+    try:
+        decoded_text = ""
+        for part, encoding in decode_header(header_value):
+            if isinstance(part, bytes):
+                try:
+                    decoded_text += part.decode(encoding or 'utf-8', errors='replace')
+                except LookupError:
+                    # Charset desconocido
+                    decoded_text += part.decode('utf-8', errors='replace')
+            else:
+                decoded_text += part
+        return decoded_text
+    except Exception as e:
+        print(f"Error al decodificar cabecera: {str(e)}")
+        return str(header_value)
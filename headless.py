@@ -0,0 +1,95 @@
+# Archivo: headless.py
+# Ubicación: raíz del proyecto
+# Descripción: Modo sin interfaz (daemon) para ejecutar el monitoreo en servidores sin pantalla ni tkinter
+
+import argparse
+import signal
+import sys
+import metrics
+from config_manager import ConfigManager
+from email_manager import EmailManager
+from logger import Logger
+from monitor_service import MonitorService
+
+
+def parse_args(argv=None):
+    """Interpreta los argumentos de línea de comandos del modo sin interfaz"""
+    parser = argparse.ArgumentParser(description="Bot de Correo en modo sin interfaz")
+    parser.add_argument("--config", default=ConfigManager.DEFAULT_CONFIG_FILE,
+                        help="Ruta del archivo de configuración (por defecto: config.json)")
+    parser.add_argument("--log-file", default=None,
+                        help="Archivo donde añadir los mensajes de log además de la consola")
+    parser.add_argument("--once", action="store_true",
+                        help="Ejecutar un único ciclo de revisión y salir")
+    return parser.parse_args(argv)
+
+
+def install_signal_handlers(service):
+    """Detiene el servicio con SIGINT/SIGTERM y recarga los casos con SIGHUP
+
+    Los manejadores se ejecutan en el hilo principal interrumpiendo lo que esté haciendo, que puede
+    tener tomado el candado del log o el de los casos: por eso solo piden la acción (sin registrar
+    nada ni tomar candados) y el servicio la hace y la registra desde su bucle.
+    """
+    def handle_stop(signum, frame):
+        service.stop()
+
+    def handle_reload(signum, frame):
+        service.request_reload()
+
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGTERM, handle_stop)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, handle_reload)
+
+
+def main(argv=None):
+    """Función principal del modo sin interfaz; devuelve el código de salida"""
+    # Configurar codificación UTF-8 para todo el sistema
+    if sys.stdout.encoding != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+    if sys.stderr.encoding != 'utf-8':
+        sys.stderr.reconfigure(encoding='utf-8')
+
+    args = parse_args(argv)
+
+    # Todas las instancias (casos incluidos) usan el archivo indicado
+    ConfigManager.set_default_config_file(args.config)
+
+    logger = Logger(log_file=args.log_file)
+    config_manager = ConfigManager()
+    email_manager = EmailManager()
+    service = MonitorService(email_manager, config_manager, logger)
+
+    error = service.validate()
+    if error:
+        logger.log(error, level="ERROR")
+        return 1
+
+    if args.once:
+        try:
+            ok = service.run_cycle()
+        finally:
+            email_manager.close_connections()
+
+        # Con --once (p. ej. desde cron) el archivo de métricas se escribe al terminar
+        metrics_file = config_manager.get_value('metrics_file')
+        if metrics_file:
+            try:
+                metrics.write_metrics_file(metrics_file)
+            except OSError as e:
+                logger.log(f"Error al escribir el archivo de métricas: {str(e)}", level="ERROR")
+        return 0 if ok else 1
+
+    install_signal_handlers(service)
+    logger.log("Monitoreo iniciado (modo sin interfaz)", level="INFO")
+
+    # El bucle corre en el hilo principal para que las señales lo detengan
+    service.run()
+
+    logger.log("Parada solicitada: monitoreo detenido", level="INFO")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# Archivo: imap_idle.py
+# Ubicación: raíz del proyecto
+# Descripción: Soporte de IMAP IDLE (RFC 2177) para esperar correo nuevo sin sondeo periódico
+
+import re
+import select
+import ssl
+import time
+import imaplib
+
+# RFC 2177 permite al servidor cortar un IDLE tras 29 minutos; se reemite bastante antes
+# para sobrevivir también a NAT y cortafuegos que cierran conexiones inactivas
+IDLE_REFRESH_SECONDS = 9 * 60
+
+_NEW_MAIL_RE = re.compile(rb'^\* \d+ (EXISTS|RECENT)\b', re.IGNORECASE)
+
+
+def supports_idle(imap):
+    """Indica si el servidor anunció IDLE en su CAPABILITY"""
+    return 'IDLE' in getattr(imap, 'capabilities', ())
+
+
+def reset_new_mail_notifications(imap):
+    """Olvida los EXISTS/RECENT recibidos hasta ahora (se llama antes de cada búsqueda)"""
+    imap.untagged_responses.pop('EXISTS', None)
+    imap.untagged_responses.pop('RECENT', None)
+
+
+def has_new_mail_notification(imap):
+    """Indica si algún comando anterior recibió un EXISTS/RECENT tras la última búsqueda"""
+    return 'EXISTS' in imap.untagged_responses or 'RECENT' in imap.untagged_responses
+
+
+def buffered_data(imap):
+    """Datos recibidos que imaplib aún no ha leído (los de su búfer o, si está vacío, los del socket)
+
+    Consulta imap.file sin bloquear: con el socket en modo no bloqueante, peek devuelve lo que ya
+    esté en el búfer o lo que haya llegado, y b'' si no hay nada (o si el servidor cerró).
+    """
+    sock = imap.sock
+    previous = sock.gettimeout()
+    sock.settimeout(0.0)
+    try:
+        return imap.file.peek()
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return b''
+    finally:
+        sock.settimeout(previous)
+
+
+def has_pending_data(imap):
+    """Indica si el servidor envió algo que aún no se ha leído (respuesta sin etiqueta, BYE o cierre)"""
+    # Las conexiones del backend asyncio llevan su propio búfer de recepción
+    if hasattr(imap, 'has_pending_data'):
+        return imap.has_pending_data()
+    if buffered_data(imap):
+        return True
+    sock = imap.sock
+    if getattr(sock, 'pending', None) and sock.pending():
+        return True
+    readable, _, _ = select.select([sock], [], [], 0)
+    return bool(readable)
+
+
+def _read_line(imap, timeout):
+    """Lee la siguiente línea a través de imaplib (sin CRLF) o devuelve None si vence el plazo
+
+    Se lee siempre de imap.file para no saltarse lo que imaplib ya tenga en su búfer: primero se
+    mira el búfer y solo si no contiene una línea completa se espera al socket con select.
+    """
+    deadline = time.monotonic() + timeout
+    while b'\n' not in buffered_data(imap):
+        sock = imap.sock
+        if getattr(sock, 'pending', None) and sock.pending():
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        readable, _, _ = select.select([sock], [], [], remaining)
+        if not readable:
+            return None
+        # Llegaron datos: si aún no forman una línea completa, readline espera al resto
+        if b'\n' not in buffered_data(imap):
+            break
+
+    line = imap.readline()
+    if not line:
+        raise imaplib.IMAP4.abort('conexión cerrada por el servidor durante IDLE')
+    return line.rstrip(b'\r\n')
+
+
+def idle_wait(imap, timeout=IDLE_REFRESH_SECONDS, should_stop=None, tick=1.0):
+    """Espera en IDLE hasta recibir EXISTS/RECENT, vencer el plazo o pedirse la parada
+
+    Devuelve True si llegó correo nuevo, False si terminó sin novedades y None si el
+    servidor no soporta IDLE (el llamador debe volver al sondeo).
+    """
+    if not supports_idle(imap):
+        return None
+    if has_new_mail_notification(imap):
+        return True
+    # Las conexiones del backend asyncio esperan el IDLE en su bucle de eventos
+    if hasattr(imap, 'idle_wait'):
+        return imap.idle_wait(timeout, should_stop, tick)
+
+    tag = imap._new_tag()
+    new_mail = False
+    try:
+        imap.send(tag + b' IDLE\r\n')
+
+        # Esperar la respuesta de continuación "+ idling"
+        while True:
+            line = _read_line(imap, 30)
+            if line is None:
+                raise imaplib.IMAP4.abort('el servidor no respondió al comando IDLE')
+            if line.startswith(b'+'):
+                break
+            if line.startswith(tag + b' '):
+                return None
+            if _NEW_MAIL_RE.match(line):
+                new_mail = True
+
+        deadline = time.monotonic() + timeout
+        while not new_mail and time.monotonic() < deadline:
+            if should_stop and should_stop():
+                break
+            line = _read_line(imap, min(tick, max(0, deadline - time.monotonic())))
+            if line is None:
+                continue
+            if line.upper().startswith(b'* BYE'):
+                raise imaplib.IMAP4.abort(line.decode('utf-8', errors='ignore'))
+            if _NEW_MAIL_RE.match(line):
+                new_mail = True
+
+        # Terminar el IDLE y consumir la respuesta etiquetada
+        imap.send(b'DONE\r\n')
+        while True:
+            line = _read_line(imap, 30)
+            if line is None:
+                raise imaplib.IMAP4.abort('el servidor no cerró el comando IDLE')
+            if line.startswith(tag + b' '):
+                if not line[len(tag):].strip().upper().startswith(b'OK'):
+                    raise imaplib.IMAP4.error(line.decode('utf-8', errors='ignore'))
+                break
+            if _NEW_MAIL_RE.match(line):
+                new_mail = True
+        return new_mail
+    finally:
+        imap.tagged_commands.pop(tag, None)
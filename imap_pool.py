@@ -0,0 +1,172 @@
+# Archivo: imap_pool.py
+# Ubicación: raíz del proyecto
+# Descripción: Pool de sesiones IMAP persistentes, mantenidas con NOOP y reconectadas automáticamente
+
+import imaplib
+import threading
+import time
+from contextlib import contextmanager
+from imap_idle import has_pending_data
+
+
+class IMAPSession:
+    """Sesión IMAP autenticada con un buzón ya seleccionado"""
+
+    def __init__(self, key, connection, password):
+        self.key = key
+        self.connection = connection
+        self.password = password
+        self.lock = threading.Lock()
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.last_keepalive = self.created_at
+
+    def touch(self):
+        """Actualiza la marca de último uso"""
+        self.last_used = time.monotonic()
+
+    def idle_time(self):
+        """Segundos transcurridos desde el último uso"""
+        return time.monotonic() - self.last_used
+
+    def silent_time(self):
+        """Segundos transcurridos desde el último intercambio con el servidor"""
+        return time.monotonic() - max(self.last_used, self.last_keepalive)
+
+    def has_pending_data(self):
+        """Indica si el servidor envió datos fuera de un comando (EXISTS, BYE o cierre del socket)"""
+        try:
+            return has_pending_data(self.connection)
+        except (OSError, ValueError, AttributeError):
+            return True
+
+    def close(self):
+        """Cierra la sesión sin propagar errores"""
+        try:
+            self.connection.logout()
+        except Exception:
+            try:
+                self.connection.shutdown()
+            except Exception:
+                pass
+
+
+class IMAPSessionPool:
+    """Mantiene sesiones IMAP reutilizables por (proveedor, cuenta, buzón)"""
+
+    def __init__(self, connect_factory, keepalive_interval=120, max_idle=1500):
+        """Inicializa el pool
+
+        connect_factory(provider, email_addr, password, mailbox) debe devolver una conexión
+        imaplib autenticada y con el buzón seleccionado.
+        """
+        self._connect_factory = connect_factory
+        self.keepalive_interval = keepalive_interval
+        self.max_idle = max_idle
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._keepalive_thread = None
+
+    @contextmanager
+    def session(self, provider, email_addr, password, mailbox='INBOX'):
+        """Entrega una conexión viva del pool; la descarta si falla a nivel de socket"""
+        key = (provider, email_addr, mailbox)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = IMAPSession(key, None, password)
+                self._sessions[key] = session
+
+        with session.lock:
+            if not self._ensure_alive(session, password):
+                session.connection = self._connect_factory(provider, email_addr, password, mailbox)
+                session.password = password
+                session.created_at = time.monotonic()
+            self._start_keepalive()
+            try:
+                yield session.connection
+            except (imaplib.IMAP4.abort, OSError):
+                self._discard(session)
+                raise
+            finally:
+                session.touch()
+
+    def _ensure_alive(self, session, password):
+        """Comprueba sin coste de red si la sesión sigue sirviendo; solo hace NOOP si el servidor habló"""
+        if session.connection is None:
+            return False
+        if session.password != password:
+            session.close()
+            session.connection = None
+            return False
+        if session.has_pending_data():
+            try:
+                status, _ = session.connection.noop()
+                if status == 'OK':
+                    return True
+            except Exception:
+                pass
+            session.close()
+            session.connection = None
+            return False
+        return True
+
+    def _discard(self, session):
+        """Cierra la conexión de una sesión rota para que se reconecte en el próximo uso"""
+        if session.connection is not None:
+            session.close()
+            session.connection = None
+
+    def _start_keepalive(self):
+        """Arranca el hilo de mantenimiento la primera vez que se usa el pool"""
+        if self._keepalive_thread is None or not self._keepalive_thread.is_alive():
+            self._stop_event.clear()
+            self._keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True)
+            self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        """Envía NOOP a las sesiones inactivas y cierra las que llevan demasiado tiempo sin uso"""
+        interval = max(1, min(self.keepalive_interval, 30))
+        while not self._stop_event.wait(interval):
+            with self._lock:
+                sessions = list(self._sessions.values())
+
+            for session in sessions:
+                # Si la sesión está en uso no hace falta mantenerla
+                if not session.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if session.connection is None:
+                        continue
+                    if session.idle_time() >= self.max_idle:
+                        self._discard(session)
+                    elif session.silent_time() >= self.keepalive_interval:
+                        try:
+                            status, _ = session.connection.noop()
+                            if status != 'OK':
+                                self._discard(session)
+                        except Exception:
+                            self._discard(session)
+                        else:
+                            session.last_keepalive = time.monotonic()
+                finally:
+                    session.lock.release()
+
+    def invalidate(self, provider, email_addr, mailbox='INBOX'):
+        """Descarta la sesión de una cuenta (por ejemplo, tras cambiar credenciales)"""
+        with self._lock:
+            session = self._sessions.pop((provider, email_addr, mailbox), None)
+        if session is not None:
+            with session.lock:
+                self._discard(session)
+
+    def close_all(self):
+        """Cierra todas las sesiones y detiene el mantenimiento"""
+        self._stop_event.set()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            with session.lock:
+                self._discard(session)
@@ -0,0 +1,106 @@
+# Archivo: keyword_matcher.py
+# Ubicación: raíz del proyecto
+# Descripción: Buscador multi-palabra (Aho-Corasick) para encontrar en una sola pasada el caso de un texto
+
+from collections import deque
+
+
+class KeywordMatcher:
+    """Autómata Aho-Corasick sobre palabras clave normalizadas con casefold
+
+    Cada palabra clave pertenece a un caso con una prioridad; ante varias coincidencias
+    gana la de menor prioridad y, a igualdad, el orden en que se registraron los casos.
+    """
+
+    def __init__(self, entries=()):
+        """Construye el autómata
+
+        entries es un iterable de (prioridad, nombre_caso, [palabras_clave]).
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        self._rank = {}
+        self._keyword_count = 0
+
+        for order, (priority, case_name, keywords) in enumerate(entries):
+            rank = (priority, order)
+            for keyword in keywords:
+                normalized = self.normalize(keyword)
+                if normalized:
+                    self._add(normalized, rank, case_name, keyword)
+        self._build_failure_links()
+
+    @staticmethod
+    def normalize(text):
+        """Normaliza un texto para comparar sin distinguir mayúsculas"""
+        return text.strip().casefold() if text else ''
+
+    def __len__(self):
+        return self._keyword_count
+
+    def _add(self, keyword, rank, case_name, original):
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            node = next_node
+        self._output[node] = self._output[node] + ((rank, case_name, original),)
+        self._keyword_count += 1
+
+    def _build_failure_links(self):
+        """Calcula los enlaces de fallo en anchura y hereda las salidas de los sufijos"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                if node:
+                    fallback = self._fail[node]
+                    while fallback and char not in self._goto[fallback]:
+                        fallback = self._fail[fallback]
+                    self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+        # Cada nodo se queda solo con su mejor salida: es lo único que hace falta para decidir el caso
+        self._best = [min(outputs) if outputs else None for outputs in self._output]
+
+    def find_all(self, text):
+        """Devuelve todas las coincidencias como (posición_final, caso, palabra_clave)"""
+        matches = []
+        node = 0
+        for position, char in enumerate(self.normalize(text)):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for _, case_name, keyword in self._output[node]:
+                matches.append((position, case_name, keyword))
+        return matches
+
+    def find_best(self, text):
+        """Devuelve (caso, palabra_clave) de la coincidencia de mayor prioridad, o None"""
+        if not self._keyword_count or not text:
+            return None
+
+        best = None
+        node = 0
+        goto = self._goto
+        fail = self._fail
+        best_by_node = self._best
+        for char in self.normalize(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            candidate = best_by_node[node]
+            if candidate is not None and (best is None or candidate < best):
+                best = candidate
+
+        if best is None:
+            return None
+        _, case_name, keyword = best
+        return case_name, keyword
@@ -1,22 +1,53 @@
 # Archivo: logger.py
 # Ubicación: raíz del proyecto
-# Descripción: Sistema de registro para mostrar mensajes en la interfaz
+# Descripción: Sistema de registro para mostrar mensajes en la interfaz, la consola o un archivo
 
-import tkinter as tk
 import datetime
+import queue
+import threading
 
 
 class Logger:
-    def __init__(self):
-        """Inicializa el sistema de registro"""
+    # Líneas visibles como máximo en el widget; las más antiguas se descartan
+    MAX_VISIBLE_LINES = 2000
+
+    # Cada cuánto (ms) vacía el hilo de Tk la cola de mensajes y cuántos procesa por vez
+    FLUSH_INTERVAL_MS = 100
+    FLUSH_BATCH_SIZE = 500
+
+    # Colores por nivel
+    LEVEL_COLORS = {
+        "ERROR": "red",
+        "WARNING": "orange",
+        "INFO": "blue",
+    }
+
+    def __init__(self, max_visible_lines=MAX_VISIBLE_LINES, log_file=None):
+        """Inicializa el sistema de registro
+
+        Si se indica log_file, cada mensaje se añade también a ese archivo (modo sin interfaz).
+        """
         self.text_widget = None
+        self.max_visible_lines = max_visible_lines
+        self.log_file = log_file
+        self._file_lock = threading.Lock()
+
+        # Cola sin bloqueo: cualquier hilo encola y solo el bucle de Tk toca el widget
+        self._queue = queue.SimpleQueue()
+        self._visible_lines = 0
 
     def set_text_widget(self, text_widget):
-        """Establece el widget de texto donde se mostrarán los logs"""
+        """Establece el widget de texto donde se mostrarán los logs y arranca el vaciado periódico"""
         self.text_widget = text_widget
 
+        # Los colores se configuran una sola vez, no en cada mensaje
+        for level, color in self.LEVEL_COLORS.items():
+            text_widget.tag_config(f"tag_{level.lower()}", foreground=color)
+
+        text_widget.after(self.FLUSH_INTERVAL_MS, self._flush_to_widget)
+
     def log(self, message, level="INFO"):
-        """Registra un mensaje con un nivel específico"""
+        """Registra un mensaje con un nivel específico (no bloquea al hilo que llama)"""
         # Obtener la hora actual
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
@@ -26,27 +57,62 @@ class Logger:
         # Mostrar en consola (UTF-8)
         print(log_message, end="")
 
-        # Mostrar en el widget de texto si está disponible
-        if self.text_widget:
-            # Configurar el color según el nivel
-            tag = f"tag_{level.lower()}"
+        # Añadir al archivo de log si está configurado
+        if self.log_file:
+            self._write_to_file(log_message)
+
+        # Encolar para el widget de texto si está disponible
+        if self.text_widget is not None:
+            self._queue.put((log_message, f"tag_{level.lower()}"))
+
+    def _write_to_file(self, log_message):
+        """Añade un mensaje al archivo de log"""
+        try:
+            with self._file_lock:
+                with open(self.log_file, 'a', encoding='utf-8') as file:
+                    file.write(log_message)
+        except OSError as e:
+            print(f"Error al escribir en el archivo de log: {str(e)}")
+
+    def _flush_to_widget(self):
+        """Vuelca en el widget los mensajes encolados (se ejecuta en el hilo de Tk)"""
+        # Importación diferida: el modo sin interfaz no debe cargar tkinter
+        import tkinter as tk
+
+        widget = self.text_widget
+        if widget is None:
+            return
+
+        batch = []
+        while len(batch) < self.FLUSH_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
 
-            # Desactivar la edición
-            self.text_widget.config(state=tk.NORMAL)
+        try:
+            if batch:
+                # Una sola inserción con todos los pares (texto, etiqueta) del lote
+                insert_args = []
+                for log_message, tag in batch:
+                    insert_args.extend((log_message, tag))
+                    self._visible_lines += log_message.count("\n")
 
-            # Insertar el mensaje al final
-            self.text_widget.insert(tk.END, log_message, tag)
+                widget.config(state=tk.NORMAL)
+                widget.insert(tk.END, *insert_args)
 
-            # Configurar colores según el nivel
-            if level == "ERROR":
-                self.text_widget.tag_config(tag, foreground="red")
-            elif level == "WARNING":
-                self.text_widget.tag_config(tag, foreground="orange")
-            elif level == "INFO":
-                self.text_widget.tag_config(tag, foreground="blue")
+                # Mantener acotado el número de líneas visibles
+                excess = self._visible_lines - self.max_visible_lines
+                if excess > 0:
+                    widget.delete("1.0", f"{excess + 1}.0")
+                    self._visible_lines -= excess
 
-            # Hacer scroll automático al final
-            self.text_widget.see(tk.END)
+                widget.see(tk.END)
+                widget.config(state=tk.DISABLED)
 
-            # Desactivar la edición nuevamente
-            self.text_widget.config(state=tk.DISABLED)
\ No newline at end of file
+            # Si quedó trabajo pendiente se vuelve en cuanto Tk esté libre
+            delay = 1 if len(batch) == self.FLUSH_BATCH_SIZE else self.FLUSH_INTERVAL_MS
+            widget.after(delay, self._flush_to_widget)
+        except tk.TclError:
+            # El widget se destruyó (cierre de la aplicación)
+            self.text_widget = None
@@ -2,19 +2,25 @@
 # Ubicación: raíz del proyecto
 # Descripción: Punto de entrada principal para la aplicación del bot
 
-import tkinter as tk
-from ui_manager import UIManager
 import sys
 
 
 def main():
     """Función principal que inicia la aplicación"""
+    # Modo sin interfaz: no se importa tkinter
+    if "--headless" in sys.argv[1:]:
+        import headless
+        return headless.main([arg for arg in sys.argv[1:] if arg != "--headless"])
+
     # Configurar codificación UTF-8 para todo el sistema
     if sys.stdout.encoding != 'utf-8':
         sys.stdout.reconfigure(encoding='utf-8')
     if sys.stderr.encoding != 'utf-8':
         sys.stderr.reconfigure(encoding='utf-8')
 
+    import tkinter as tk
+    from ui_manager import UIManager
+
     root = tk.Tk()
     root.title("Bot de Correo")
     root.geometry("800x600")
@@ -27,4 +33,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,331 @@
+# Archivo: metrics.py
+# Ubicación: raíz del proyecto
+# Descripción: Contadores e histogramas de latencia por etapa, exportados en formato de texto de Prometheus
+
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Límites (segundos) de los histogramas de latencia
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Cada cuánto se reescribe el archivo de métricas
+METRICS_FILE_INTERVAL = 15
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base común: nombre, ayuda y series por combinación de etiquetas"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}, no {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._series.items())
+            lines.extend(self._render_series(items))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def set_function(self, function):
+        """Calcula el valor (sin etiquetas) en cada exportación en lugar de guardarlo"""
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception as e:
+                print(f"Error al calcular la métrica {self.name}: {str(e)}")
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mide la duración del bloque (también si termina con una excepción)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels):
+        """Devuelve (count, sum) de una serie"""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return (series['count'], series['sum']) if series else (0, 0.0)
+
+    def _render_series(self, items):
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Conjunto de métricas del proceso"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """Texto en el formato de exposición de Prometheus"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Registro del proceso y métricas del bot
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    'mailbot_stage_duration_seconds',
+    'Duración de cada etapa del procesamiento de correo',
+    ('stage',))
+CYCLES = REGISTRY.counter(
+    'mailbot_cycles_total',
+    'Ciclos de revisión de correo por resultado',
+    ('result',))
+MESSAGES = REGISTRY.counter(
+    'mailbot_messages_total',
+    'Correos revisados por resultado de la búsqueda de caso',
+    ('result',))
+MATCHES = REGISTRY.counter(
+    'mailbot_case_matches_total',
+    'Correos asignados a cada caso',
+    ('case',))
+REPLIES = REGISTRY.counter(
+    'mailbot_replies_total',
+    'Respuestas automáticas por caso y resultado del envío',
+    ('case', 'result'))
+SENDS = REGISTRY.counter(
+    'mailbot_smtp_sends_total',
+    'Envíos SMTP por resultado',
+    ('result',))
+SEND_QUEUE_PENDING = REGISTRY.gauge(
+    'mailbot_send_queue_pending',
+    'Respuestas en la cola de envío o enviándose')
+POLL_INTERVAL = REGISTRY.gauge(
+    'mailbot_poll_interval_seconds',
+    'Intervalo de sondeo vigente de cada cuenta (sin jitter)',
+    ('account',))
+CIRCUIT_STATE = REGISTRY.gauge(
+    'mailbot_circuit_state',
+    'Estado del cortacircuitos de cada servidor (0 cerrado, 1 semiabierto, 2 abierto)',
+    ('server',))
+SCHEDULER_DECISIONS = REGISTRY.counter(
+    'mailbot_scheduler_decisions_total',
+    'Decisiones del planificador de cuentas',
+    ('decision',))
+
+
+def write_metrics_file(path, registry=REGISTRY):
+    """Escribe las métricas de forma atómica (el textfile collector nunca ve un archivo a medias)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(registry.render())
+        os.replace(temp_path, path)
+    except Exception:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class MetricsFileWriter:
+    """Hilo que reescribe periódicamente el archivo .prom para el textfile collector de node-exporter"""
+
+    def __init__(self, path, interval=METRICS_FILE_INTERVAL, registry=REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="metrics-writer")
+            self._thread.start()
+        return self
+
+    def _loop(self):
+        while True:
+            try:
+                write_metrics_file(self.path, self.registry)
+            except Exception as e:
+                print(f"Error al escribir el archivo de métricas: {str(e)}")
+            if self._stop_event.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Sin ruido en la consola por cada scrape
+        pass
+
+
+class MetricsHTTPServer:
+    """Endpoint HTTP local (/metrics) con las métricas en texto"""
+
+    def __init__(self, port, host='127.0.0.1', registry=REGISTRY):
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.registry = registry
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics-http")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+
+def start_exporters(config):
+    """Arranca (una sola vez) los exportadores indicados en la configuración
+
+    'metrics_file': ruta del archivo .prom; 'metrics_port': puerto del endpoint HTTP en 127.0.0.1.
+    """
+    with _exporters_lock:
+        metrics_file = config.get('metrics_file')
+        if metrics_file and 'file' not in _exporters:
+            _exporters['file'] = MetricsFileWriter(metrics_file).start()
+
+        metrics_port = config.get('metrics_port')
+        if metrics_port and 'http' not in _exporters:
+            try:
+                _exporters['http'] = MetricsHTTPServer(int(metrics_port)).start()
+            except OSError as e:
+                print(f"No se pudo abrir el endpoint de métricas en el puerto {metrics_port}: {str(e)}")
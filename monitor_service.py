@@ -0,0 +1,73 @@
+# Archivo: monitor_service.py
+# Ubicación: raíz del proyecto
+# Descripción: Bucle de monitoreo de correo independiente de la interfaz (lo usan la UI y el modo headless)
+
+import threading
+import metrics
+from account_scheduler import AccountScheduler
+
+
+class MonitorService:
+    def __init__(self, email_manager, config_manager, logger, max_workers=AccountScheduler.MAX_WORKERS):
+        """Inicializa el servicio de monitoreo"""
+        self.email_manager = email_manager
+        self.config_manager = config_manager
+        self.logger = logger
+
+        # Cada cuenta configurada se revisa en paralelo con su propia conexión y reintentos
+        self.scheduler = AccountScheduler(email_manager, config_manager, logger, max_workers)
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def validate(self):
+        """Comprueba que se puede monitorear; devuelve el mensaje de error o None"""
+        if not self.config_manager.get_accounts():
+            return "Configure primero los datos de correo"
+        if not self.email_manager.has_search_criteria(self.logger):
+            return "Configure primero los parámetros de búsqueda"
+        return None
+
+    def is_running(self):
+        """Indica si el bucle de monitoreo está activo"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Arranca el bucle de monitoreo en un hilo en segundo plano"""
+        if self.is_running() and not self._stop_event.is_set():
+            return
+        # Evento nuevo por arranque: un hilo anterior que aún esté terminando conserva el suyo (ya activado)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Pide la parada; el bucle termina en cuanto acaban las operaciones en curso"""
+        self._stop_event.set()
+
+    def request_reload(self):
+        """Pide recargar los casos en el próximo paso del bucle (seguro desde un manejador de señales)"""
+        self.scheduler.reload_requested = True
+
+    def should_stop(self):
+        """Indica si se pidió la parada"""
+        return self._stop_event.is_set()
+
+    def run(self):
+        """Ejecuta el monitoreo de todas las cuentas en el hilo actual hasta que se pida la parada"""
+        stop_event = self._stop_event
+        # Exportar métricas si la configuración indica 'metrics_file' o 'metrics_port'
+        metrics.start_exporters(self.config_manager.load_snapshot())
+        try:
+            self.scheduler.run(stop_event)
+        finally:
+            # Las conexiones se cierran desde el propio hilo para no bloquear a quien pidió la parada
+            self.email_manager.close_connections()
+
+    def run_cycle(self):
+        """Ejecuta un ciclo de revisión de todas las cuentas; devuelve True si ninguna falló"""
+        return self.scheduler.run_once()
+
+    def get_stats(self):
+        """Devuelve las estadísticas por cuenta"""
+        return self.scheduler.get_stats()
@@ -0,0 +1,213 @@
+# Archivo: outbox.py
+# Ubicación: raíz del proyecto
+# Descripción: Bandeja de salida persistente (SQLite en modo WAL) para no perder ni duplicar respuestas
+
+import json
+import sqlite3
+import threading
+import time
+
+# Base de datos por defecto; 'outbox_file' en la configuración la cambia (relativa al archivo de configuración)
+DEFAULT_OUTBOX_FILE = "outbox.db"
+
+# Estados de una respuesta en la bandeja de salida
+STATUS_PENDING = 'pending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+# Reintentos: espera BASE * 2^(intentos-1) segundos, como mucho MAX, y se abandona tras MAX_ATTEMPTS
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BASE_DELAY = 30
+OUTBOX_RETRY_MAX_DELAY = 3600
+
+# Las respuestas enviadas o abandonadas se borran pasados estos segundos (más que la caducidad de la
+# caché de correos respondidos); la limpieza va en la transacción de un registro como mucho cada hora
+OUTBOX_RETENTION = 30 * 24 * 3600
+OUTBOX_PRUNE_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    message_key  TEXT PRIMARY KEY,
+    provider     TEXT NOT NULL,
+    email_addr   TEXT NOT NULL,
+    case_name    TEXT,
+    recipient    TEXT NOT NULL,
+    subject      TEXT NOT NULL,
+    body         TEXT NOT NULL,
+    cc_list      TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error   TEXT,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, email_addr, next_attempt);
+"""
+
+
+class Outbox:
+    """Diario de respuestas: se registra cada correo coincidente antes de tocar el servidor
+
+    Cada respuesta se identifica por una clave estable (Message-ID o UIDVALIDITY+UID), de modo que
+    registrar dos veces el mismo correo no crea otra respuesta y marcarla como enviada es idempotente.
+    Las escrituras de varios hilos se agrupan en una sola transacción (group commit).
+    """
+
+    def __init__(self, db_file=DEFAULT_OUTBOX_FILE, max_attempts=OUTBOX_MAX_ATTEMPTS,
+                 base_delay=OUTBOX_RETRY_BASE_DELAY, max_delay=OUTBOX_RETRY_MAX_DELAY, retention=OUTBOX_RETENTION):
+        """Inicializa la bandeja de salida (la base de datos se abre al primer uso)"""
+        self.db_file = db_file
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retention = retention
+        self._last_prune = 0.0
+
+        self._connection = None
+        self._db_lock = threading.Lock()
+
+        # Group commit: el primer hilo que llega escribe las peticiones de todos los que esperan
+        self._group = []
+        self._group_lock = threading.Lock()
+        self._committing = False
+
+    @staticmethod
+    def make_key(provider, email_addr, message_id=None, uidvalidity=None, uid=None):
+        """Construye la clave de una respuesta; el Message-ID sobrevive a la renumeración de UIDs"""
+        account = f"{provider}|{email_addr.lower()}"
+        if message_id:
+            return f"{account}|mid|{message_id.strip()}"
+        return f"{account}|uid|{uidvalidity}|{uid}"
+
+    def _get_connection(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # FULL: cada commit queda en disco; el coste se reparte gracias al group commit
+            connection.execute("PRAGMA synchronous=FULL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _transaction(self, operations):
+        """Ejecuta [(sql, parámetros)] en una única transacción; devuelve los cursores"""
+        with self._db_lock:
+            connection = self._get_connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                results = [connection.execute(sql, params) for sql, params in operations]
+                connection.execute("COMMIT")
+                return results
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _group_commit(self, sql, params):
+        """Escribe una actualización agrupándola con las de otros hilos que lleguen a la vez"""
+        request = {'operation': (sql, params), 'done': threading.Event(), 'error': None}
+        with self._group_lock:
+            self._group.append(request)
+            leader = not self._committing
+            if leader:
+                self._committing = True
+
+        if leader:
+            while True:
+                with self._group_lock:
+                    batch, self._group = self._group, []
+                    if not batch:
+                        self._committing = False
+                        break
+                try:
+                    self._transaction([item['operation'] for item in batch])
+                except Exception as e:
+                    for item in batch:
+                        item['error'] = e
+                for item in batch:
+                    item['done'].set()
+
+        request['done'].wait()
+        if request['error'] is not None:
+            raise request['error']
+
+    def record(self, entries):
+        """Registra respuestas pendientes en una sola transacción; devuelve las claves nuevas
+
+        entries es una lista de diccionarios con message_key, provider, email_addr, case_name,
+        recipient, subject, body y cc_list. Las claves ya registradas se ignoran.
+        """
+        if not entries:
+            return set()
+
+        now = time.time()
+        operations = [(
+            "INSERT OR IGNORE INTO outbox (message_key, provider, email_addr, case_name, recipient, subject, "
+            "body, cc_list, status, attempts, next_attempt, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?)",
+            (entry['message_key'], entry['provider'], entry['email_addr'].lower(), entry.get('case_name'),
+             entry['recipient'], entry['subject'], entry['body'], json.dumps(list(entry.get('cc_list') or [])),
+             STATUS_PENDING, now, now, now)
+        ) for entry in entries]
+        if now - self._last_prune >= OUTBOX_PRUNE_INTERVAL:
+            self._last_prune = now
+            operations.append(self._prune_operation(now))
+        cursors = self._transaction(operations)
+        return {entry['message_key'] for entry, cursor in zip(entries, cursors) if cursor.rowcount}
+
+    def _prune_operation(self, now):
+        return ("DELETE FROM outbox WHERE status IN (?, ?) AND updated_at < ?",
+                (STATUS_SENT, STATUS_FAILED, now - self.retention))
+
+    def prune(self, now=None):
+        """Borra las respuestas enviadas o abandonadas más antiguas que la retención; devuelve cuántas"""
+        now = time.time() if now is None else now
+        self._last_prune = now
+        cursor, = self._transaction([self._prune_operation(now)])
+        return cursor.rowcount
+
+    def due(self, provider, email_addr, now=None, limit=500):
+        """Respuestas pendientes de una cuenta cuyo próximo intento ya llegó"""
+        with self._db_lock:
+            cursor = self._get_connection().execute(
+                "SELECT message_key, provider, email_addr, case_name, recipient, subject, body, cc_list, attempts "
+                "FROM outbox WHERE status = ? AND email_addr = ? AND provider = ? AND next_attempt <= ? "
+                "ORDER BY next_attempt LIMIT ?",
+                (STATUS_PENDING, email_addr.lower(), provider, time.time() if now is None else now, limit))
+            columns = [description[0] for description in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        for row in rows:
+            row['cc_list'] = json.loads(row['cc_list'])
+        return rows
+
+    def mark_sent(self, message_key):
+        """Marca una respuesta como enviada (idempotente)"""
+        now = time.time()
+        self._group_commit(
+            "UPDATE outbox SET status = ?, last_error = NULL, updated_at = ? WHERE message_key = ?",
+            (STATUS_SENT, now, message_key))
+
+    def mark_retry(self, message_key, error):
+        """Registra un intento fallido y programa el siguiente con espera exponencial"""
+        now = time.time()
+        # El cálculo se hace en SQL para no leer antes la fila: attempts es el valor previo al fallo
+        self._group_commit(
+            "UPDATE outbox SET attempts = attempts + 1, last_error = ?, updated_at = ?, "
+            "status = CASE WHEN attempts + 1 >= ? THEN ? ELSE status END, "
+            "next_attempt = ? + MIN(?, ? * (1 << attempts)) "
+            "WHERE message_key = ? AND status = ?",
+            (str(error), now, self.max_attempts, STATUS_FAILED, now, self.max_delay, self.base_delay,
+             message_key, STATUS_PENDING))
+
+    def counts(self):
+        """Número de respuestas por estado"""
+        with self._db_lock:
+            return dict(self._get_connection().execute(
+                "SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    def close(self):
+        """Cierra la base de datos"""
+        with self._db_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,76 @@
+# Archivo: reply_templates.py
+# Ubicación: raíz del proyecto
+# Descripción: Plantillas MIME de respuesta precompiladas: el cuerpo de cada caso se codifica una sola vez
+
+import threading
+from collections import OrderedDict
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.header import Header
+
+# Plantillas distintas (cuerpo + CC) que se conservan como máximo
+MAX_TEMPLATES = 256
+
+
+class ReplyTemplate:
+    """Parte de cuerpo ya codificada y cabecera CC de una respuesta; solo faltan las cabeceras por destinatario"""
+
+    def __init__(self, body, cc_list=None):
+        # La parte se comparte entre mensajes: nadie la modifica después de crearla
+        self.body_part = MIMEText(body, 'plain', 'utf-8')
+        self.cc_header = ", ".join(cc_list) if cc_list else None
+
+    def build(self, email_addr, to, subject):
+        """Construye el mensaje de un destinatario reutilizando el cuerpo codificado"""
+        msg = MIMEMultipart()
+        msg['From'] = email_addr
+        msg['To'] = to
+        msg['Subject'] = Header(subject, 'utf-8')
+
+        # Añadir cabecera CC si la lista existe
+        if self.cc_header:
+            msg['Cc'] = self.cc_header
+
+        msg.attach(self.body_part)
+        return msg
+
+
+class ReplyTemplateCache:
+    """Caché LRU de plantillas por (cuerpo, CC)
+
+    Un cambio del mensaje de un caso o de la lista de CC genera otra clave, así que nunca se usa
+    una plantilla desactualizada; invalidate() además descarta todas de inmediato.
+    """
+
+    def __init__(self, max_templates=MAX_TEMPLATES):
+        self.max_templates = max_templates
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, body, cc_list=None):
+        """Devuelve la plantilla del cuerpo y CC indicados, creándola si no existe"""
+        key = (body, tuple(cc_list or ()))
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template
+
+        template = ReplyTemplate(body, cc_list)
+        with self._lock:
+            self._templates[key] = template
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+        return template
+
+    def invalidate(self):
+        """Descarta todas las plantillas"""
+        with self._lock:
+            self._templates.clear()
+
+    def __len__(self):
+        return len(self._templates)
+
+
+# Caché compartida por todo el proceso
+REPLY_TEMPLATES = ReplyTemplateCache()
@@ -0,0 +1,285 @@
+# Archivo: rule_engine.py
+# Ubicación: raíz del proyecto
+# Descripción: Motor de reglas declarativas (remitente, dominio, asunto, cabeceras, fecha) evaluado por lotes
+
+import heapq
+import re
+from datetime import datetime, timedelta, timezone
+import email.utils
+from config_manager import normalize_keywords
+from header_parser import decode_header_value
+from keyword_matcher import KeywordMatcher
+
+# Prioridad de una regla que no indica la suya (como la de los casos: gana el número menor)
+DEFAULT_RULE_PRIORITY = 100
+
+# Reglas de solo expresión regular por bloque: la unión de las de un bloque descarta todas a la vez
+REGEX_BLOCK_SIZE = 64
+
+# Claves de una regla que no son condiciones
+RULE_FIELDS = ('name', 'case', 'priority', 'enabled')
+
+# Condiciones admitidas
+CONDITION_FIELDS = ('from', 'domain', 'subject_contains', 'subject_regex', 'has_header', 'missing_header',
+                    'date_after', 'date_before', 'max_age_hours')
+
+_HEADER_NAME_RE = re.compile(r'^[A-Za-z0-9-]+$')
+
+
+class RuleError(ValueError):
+    """Regla mal escrita (condición desconocida, expresión regular o fecha no válida...)"""
+
+
+class MessageRow:
+    """Campos de un mensaje ya extraídos de sus cabeceras, con los que trabajan las reglas"""
+
+    __slots__ = ('sender', 'domain', 'subject', 'headers', 'date', 'subject_rules')
+
+    def __init__(self, headers):
+        """headers es el diccionario de parse_header_fields (nombres en minúsculas, valores sin decodificar)"""
+        self.headers = headers
+        self.sender = email.utils.parseaddr(decode_header_value(headers.get('from', '')))[1].lower()
+        self.domain = self.sender.rpartition('@')[2]
+        self.subject = decode_header_value(headers.get('subject', ''))
+        # Reglas cuyo subject_contains aparece en el asunto (lo rellena RuleEngine.evaluate_batch)
+        self.subject_rules = frozenset()
+        try:
+            self.date = email.utils.parsedate_to_datetime(headers['date']) if headers.get('date') else None
+            if self.date is not None and self.date.tzinfo is None:
+                self.date = self.date.replace(tzinfo=timezone.utc)
+        except (TypeError, ValueError):
+            self.date = None
+
+
+def _parse_date(value, field):
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise RuleError(f"fecha no válida en '{field}': {value}")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _domain_suffixes(domain):
+    """mail.example.com -> mail.example.com, example.com, com"""
+    parts = domain.split('.')
+    return ['.'.join(parts[index:]) for index in range(len(parts))] if domain else []
+
+
+class _CompiledRule:
+    __slots__ = ('name', 'case_name', 'rank', 'senders', 'domains', 'contains', 'regex', 'checks')
+
+    def __init__(self, name, case_name, rank, senders, domains, contains, regex, checks):
+        self.name = name
+        self.case_name = case_name
+        self.rank = rank
+        self.senders = senders
+        self.domains = domains
+        self.contains = contains
+        self.regex = regex
+        self.checks = checks
+
+
+class RuleEngine:
+    """Reglas compiladas en índices por remitente, dominio, palabra del asunto y expresión regular
+
+    Todas las palabras de subject_contains van en un único autómata (KeywordMatcher) que se recorre
+    una vez por asunto; las reglas que solo tienen expresión regular se agrupan en bloques y las de
+    un bloque solo se prueban si la unión de sus expresiones encuentra algo. Para cada mensaje solo se
+    revisan las reglas candidatas, en orden de prioridad, y gana la primera cuyas condiciones se cumplen todas.
+    """
+
+    def __init__(self, rules=(), case_aliases=None):
+        """Compila las reglas
+
+        rules es un iterable de diccionarios de configuración; case_aliases traduce el valor de
+        'case' (nombre del caso o su clave de configuración) al nombre del caso. Las reglas no
+        válidas se descartan y quedan en errors.
+        """
+        self.errors = []
+        self.header_fields = set()
+        self._rules = []
+        self._by_sender = {}
+        self._by_domain = {}
+        self._by_subject = {}
+        self._by_regex = []
+        self._generic = []
+
+        for order, spec in enumerate(rules or ()):
+            try:
+                rule = self._compile(spec, order, case_aliases)
+            except RuleError as e:
+                name = spec.get('name', f"#{order + 1}") if hasattr(spec, 'get') else f"#{order + 1}"
+                self.errors.append(f"Regla {name}: {e}")
+                continue
+            if rule is None:
+                continue
+            index = len(self._rules)
+            self._rules.append(rule)
+            if rule.senders:
+                for sender in rule.senders:
+                    self._by_sender.setdefault(sender, []).append((rule.rank, index))
+            elif rule.domains:
+                for domain in rule.domains:
+                    self._by_domain.setdefault(domain, []).append((rule.rank, index))
+            elif rule.contains:
+                self._by_subject[index] = rule.rank
+            elif rule.regex:
+                self._by_regex.append((rule.rank, index))
+            else:
+                self._generic.append((rule.rank, index))
+
+        for bucket in list(self._by_sender.values()) + list(self._by_domain.values()) + [self._by_regex,
+                                                                                          self._generic]:
+            bucket.sort()
+
+        # Un único recorrido del asunto dice qué reglas tienen alguna de sus palabras en él
+        # (las salidas del autómata son el orden de la regla en la configuración, que usan sus condiciones)
+        self._subject_matcher = KeywordMatcher(
+            (rule.rank, rule.rank[1], rule.contains) for rule in self._rules if rule.contains)
+        self._index_by_order = {rule.rank[1]: index for index, rule in enumerate(self._rules)}
+        self._regex_blocks = []
+        for start in range(0, len(self._by_regex), REGEX_BLOCK_SIZE):
+            block = self._by_regex[start:start + REGEX_BLOCK_SIZE]
+            self._regex_blocks.append((self._combine_regexes([self._rules[index].regex for _, index in block]),
+                                       block))
+
+    def __len__(self):
+        return len(self._rules)
+
+    def _compile(self, spec, order, case_aliases):
+        if not hasattr(spec, 'get'):
+            raise RuleError("cada regla debe ser un objeto")
+        if not spec.get('enabled', True):
+            return None
+
+        unknown = [key for key in spec if key not in RULE_FIELDS and key not in CONDITION_FIELDS]
+        if unknown:
+            raise RuleError(f"condiciones desconocidas: {', '.join(unknown)}")
+
+        case_name = spec.get('case')
+        if case_aliases is not None:
+            case_name = case_aliases.get(case_name)
+        if not case_name:
+            raise RuleError(f"caso desconocido: {spec.get('case')}")
+        try:
+            priority = int(spec.get('priority', DEFAULT_RULE_PRIORITY))
+        except (TypeError, ValueError):
+            raise RuleError(f"prioridad no válida: {spec.get('priority')}")
+        name = spec.get('name') or f"#{order + 1}"
+
+        senders = {address.lower() for address in normalize_keywords(spec.get('from'))}
+        domains = {domain.lower().lstrip('@') for domain in normalize_keywords(spec.get('domain'))}
+        checks = []
+
+        # Una regla con remitente se indexa por él; si además tiene dominio, este se comprueba aparte
+        if senders and domains:
+            checks.append(lambda row, now: any(suffix in domains for suffix in _domain_suffixes(row.domain)))
+
+        # subject_contains se resuelve con el autómata común; la regla solo consulta su resultado
+        contains = tuple(normalize_keywords(spec.get('subject_contains')))
+        if contains:
+            checks.append(lambda row, now: order in row.subject_rules)
+
+        regex = None
+        if spec.get('subject_regex'):
+            try:
+                search = re.compile(spec['subject_regex'], re.IGNORECASE).search
+            except re.error as e:
+                raise RuleError(f"expresión regular no válida: {e}")
+            regex = spec['subject_regex']
+            checks.append(lambda row, now: search(row.subject) is not None)
+
+        present = [field.lower() for field in normalize_keywords(spec.get('has_header'))]
+        absent = [field.lower() for field in normalize_keywords(spec.get('missing_header'))]
+        invalid = [field for field in present + absent if not _HEADER_NAME_RE.match(field)]
+        if invalid:
+            raise RuleError(f"nombre de cabecera no válido: {', '.join(invalid)}")
+        if present:
+            checks.append(lambda row, now: all(row.headers.get(field) for field in present))
+        if absent:
+            checks.append(lambda row, now: not any(row.headers.get(field) for field in absent))
+        self.header_fields.update(field.upper() for field in present + absent)
+
+        if spec.get('date_after') is not None:
+            after = _parse_date(spec['date_after'], 'date_after')
+            checks.append(lambda row, now: row.date is not None and row.date >= after)
+        if spec.get('date_before') is not None:
+            before = _parse_date(spec['date_before'], 'date_before')
+            checks.append(lambda row, now: row.date is not None and row.date < before)
+        if spec.get('max_age_hours') is not None:
+            try:
+                max_age = timedelta(hours=float(spec['max_age_hours']))
+            except (TypeError, ValueError):
+                raise RuleError(f"max_age_hours no válido: {spec['max_age_hours']}")
+            checks.append(lambda row, now: row.date is not None and now - row.date <= max_age)
+
+        return _CompiledRule(name, case_name, (priority, order), senders, domains, contains, regex, tuple(checks))
+
+    @staticmethod
+    def _combine_regexes(patterns):
+        """Unión de expresiones regulares para descartar de una vez los asuntos que no casan con ninguna
+
+        Si no se pueden unir (referencias a grupos, grupos con nombre repetido...) no hay filtro.
+        """
+        if not patterns:
+            return None
+        try:
+            return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE).search
+        except re.error:
+            return None
+
+    def _regex_candidates(self, subject):
+        """Reglas de solo expresión regular de los bloques cuya unión casa con el asunto (en orden, bajo demanda)"""
+        for search, block in self._regex_blocks:
+            if search is None or search(subject):
+                yield from block
+
+    def _candidates(self, sender, domain):
+        """Reglas indexadas por remitente o dominio más las generales, como [(rango, índice)] ordenada"""
+        buckets = [self._by_sender.get(sender, ())]
+        buckets.extend(self._by_domain.get(suffix, ()) for suffix in _domain_suffixes(domain))
+        buckets.append(self._generic)
+        buckets = [bucket for bucket in buckets if bucket]
+        if len(buckets) == 1:
+            return list(buckets[0])
+        return list(heapq.merge(*buckets))
+
+    def evaluate_batch(self, rows, now=None):
+        """Evalúa las reglas sobre un lote de MessageRow; devuelve [(caso, regla) o None] en el mismo orden"""
+        if not self._rules:
+            return [None] * len(rows)
+        now = now or datetime.now(timezone.utc)
+        rules = self._rules
+
+        subject_matcher = self._subject_matcher
+        by_subject = self._by_subject
+        index_by_order = self._index_by_order
+
+        # Los correos de un mismo remitente comparten la lista de reglas candidatas
+        candidates_by_sender = {}
+        results = []
+        for row in rows:
+            candidates = candidates_by_sender.get(row.sender)
+            if candidates is None:
+                candidates = candidates_by_sender[row.sender] = self._candidates(row.sender, row.domain)
+
+            extra = []
+            if subject_matcher:
+                row.subject_rules = frozenset(order for _, order, _ in subject_matcher.find_all(row.subject))
+                subject_bucket = sorted((by_subject[index], index) for index in
+                                        map(index_by_order.get, row.subject_rules) if index in by_subject)
+                if subject_bucket:
+                    extra.append(subject_bucket)
+            if self._regex_blocks:
+                extra.append(self._regex_candidates(row.subject))
+            if extra:
+                candidates = heapq.merge(candidates, *extra)
+
+            decision = None
+            for _, index in candidates:
+                rule = rules[index]
+                if all(check(row, now) for check in rule.checks):
+                    decision = (rule.case_name, rule.name)
+                    break
+            results.append(decision)
+        return results
@@ -0,0 +1,172 @@
+# Archivo: search_planner.py
+# Ubicación: raíz del proyecto
+# Descripción: Planificador de búsquedas IMAP: árboles OR binarios, varios SEARCH y respaldo en el cliente
+
+import imaplib
+import threading
+
+# Palabras clave como máximo en un solo SEARCH (cada una alarga el árbol OR)
+MAX_KEYWORDS_PER_SEARCH = 16
+
+# Con más comandos SEARCH que estos sale más barato traer las cabeceras y filtrar en el cliente
+MAX_SEARCH_COMMANDS = 8
+
+
+def is_ascii(text):
+    return all(ord(char) < 128 for char in text)
+
+
+def quote(text):
+    """Cadena IMAP entre comillas (solo ASCII)"""
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def or_tree(terms):
+    """Une términos de búsqueda con OR binarios en un árbol equilibrado
+
+    OR admite exactamente dos operandos; en notación prefija no hacen falta paréntesis:
+    [a, b, c, d] -> OR OR a b OR c d. Cada término es una lista de tokens.
+    """
+    if len(terms) == 1:
+        return list(terms[0])
+    middle = len(terms) // 2
+    return ['OR'] + or_tree(terms[:middle]) + or_tree(terms[middle:])
+
+
+class SearchCommand:
+    """Un UID SEARCH: criterios como lista de tokens (str tal cual, bytes como literal) y charset opcional"""
+
+    def __init__(self, criteria, charset=None):
+        self.criteria = list(criteria)
+        self.charset = charset
+
+    def __repr__(self):
+        shown = ' '.join(token if isinstance(token, str) else '{literal}' for token in self.criteria)
+        return f"{'CHARSET ' + self.charset + ' ' if self.charset else ''}{shown}"
+
+
+class SearchPlan:
+    """Comandos a ejecutar; client_side indica que el asunto no se filtra en el servidor"""
+
+    def __init__(self, commands, client_side=False):
+        self.commands = commands
+        self.client_side = client_side
+
+
+def plan_search(base_criteria, keywords, utf8_search=True, single_literal=False, body_keywords=(),
+                max_keywords=MAX_KEYWORDS_PER_SEARCH, max_commands=MAX_SEARCH_COMMANDS):
+    """Planifica la búsqueda de base_criteria con alguna palabra clave en el asunto (o en el cuerpo, body_keywords)
+
+    - Las palabras ASCII van entre comillas y sin CHARSET, que algunos servidores rechazan.
+    - Las demás van como literales con CHARSET UTF-8; si el cliente solo admite un literal final por
+      comando (imaplib), cada una necesita su propio SEARCH.
+    - Si el servidor no acepta UTF-8 o harían falta demasiados comandos, se busca solo por base_criteria
+      y el asunto se comprueba en el cliente con las cabeceras.
+    """
+    base_criteria = list(base_criteria)
+    unique = []
+    for field, field_keywords in (('SUBJECT', keywords), ('BODY', body_keywords)):
+        for keyword in field_keywords or []:
+            keyword = keyword.strip() if keyword else ''
+            # CR/LF no caben en una búsqueda y las repetidas no aportan nada
+            if keyword and '\r' not in keyword and '\n' not in keyword and (field, keyword) not in unique:
+                unique.append((field, keyword))
+
+    client_side = SearchPlan([SearchCommand(base_criteria)], client_side=True)
+    if not unique:
+        return SearchPlan([SearchCommand(base_criteria)])
+
+    ascii_terms = [(field, keyword) for field, keyword in unique if is_ascii(keyword)]
+    utf8_terms = [(field, keyword) for field, keyword in unique if not is_ascii(keyword)]
+    if utf8_terms and not utf8_search:
+        return client_side
+
+    commands = []
+    for start in range(0, len(ascii_terms), max_keywords):
+        chunk = ascii_terms[start:start + max_keywords]
+        terms = [[field, quote(keyword)] for field, keyword in chunk]
+        commands.append(SearchCommand(base_criteria + or_tree(terms)))
+
+    utf8_chunk_size = 1 if single_literal else max_keywords
+    for start in range(0, len(utf8_terms), utf8_chunk_size):
+        chunk = utf8_terms[start:start + utf8_chunk_size]
+        terms = [[field, keyword.encode('utf-8')] for field, keyword in chunk]
+        commands.append(SearchCommand(base_criteria + or_tree(terms), charset='UTF-8'))
+
+    if len(commands) > max_commands:
+        return client_side
+    return SearchPlan(commands)
+
+
+class SearchPlanner:
+    """Ejecuta planes de búsqueda con imaplib y recuerda qué servidores aceptan búsquedas en UTF-8"""
+
+    def __init__(self):
+        self._utf8_support = {}
+        self._lock = threading.Lock()
+
+    def supports_utf8(self, server_key):
+        """Mientras no se demuestre lo contrario se supone que el servidor acepta CHARSET UTF-8"""
+        with self._lock:
+            return self._utf8_support.get(server_key, True)
+
+    def set_utf8_support(self, server_key, supported):
+        with self._lock:
+            self._utf8_support[server_key] = supported
+
+    def plan(self, server_key, base_criteria, keywords, single_literal=False, body_keywords=()):
+        return plan_search(base_criteria, keywords, self.supports_utf8(server_key), single_literal, body_keywords)
+
+    def search(self, imap, server_key, base_criteria, keywords, logger, body_keywords=()):
+        """Ejecuta la búsqueda; devuelve (UIDs ordenados como str, client_side)
+
+        Si el servidor rechaza CHARSET UTF-8 se anota y se repite la búsqueda con respaldo en el cliente.
+        """
+        plan = self.plan(server_key, base_criteria, keywords, single_literal=True, body_keywords=body_keywords)
+        try:
+            return self._run(imap, plan, logger), plan.client_side
+        except _CharsetRejected as e:
+            logger.log(f"El servidor no acepta búsquedas en UTF-8 ({e}); se filtrará el asunto en el cliente",
+                       level="WARNING")
+            self.set_utf8_support(server_key, False)
+            plan = self.plan(server_key, base_criteria, keywords, single_literal=True, body_keywords=body_keywords)
+            return self._run(imap, plan, logger), plan.client_side
+
+    @staticmethod
+    def _run(imap, plan, logger):
+        uids = set()
+        for command in plan.commands:
+            logger.log(f"Ejecutando busqueda IMAP con criterio: {command!r}", level="INFO")
+            args = ['CHARSET', command.charset] if command.charset else []
+            criteria = command.criteria
+            if criteria and isinstance(criteria[-1], bytes):
+                # imaplib envía el literal detrás del último argumento
+                imap.literal = criteria[-1]
+                criteria = criteria[:-1]
+            args.append(' '.join(criteria))
+
+            try:
+                status, data = imap.uid('SEARCH', *args)
+            except (imaplib.IMAP4.abort, OSError):
+                # Conexión caída: no dice nada sobre el soporte de UTF-8 del servidor
+                raise
+            except imaplib.IMAP4.error as e:
+                if command.charset:
+                    raise _CharsetRejected(str(e))
+                raise
+            finally:
+                imap.literal = None
+            if status != 'OK':
+                detail = b' '.join(item for item in data if isinstance(item, bytes)).decode(errors='replace')
+                if command.charset:
+                    raise _CharsetRejected(f"{status} {detail}")
+                raise imaplib.IMAP4.error(f"SEARCH falló: {status} {detail}")
+
+            for item in data:
+                if isinstance(item, bytes):
+                    uids.update(item.decode().split())
+        return sorted(uids, key=int)
+
+
+class _CharsetRejected(Exception):
+    """El servidor respondió NO/BAD a un SEARCH con CHARSET"""
@@ -0,0 +1,200 @@
+# Archivo: send_queue.py
+# Ubicación: raíz del proyecto
+# Descripción: Cola de envío de respuestas con hilos de envío y límite de ritmo (token bucket) por proveedor
+
+import threading
+import time
+from collections import deque
+
+# Hilos de envío por defecto
+DEFAULT_SEND_WORKERS = 2
+
+# Ritmo por defecto si el proveedor no define el suyo: mensajes por minuto y ráfaga máxima
+DEFAULT_SEND_RATE_PER_MINUTE = 30
+DEFAULT_SEND_BURST = 5
+
+
+class TokenBucket:
+    """Limitador de ritmo: rate tokens por segundo con una capacidad (ráfaga) máxima
+
+    No es seguro entre hilos por sí mismo; la cola lo usa siempre bajo su candado.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def try_acquire(self, now=None):
+        """Consume un token si hay disponible; devuelve True si se pudo"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def time_until_available(self, now=None):
+        """Segundos que faltan para que haya un token"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class OutboundMessage:
+    """Respuesta pendiente de envío"""
+
+    def __init__(self, provider, email_addr, password, to, subject, body, cc_list=None, on_done=None):
+        self.provider = provider
+        self.email_addr = email_addr
+        self.password = password
+        self.to = to
+        self.subject = subject
+        self.body = body
+        self.cc_list = list(cc_list or [])
+        self.on_done = on_done
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def limiter_key(self):
+        return (self.provider, self.email_addr.lower())
+
+
+class SendQueue:
+    """Cola de salida vaciada por varios hilos de envío
+
+    Hay una cola y un limitador por cuenta (el ritmo lo fija su proveedor). Un hilo solo toma mensajes
+    de una cuenta con token disponible, así que una cuenta frenada no retiene a las demás.
+    """
+
+    def __init__(self, send_func, rate_for_provider, workers=DEFAULT_SEND_WORKERS):
+        """Inicializa la cola
+
+        send_func(provider, email_addr, password, to, subject, body, cc_list) -> bool hace el envío;
+        rate_for_provider(provider) -> (mensajes_por_minuto, ráfaga) da el ritmo de cada proveedor.
+        """
+        self._send_func = send_func
+        self._rate_for_provider = rate_for_provider
+        self.workers = max(1, int(workers))
+
+        self._queues = {}
+        self._buckets = {}
+        self._pending = 0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+        self.stats = {'enqueued': 0, 'sent': 0, 'failed': 0, 'throttled_waits': 0}
+
+    def enqueue(self, message):
+        """Añade un mensaje a la cola y arranca los hilos si hace falta"""
+        with self._condition:
+            key = message.limiter_key
+            if key not in self._buckets:
+                per_minute, burst = self._rate_for_provider(message.provider)
+                self._buckets[key] = TokenBucket(per_minute / 60.0, burst)
+            self._queues.setdefault(key, deque()).append(message)
+            self._pending += 1
+            self.stats['enqueued'] += 1
+            self._stopping = False
+            self._start_workers()
+            self._condition.notify()
+
+    def pending(self):
+        """Mensajes en cola o enviándose"""
+        with self._condition:
+            return self._pending + self._in_flight
+
+    def _start_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker_loop, daemon=True,
+                                      name=f"send-worker-{len(self._threads) + 1}")
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_message(self):
+        """Toma el siguiente mensaje de una cuenta con token (bajo el candado); devuelve (mensaje, espera)"""
+        now = time.monotonic()
+        wait = None
+        # El mensaje más antiguo entre las cuentas con token disponible
+        ready_key = None
+        for key, pending in self._queues.items():
+            if not pending:
+                continue
+            delay = self._buckets[key].time_until_available(now)
+            if delay <= 0:
+                if ready_key is None or pending[0].enqueued_at < self._queues[ready_key][0].enqueued_at:
+                    ready_key = key
+            elif wait is None or delay < wait:
+                wait = delay
+
+        if ready_key is None:
+            return None, wait
+
+        self._buckets[ready_key].try_acquire(now)
+        message = self._queues[ready_key].popleft()
+        if not self._queues[ready_key]:
+            del self._queues[ready_key]
+        return message, None
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopping and not self._pending:
+                        return
+                    message, wait = self._next_message()
+                    if message is not None:
+                        self._pending -= 1
+                        self._in_flight += 1
+                        break
+                    if wait is not None:
+                        self.stats['throttled_waits'] += 1
+                    self._condition.wait(wait)
+
+            ok = False
+            try:
+                ok = self._send_func(message.provider, message.email_addr, message.password,
+                                     message.to, message.subject, message.body, message.cc_list)
+            except Exception as e:
+                print(f"Error al enviar correo desde la cola: {str(e)}")
+
+            # La notificación cuenta como parte del envío: wait_empty no vuelve hasta que termina
+            try:
+                if message.on_done is not None:
+                    message.on_done(ok)
+            except Exception as e:
+                print(f"Error en la notificación de envío: {str(e)}")
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self.stats['sent' if ok else 'failed'] += 1
+                    self._condition.notify_all()
+
+    def wait_empty(self, timeout=None):
+        """Espera a que se vacíe la cola; devuelve False si venció el plazo"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def stop(self, timeout=None):
+        """Envía lo pendiente y detiene los hilos; devuelve False si quedaron mensajes sin enviar"""
+        drained = self.wait_empty(timeout)
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        return drained
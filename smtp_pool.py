@@ -0,0 +1,167 @@
+# Archivo: smtp_pool.py
+# Ubicación: raíz del proyecto
+# Descripción: Pool acotado de conexiones SMTP autenticadas reutilizables entre respuestas
+
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+
+class SMTPPooledConnection:
+    """Conexión SMTP autenticada junto con sus marcas de uso"""
+
+    def __init__(self, smtp, password):
+        self.smtp = smtp
+        self.password = password
+        self.last_used = time.monotonic()
+
+    def idle_time(self):
+        """Segundos transcurridos desde el último uso"""
+        return time.monotonic() - self.last_used
+
+    def close(self):
+        """Cierra la conexión sin propagar errores"""
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """Reutiliza conexiones SMTP por (proveedor, cuenta) con tamaño máximo y cierre por inactividad"""
+
+    def __init__(self, connect_factory, max_size=4, idle_timeout=120, liveness_check_after=10,
+                 acquire_timeout=60):
+        """Inicializa el pool
+
+        connect_factory(provider, email_addr, password) debe devolver un smtplib.SMTP ya
+        autenticado (EHLO, STARTTLS, EHLO y LOGIN hechos).
+        """
+        self._connect_factory = connect_factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.liveness_check_after = liveness_check_after
+        self.acquire_timeout = acquire_timeout
+        self._idle = {}
+        self._in_use = {}
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._reaper_thread = None
+
+    @contextmanager
+    def connection(self, provider, email_addr, password):
+        """Entrega una conexión autenticada y la devuelve al pool al terminar"""
+        key = (provider, email_addr)
+        pooled = self._acquire(key, provider, email_addr, password)
+        try:
+            yield pooled.smtp
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self._discard(key, pooled)
+            raise
+        except Exception:
+            # Error de protocolo (destinatario rechazado, etc.): la conexión sigue viva si acepta RSET
+            if self._reset(pooled):
+                self._release(key, pooled)
+            else:
+                self._discard(key, pooled)
+            raise
+        else:
+            self._release(key, pooled)
+
+    def _acquire(self, key, provider, email_addr, password):
+        """Obtiene una conexión libre y viva, o abre una nueva si no se supera el máximo"""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._condition:
+            while True:
+                idle_list = self._idle.setdefault(key, [])
+                while idle_list:
+                    pooled = idle_list.pop()
+                    if pooled.password == password and self._is_alive(pooled):
+                        self._in_use[key] = self._in_use.get(key, 0) + 1
+                        return pooled
+                    pooled.close()
+
+                if self._in_use.get(key, 0) < self.max_size:
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("No hay conexiones SMTP libres en el pool")
+                self._condition.wait(remaining)
+
+        # Conectar fuera del candado para no bloquear al resto de hilos
+        try:
+            smtp = self._connect_factory(provider, email_addr, password)
+        except Exception:
+            with self._condition:
+                self._in_use[key] -= 1
+                self._condition.notify()
+            raise
+        self._start_reaper()
+        return SMTPPooledConnection(smtp, password)
+
+    def _is_alive(self, pooled):
+        """Comprueba con NOOP las conexiones que llevan un rato sin usarse"""
+        if pooled.idle_time() >= self.idle_timeout:
+            return False
+        if pooled.idle_time() < self.liveness_check_after:
+            return True
+        try:
+            return pooled.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _reset(self, pooled):
+        """Limpia la transacción en curso con RSET"""
+        try:
+            return pooled.smtp.rset()[0] == 250
+        except Exception:
+            return False
+
+    def _release(self, key, pooled):
+        pooled.last_used = time.monotonic()
+        with self._condition:
+            self._in_use[key] -= 1
+            self._idle.setdefault(key, []).append(pooled)
+            self._condition.notify()
+
+    def _discard(self, key, pooled):
+        pooled.close()
+        with self._condition:
+            self._in_use[key] -= 1
+            self._condition.notify()
+
+    def _start_reaper(self):
+        """Arranca el hilo que cierra conexiones inactivas la primera vez que se abre una"""
+        if self._reaper_thread is None or not self._reaper_thread.is_alive():
+            self._stop_event.clear()
+            self._reaper_thread = threading.Thread(target=self._reaper_loop, daemon=True)
+            self._reaper_thread.start()
+
+    def _reaper_loop(self):
+        interval = max(1, min(self.idle_timeout / 2, 30))
+        while not self._stop_event.wait(interval):
+            self.close_idle()
+
+    def close_idle(self, max_idle=None):
+        """Cierra las conexiones libres que superan el tiempo máximo de inactividad"""
+        max_idle = self.idle_timeout if max_idle is None else max_idle
+        expired = []
+        with self._condition:
+            for key, idle_list in self._idle.items():
+                keep = []
+                for pooled in idle_list:
+                    (expired if pooled.idle_time() >= max_idle else keep).append(pooled)
+                self._idle[key] = keep
+        for pooled in expired:
+            pooled.close()
+
+    def close_all(self):
+        """Cierra todas las conexiones libres y detiene el hilo de limpieza"""
+        self._stop_event.set()
+        self.close_idle(max_idle=0)
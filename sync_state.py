@@ -0,0 +1,95 @@
+# Archivo: sync_state.py
+# Ubicación: raíz del proyecto
+# Descripción: Guarda por buzón el punto de sincronización IMAP (UIDVALIDITY, último UID y HIGHESTMODSEQ)
+
+import json
+import os
+import threading
+from config_manager import write_json_debounced, flush_pending_write
+
+# Archivo por defecto; 'sync_state_file' en la configuración lo cambia (relativo al archivo de configuración)
+DEFAULT_SYNC_STATE_FILE = "sync_state.json"
+
+# Segundos durante los que se agrupan las actualizaciones de puntos de sincronización en una sola
+# escritura. Perder las últimas solo obliga a volver a buscar esos UIDs (los ya respondidos los
+# descarta la caché de correos respondidos).
+SYNC_WRITE_DEBOUNCE = 2.0
+
+
+class SyncStateManager:
+    def __init__(self, state_file=DEFAULT_SYNC_STATE_FILE):
+        """Inicializa el gestor de puntos de sincronización"""
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._state = None
+
+    @staticmethod
+    def make_key(provider, email_addr, mailbox='INBOX'):
+        """Construye la clave de un buzón"""
+        return f"{provider}|{email_addr}|{mailbox}"
+
+    def _load(self):
+        """Carga el estado desde disco la primera vez que se necesita"""
+        if self._state is None:
+            try:
+                if os.path.exists(self.state_file):
+                    with open(self.state_file, 'r', encoding='utf-8') as file:
+                        self._state = json.load(file)
+                else:
+                    self._state = {}
+            except Exception as e:
+                print(f"Error al cargar el estado de sincronización: {str(e)}")
+                self._state = {}
+        return self._state
+
+    def _save(self, debounce=False):
+        """Guarda el estado en disco de forma atómica (con debounce=True, agrupado con los siguientes)"""
+        try:
+            # Copia: el guardado diferido se escribe desde otro hilo sin el candado
+            state = {key: dict(checkpoint) for key, checkpoint in self._state.items()}
+            # Un guardado inmediato sustituye al diferido pendiente y lo escribe ya
+            write_json_debounced(self.state_file, state, SYNC_WRITE_DEBOUNCE)
+            return True if debounce else self.flush()
+        except Exception as e:
+            print(f"Error al guardar el estado de sincronización: {str(e)}")
+            return False
+
+    def get_checkpoint(self, key, uidvalidity=None):
+        """Obtiene el punto de sincronización de un buzón
+
+        Si se indica uidvalidity y no coincide con el guardado, el punto ya no es válido
+        (el servidor renumeró los UIDs) y se devuelve None.
+        """
+        with self._lock:
+            checkpoint = self._load().get(key)
+            if not checkpoint:
+                return None
+            if uidvalidity is not None and checkpoint.get('uidvalidity') != uidvalidity:
+                return None
+            return dict(checkpoint)
+
+    def update_checkpoint(self, key, uidvalidity, last_uid, highestmodseq=None):
+        """Actualiza el punto de sincronización; solo escribe en disco si cambió"""
+        checkpoint = {
+            'uidvalidity': uidvalidity,
+            'last_uid': last_uid,
+            'highestmodseq': highestmodseq
+        }
+        with self._lock:
+            state = self._load()
+            if state.get(key) == checkpoint:
+                return True
+            state[key] = checkpoint
+            return self._save(debounce=True)
+
+    def flush(self):
+        """Escribe ya las actualizaciones pendientes"""
+        return flush_pending_write(self.state_file)
+
+    def reset_checkpoint(self, key):
+        """Elimina el punto de sincronización de un buzón"""
+        with self._lock:
+            state = self._load()
+            if state.pop(key, None) is not None:
+                return self._save()
+            return True
@@ -0,0 +1,8 @@
+# Archivo: tests/conftest.py
+# Ubicación: tests
+# Descripción: Hace importables los módulos de la raíz del proyecto desde las pruebas
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
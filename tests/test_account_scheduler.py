@@ -0,0 +1,77 @@
+# Archivo: tests/test_account_scheduler.py
+# Ubicación: tests
+# Descripción: Cortacircuitos por servidor del planificador de cuentas
+
+import imaplib
+from account_scheduler import AccountScheduler, AccountState
+from circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+from email_manager import EmailManager
+
+
+class StubEmailManager:
+    is_transport_error = staticmethod(EmailManager.is_transport_error)
+
+
+def test_breaker_opens_after_threshold_and_probes_once():
+    breaker = CircuitBreaker('imap.example.com:993', failure_threshold=2, base_delay=10, max_delay=60)
+    breaker.record_failure(now=0)
+    assert breaker.state == STATE_CLOSED
+    breaker.record_failure(now=0)
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow(now=1)
+
+    # Pasada la espera solo se deja pasar un ciclo de prueba
+    assert breaker.allow(now=breaker.open_until)
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.allow(now=breaker.open_until)
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+
+
+def test_only_transport_errors_count_against_the_server():
+    scheduler = AccountScheduler(StubEmailManager(), None, None)
+    breaker = CircuitBreaker('imap.example.com:993', failure_threshold=2)
+
+    # Una contraseña incorrecta de una cuenta no abre el circuito de las demás
+    for _ in range(5):
+        scheduler._record_breaker_result(breaker, imaplib.IMAP4.error('[AUTHENTICATIONFAILED]'))
+    assert breaker.state == STATE_CLOSED
+
+    scheduler._record_breaker_result(breaker, ConnectionRefusedError())
+    scheduler._record_breaker_result(breaker, imaplib.IMAP4.abort('socket error: EOF'))
+    assert breaker.state == STATE_OPEN
+
+    # Si el ciclo de prueba es el de una cuenta con error propio, el servidor respondió: se cierra
+    assert breaker.allow(now=breaker.open_until)
+    scheduler._record_breaker_result(breaker, imaplib.IMAP4.error('[AUTHENTICATIONFAILED]'))
+    assert breaker.state == STATE_CLOSED
+
+
+def test_failed_cycle_keeps_the_real_error_in_the_stats():
+    class FailingEmailManager(StubEmailManager):
+        def get_provider_config(self, provider):
+            return {'imap_server': 'imap.example.com', 'imap_port': 993}
+
+        def has_search_criteria(self, logger=None):
+            return True
+
+        def get_search_keywords(self):
+            return ['pedido']
+
+        def check_and_process_emails(self, *args):
+            return False
+
+        def get_last_cycle_error(self, provider, email_addr):
+            return imaplib.IMAP4.error('[AUTHENTICATIONFAILED] Credenciales inválidas')
+
+    class QuietLogger:
+        def log(self, message, level="INFO"):
+            pass
+
+    scheduler = AccountScheduler(FailingEmailManager(), None, QuietLogger())
+    account = {'provider': 'Gmail', 'email': 'bot@example.com', 'password': 'x', 'cc_users': []}
+    state = AccountState(scheduler.make_key(account), account)
+    scheduler._run_account(state, None, False)
+
+    assert state.failures == 1
+    assert state.stats['last_error'] == '[AUTHENTICATIONFAILED] Credenciales inválidas'
@@ -0,0 +1,150 @@
+# Archivo: tests/test_async_email_backend.py
+# Ubicación: tests
+# Descripción: Conexiones concurrentes en un solo bucle, plazos y semántica imaplib/smtplib del backend asyncio
+
+import asyncio
+import email
+import email.message
+import imaplib
+import smtplib
+import socket
+import time
+import pytest
+from async_email_backend import AsyncEmailBackend, AsyncIMAPClient
+from email_manager import EmailManager
+from fake_mail_servers import FakeIMAPServer, FakeSMTPServer, build_message
+
+EMAIL = 'bot@example.com'
+PASSWORD = 'secret'
+
+
+@pytest.fixture
+def backend():
+    backend = AsyncEmailBackend(timeout=5)
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def imap_server():
+    server = FakeIMAPServer(users={EMAIL: PASSWORD}, latency=0.05).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def smtp_server():
+    server = FakeSMTPServer(users={EMAIL: PASSWORD}).start()
+    yield server
+    server.stop()
+
+
+def test_many_sessions_progress_together_on_one_loop(backend, imap_server):
+    imap_server.inbox.append(build_message('Mi pedido 1'))
+    imap_server.latency = 0.2
+    host, port = imap_server.address
+
+    async def open_session():
+        client = await AsyncIMAPClient(host, port, use_ssl=False, timeout=5).connect()
+        await client.login(EMAIL, PASSWORD)
+        typ, data = await client.select('INBOX')
+        await client.logout()
+        return typ, data
+
+    async def open_all():
+        # Tantas como la cola de conexiones del servidor falso (5)
+        return await asyncio.gather(*(open_session() for _ in range(5)))
+
+    # Cada sesión son 4 comandos de 200 ms: en serie serían 5 * 0.8 s = 4 s
+    started = time.monotonic()
+    results = backend.run(open_all())
+    assert time.monotonic() - started < 2
+    assert results == [('OK', [b'1'])] * 5
+
+
+def test_imap_results_match_imaplib(backend, imap_server):
+    imap_server.inbox.append(build_message('Mi pedido 1', body='.hola'))
+    imap = backend.connect_imap(*imap_server.address, use_ssl=False)
+    assert 'IDLE' in imap.capabilities
+    imap.login(EMAIL, PASSWORD)
+    imap.select('INBOX')
+    assert imap.response('UIDVALIDITY') == ('UIDVALIDITY', [b'1'])
+    assert imap.response('UIDVALIDITY') == ('UIDVALIDITY', [None])
+
+    assert imap.uid('SEARCH', 'ALL') == ('OK', [b'1'])
+    typ, data = imap.uid('FETCH', '1', '(BODY.PEEK[TEXT])')
+    assert typ == 'OK'
+    assert data[0][0].endswith(b'{7}') and data[0][1] == b'.hola\r\n'
+    assert data[1] == b')'
+
+    imap.literal = 'reclamación'.encode('utf-8')
+    assert imap.uid('SEARCH', 'CHARSET', 'UTF-8', 'SUBJECT') == ('OK', [b''])
+    # Sin literal pendiente para el siguiente comando
+    assert imap.literal is None
+
+    with pytest.raises(imaplib.IMAP4.error):
+        imap.uid('FROBNICATE', '1')
+    imap.logout()
+
+
+def test_failed_login_raises_like_imaplib(backend, imap_server):
+    imap = backend.connect_imap(*imap_server.address, use_ssl=False)
+    with pytest.raises(imaplib.IMAP4.error) as error:
+        imap.login(EMAIL, 'otra')
+    assert not isinstance(error.value, imaplib.IMAP4.abort)
+    imap.shutdown()
+
+
+def test_silent_server_times_out_as_a_transport_error():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    backend = AsyncEmailBackend(timeout=0.2)
+    try:
+        with pytest.raises(imaplib.IMAP4.abort) as error:
+            backend.connect_imap(*listener.getsockname(), use_ssl=False)
+        assert EmailManager.is_transport_error(error.value)
+    finally:
+        backend.close()
+        listener.close()
+
+
+def test_send_message_matches_smtplib(backend, smtp_server):
+    smtp = backend.connect_smtp(*smtp_server.address)
+    smtp.ehlo()
+    smtp.login(EMAIL, PASSWORD)
+    msg = email.message.EmailMessage()
+    msg['From'] = EMAIL
+    msg['To'] = 'uno@example.com'
+    msg['Cc'] = 'copia@example.com'
+    msg['Bcc'] = 'oculta@example.com'
+    msg['Subject'] = 'Re: pedido'
+    # Líneas que empiezan por punto: se duplican al enviar y el servidor las deshace
+    msg.set_content('.primera\n..segunda\nfin\n', cte='7bit')
+    smtp.send_message(msg)
+    smtp.quit()
+
+    delivery, = smtp_server.received
+    assert delivery['from'] == EMAIL
+    assert delivery['to'] == ['uno@example.com', 'oculta@example.com', 'copia@example.com']
+    received = email.message_from_bytes(delivery['data'], policy=email.policy.default)
+    assert 'Bcc' not in received
+    assert received.get_content().splitlines() == ['.primera', '..segunda', 'fin']
+
+
+def test_rejected_smtp_login_raises_like_smtplib(backend, smtp_server):
+    smtp = backend.connect_smtp(*smtp_server.address)
+    smtp.ehlo()
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        smtp.login(EMAIL, 'otra')
+    smtp.close()
+
+
+def test_loop_restarts_after_close(backend, imap_server):
+    imap = backend.connect_imap(*imap_server.address, use_ssl=False)
+    imap.logout()
+    backend.close()
+
+    imap = backend.connect_imap(*imap_server.address, use_ssl=False)
+    assert imap.login(EMAIL, PASSWORD)[0] == 'OK'
+    imap.logout()
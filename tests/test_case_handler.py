@@ -0,0 +1,92 @@
+# Archivo: tests/test_case_handler.py
+# Ubicación: tests
+# Descripción: Recarga incremental de los archivos de casos
+
+import os
+import pytest
+from case_handler import CaseHandler
+
+CASE_SOURCE = '''from base_case import BaseCase
+
+
+class Case(BaseCase):
+    def __init__(self):
+        super().__init__(name="Prueba", description="Caso de prueba", config_key="caso1",
+                         response_message="{message}")
+'''
+
+
+def write_case(directory, name, message=None, source=None):
+    path = directory / f'{name}.py'
+    path.write_text(source if source is not None else CASE_SOURCE.format(message=message), encoding='utf-8')
+    return path
+
+
+def bump_mtime(path):
+    """Cambia la fecha del archivo aunque el sistema de archivos tenga poca resolución"""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+@pytest.fixture
+def cases_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr('config_manager.ConfigManager.DEFAULT_CONFIG_FILE', str(tmp_path / 'config.json'))
+    directory = tmp_path / 'cases'
+    directory.mkdir()
+    return directory
+
+
+def test_touched_file_with_the_same_content_is_not_reimported(cases_dir):
+    path = write_case(cases_dir, 'case_a', 'hola')
+    handler = CaseHandler(cases_dir=str(cases_dir))
+    loaded = handler.cases['case_a']
+
+    bump_mtime(path)
+    handler.load_cases()
+
+    assert handler.cases['case_a'] is loaded
+    # La huella nueva se guarda: la siguiente recarga ni siquiera vuelve a leer el archivo
+    assert handler._sources['case_a'][:2] == (os.stat(path).st_mtime_ns, os.stat(path).st_size)
+
+
+def test_changed_file_is_reloaded_and_the_others_are_kept(cases_dir):
+    path = write_case(cases_dir, 'case_a', 'hola')
+    write_case(cases_dir, 'case_b', 'adiós')
+    handler = CaseHandler(cases_dir=str(cases_dir))
+    unchanged = handler.cases['case_b']
+
+    write_case(cases_dir, 'case_a', 'hola de nuevo')
+    bump_mtime(path)
+    handler.load_cases()
+
+    assert handler.cases['case_a'].get_response_message() == 'hola de nuevo'
+    assert handler.cases['case_b'] is unchanged
+
+
+@pytest.mark.parametrize('broken_source', ['def roto(:\n', 'VALOR = 1\n', 'raise RuntimeError("al importar")\n'])
+def test_broken_new_version_keeps_the_old_one(cases_dir, broken_source):
+    path = write_case(cases_dir, 'case_a', 'hola')
+    handler = CaseHandler(cases_dir=str(cases_dir))
+    loaded = handler.cases['case_a']
+
+    write_case(cases_dir, 'case_a', source=broken_source)
+    bump_mtime(path)
+    handler.load_cases()
+    assert handler.cases['case_a'] is loaded
+
+    # Arreglado el archivo, la siguiente recarga lo carga
+    write_case(cases_dir, 'case_a', 'hola arreglado')
+    bump_mtime(path)
+    handler.load_cases()
+    assert handler.cases['case_a'].get_response_message() == 'hola arreglado'
+
+
+def test_removed_file_removes_the_case(cases_dir):
+    path = write_case(cases_dir, 'case_a', 'hola')
+    write_case(cases_dir, 'case_b', 'adiós')
+    handler = CaseHandler(cases_dir=str(cases_dir))
+
+    path.unlink()
+    handler.load_cases()
+
+    assert handler.get_available_cases() == ['case_b']
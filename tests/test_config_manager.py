@@ -0,0 +1,123 @@
+# Archivo: tests/test_config_manager.py
+# Ubicación: tests
+# Descripción: Transacciones de configuración, guardados diferidos y escrituras atómicas fallidas
+
+import json
+import time
+import pytest
+import config_manager
+from config_manager import ConfigManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ConfigManager(str(tmp_path / 'config.json'))
+    assert manager.save_config({'provider': 'Gmail', 'search_params': {}})
+    yield manager
+    manager.flush()
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Cuenta las escrituras reales del archivo (sin cambiar lo que hacen)"""
+    calls = []
+    original = config_manager.write_json_atomic
+
+    def counting(path, data):
+        result = original(path, data)
+        calls.append(json.loads(json.dumps(data)))
+        return result
+
+    monkeypatch.setattr(config_manager, 'write_json_atomic', counting)
+    return calls
+
+
+def read_file(manager):
+    with open(manager.config_file, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def test_nested_transactions_merge_into_one_write(manager, writes):
+    with manager.transaction() as outer:
+        outer.config['provider'] = 'Outlook'
+        # Los setters abren su propia transacción, que se funde con la exterior
+        manager.set_search_params({'caso1': 'pedido'})
+        with manager.transaction() as inner:
+            inner.config['cc_users'] = ['copia@example.com']
+        assert inner.config is outer.config
+        assert writes == []
+
+    assert outer.saved and inner.saved
+    assert len(writes) == 1
+    assert read_file(manager) == {'provider': 'Outlook', 'search_params': {'caso1': 'pedido'},
+                                  'cc_users': ['copia@example.com']}
+
+
+def test_failing_block_leaves_the_file_untouched(manager, writes):
+    before = read_file(manager)
+    with pytest.raises(RuntimeError):
+        with manager.transaction() as tx:
+            tx.config['provider'] = 'Outlook'
+            manager.set_value('cc_users', ['copia@example.com'])
+            raise RuntimeError('fallo a mitad')
+
+    assert not tx.saved
+    assert writes == []
+    assert read_file(manager) == before
+    assert manager.get_value('provider') == 'Gmail'
+    assert manager.get_value('cc_users') is None
+
+
+def test_transaction_without_changes_does_not_write(manager, writes):
+    with manager.transaction() as tx:
+        tx.config['provider'] = 'Gmail'
+    assert tx.saved
+    assert writes == []
+
+
+def test_debounced_saves_are_coalesced(manager, writes):
+    for number in range(5):
+        with manager.transaction(debounce=True) as tx:
+            tx.config['counter'] = number
+        # Las lecturas ven el valor nuevo aunque aún no esté en disco
+        assert manager.get_value('counter') == number
+    assert writes == []
+    assert 'counter' not in read_file(manager)
+
+    assert manager.flush()
+    assert [data['counter'] for data in writes] == [4]
+    assert read_file(manager)['counter'] == 4
+
+
+def test_debounced_save_is_written_when_the_delay_expires(manager, writes, monkeypatch):
+    monkeypatch.setattr(config_manager, 'CONFIG_WRITE_DEBOUNCE', 0.05)
+    manager.set_value('provider', 'Outlook')
+    manager.save_config(dict(manager.load_config(), provider='Yahoo'), debounce=True)
+    manager.save_config(dict(manager.load_config(), provider='Otro'), debounce=True)
+
+    deadline = time.monotonic() + 5
+    while len(writes) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [data['provider'] for data in writes] == ['Outlook', 'Otro']
+    assert read_file(manager)['provider'] == 'Otro'
+
+
+def test_failed_write_rolls_back_to_the_file_contents(manager, monkeypatch):
+    def failing(path, data):
+        raise OSError('disco lleno')
+
+    monkeypatch.setattr(config_manager, 'write_json_atomic', failing)
+    with manager.transaction() as tx:
+        tx.config['provider'] = 'Outlook'
+
+    assert not tx.saved
+    # La caché se descarta: lo que se lee es otra vez lo que hay en disco
+    assert manager.get_value('provider') == 'Gmail'
+    assert read_file(manager)['provider'] == 'Gmail'
+
+
+def test_atomic_write_keeps_the_old_file_when_serialization_fails(manager, tmp_path):
+    with pytest.raises(TypeError):
+        config_manager.write_json_atomic(manager.config_file, {'provider': {'no serializable'}})
+    assert read_file(manager) == {'provider': 'Gmail', 'search_params': {}}
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['config.json']
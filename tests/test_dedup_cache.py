@@ -0,0 +1,117 @@
+# Archivo: tests/test_dedup_cache.py
+# Ubicación: tests
+# Descripción: Caducidad, expulsión LRU, recarga desde disco y compactación de la caché de correos respondidos
+
+import pytest
+import dedup_cache
+from dedup_cache import DedupCache, make_dedup_keys
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(dedup_cache, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'dedup_cache.log')
+
+
+def keys(name):
+    return make_dedup_keys('Gmail', 'Bot@example.com', message_id=f'<{name}@example.com>', uidvalidity=7, uid=name)
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = DedupCache(None, ttl=100)
+    cache.add(keys('a'))
+    clock.now += 99
+    assert cache.contains(keys('a'))
+    clock.now += 1
+    assert not cache.contains(keys('a'))
+    assert len(cache) == 0
+
+
+def test_any_key_of_a_message_is_enough():
+    cache = DedupCache(None)
+    cache.add(keys('a'))
+    # Mismo Message-ID tras renumerar los UIDs, o mismo UID sin Message-ID
+    assert cache.contains(make_dedup_keys('Gmail', 'bot@example.com', message_id='<a@example.com>',
+                                          uidvalidity=8, uid='99'))
+    assert cache.contains(make_dedup_keys('Gmail', 'bot@example.com', uidvalidity=7, uid='a'))
+    assert not cache.contains(make_dedup_keys('Outlook', 'bot@example.com', message_id='<a@example.com>'))
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = DedupCache(None, max_entries=2)
+    cache.add(['a'])
+    cache.add(['b'])
+    # Consultar "a" la hace reciente: la expulsada al llegar "c" es "b"
+    assert cache.contains(['a'])
+    cache.add(['c'])
+    assert len(cache) == 2
+    assert cache.contains(['a']) and cache.contains(['c'])
+    assert not cache.contains(['b'])
+
+
+def test_entries_are_reloaded_from_disk(clock, path):
+    cache = DedupCache(path, ttl=100)
+    cache.add(keys('a'))
+    clock.now += 50
+    cache.add(keys('b'))
+
+    clock.now += 60
+    reloaded = DedupCache(path, ttl=100)
+    # "a" caducó mientras tanto; "b" sigue viva
+    assert not reloaded.contains(keys('a'))
+    assert reloaded.contains(keys('b'))
+    assert len(reloaded) == 2
+
+
+def test_reload_keeps_only_the_newest_entries_and_skips_torn_lines(clock, path):
+    cache = DedupCache(path)
+    for name in 'abcd':
+        cache.add([name])
+    with open(path, 'a', encoding='ascii') as file:
+        file.write('123')
+
+    reloaded = DedupCache(path, max_entries=2)
+    assert len(reloaded) == 2
+    assert reloaded.contains(['c']) and reloaded.contains(['d'])
+    assert not reloaded.contains(['a'])
+
+
+def test_file_is_compacted_to_the_live_entries(clock, path):
+    cache = DedupCache(path, ttl=100)
+    cache.add(['vieja'])
+    clock.now += 200
+    # Con la línea de "vieja" son 2001 líneas: más del doble del mínimo de 1000 entradas
+    for _ in range(2 * 1000):
+        cache.add(['repetida'])
+
+    with open(path, encoding='ascii') as file:
+        lines = file.readlines()
+    # Sin las repeticiones ni la entrada caducada
+    assert len(lines) == 1
+    assert len(cache) == 1
+
+    reloaded = DedupCache(path, ttl=100)
+    assert reloaded.contains(['repetida'])
+    assert not reloaded.contains(['vieja'])
+
+
+def test_memory_only_cache_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = DedupCache(None)
+    cache.add(['a'])
+    assert cache.contains(['a'])
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,219 @@
+# Archivo: tests/test_email_manager.py
+# Ubicación: tests
+# Descripción: Ciclos completos de check_and_process_emails contra los servidores IMAP/SMTP falsos
+
+import threading
+import time
+import pytest
+from config_manager import ConfigManager, flush_all_pending
+from email_manager import EmailManager
+from fake_mail_servers import FakeIMAPServer, FakeSMTPServer, build_message
+from monitor_service import MonitorService
+
+PROVIDER = 'Pruebas'
+EMAIL = 'bot@example.com'
+PASSWORD = 'secret'
+
+
+class ListLogger:
+    def __init__(self):
+        self.lines = []
+
+    def log(self, message, level="INFO"):
+        self.lines.append((level, message))
+
+
+@pytest.fixture
+def servers():
+    imap_server = FakeIMAPServer(users={EMAIL: PASSWORD}).start()
+    smtp_server = FakeSMTPServer(users={EMAIL: PASSWORD}).start()
+    yield imap_server, smtp_server
+    imap_server.stop()
+    smtp_server.stop()
+
+
+@pytest.fixture(params=['sync', 'async'])
+def make_manager(request, tmp_path, monkeypatch, servers):
+    """Crea un EmailManager con la configuración, el estado y la bandeja de salida en tmp_path
+
+    Cada prueba se ejecuta con los dos backends de red (imaplib/smtplib y asyncio).
+    """
+    imap_server, smtp_server = servers
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ConfigManager, 'DEFAULT_CONFIG_FILE', str(tmp_path / 'config.json'))
+    managers = []
+
+    def factory(search_params=None, **extra_config):
+        ConfigManager().save_config(dict({'provider': PROVIDER, 'email': EMAIL, 'password': PASSWORD,
+                                          'search_params': search_params or {},
+                                          'email_backend': request.param}, **extra_config))
+        flush_all_pending()
+        manager = EmailManager()
+        manager.provider_configs[PROVIDER] = {
+            'imap_server': imap_server.address[0],
+            'imap_port': imap_server.address[1],
+            'imap_ssl': False,
+            'smtp_server': smtp_server.address[0],
+            'smtp_port': smtp_server.address[1],
+            'smtp_starttls': False,
+        }
+        managers.append(manager)
+        return manager
+
+    yield factory
+    for manager in managers:
+        manager.close_connections()
+        manager.outbox.close()
+
+
+def run_cycle(manager):
+    logger = ListLogger()
+    ok = manager.check_and_process_emails(PROVIDER, EMAIL, PASSWORD, manager.get_search_keywords(), logger, [])
+    manager.send_queue.wait_empty()
+    return ok, logger
+
+
+def recipients(smtp_server):
+    return sorted(address for delivery in smtp_server.received for address in delivery['to'])
+
+
+def test_replies_to_matching_mail_and_marks_it_seen(servers, make_manager):
+    imap_server, smtp_server = servers
+    imap_server.inbox.append(build_message('Mi pedido 1', sender='uno@example.com'))
+    imap_server.inbox.append(build_message('Boletín semanal', sender='dos@example.com'))
+    manager = make_manager({'caso1': 'pedido'})
+
+    ok, _ = run_cycle(manager)
+
+    assert ok
+    assert recipients(smtp_server) == ['uno@example.com']
+    flags = [message['flags'] for message in imap_server.inbox.messages]
+    assert '\\Seen' in flags[0]
+    assert '\\Seen' not in flags[1]
+
+    # Un segundo ciclo no vuelve a responder
+    run_cycle(manager)
+    assert len(smtp_server.received) == 1
+
+
+def test_failed_send_is_retried_from_the_outbox(servers, make_manager):
+    imap_server, smtp_server = servers
+    imap_server.inbox.append(build_message('Mi pedido 2', sender='uno@example.com'))
+    manager = make_manager({'caso1': 'pedido'})
+    manager.outbox.base_delay = 0
+
+    smtp_server.users[EMAIL] = 'otra'
+    run_cycle(manager)
+    assert smtp_server.received == []
+    assert manager.outbox.counts() == {'pending': 1}
+
+    smtp_server.users[EMAIL] = PASSWORD
+    run_cycle(manager)
+    assert recipients(smtp_server) == ['uno@example.com']
+    assert manager.outbox.counts() == {'sent': 1}
+
+
+def test_reappearing_unseen_message_is_not_answered_twice(servers, make_manager):
+    imap_server, smtp_server = servers
+    imap_server.inbox.append(build_message('Mi pedido 3', sender='uno@example.com'))
+    manager = make_manager({'caso1': 'pedido'})
+    run_cycle(manager)
+    assert len(smtp_server.received) == 1
+
+    # Otro cliente quita \Seen y se pierde el punto de sincronización
+    imap_server.inbox.messages[0]['flags'].discard('\\Seen')
+    manager.sync_state.reset_checkpoint(manager.sync_state.make_key(PROVIDER, EMAIL, 'INBOX'))
+
+    ok, logger = run_cycle(manager)
+    assert ok
+    assert len(smtp_server.received) == 1
+    assert '\\Seen' in imap_server.inbox.messages[0]['flags']
+    assert any('ya respondidos' in message for _, message in logger.lines)
+
+
+@pytest.mark.parametrize('utf8_search', [True, False])
+def test_utf8_keyword_search(servers, make_manager, utf8_search):
+    imap_server, smtp_server = servers
+    imap_server.utf8_search = utf8_search
+    imap_server.inbox.append(build_message('Mi reclamación urgente', sender='uno@example.com'))
+    imap_server.inbox.append(build_message('Mi reclamacion sin tilde', sender='dos@example.com'))
+    manager = make_manager({'caso2': 'reclamación'})
+
+    ok, _ = run_cycle(manager)
+
+    assert ok
+    assert recipients(smtp_server) == ['uno@example.com']
+    server_key = (imap_server.address[0], imap_server.address[1])
+    assert manager.search_planner.supports_utf8(server_key) is utf8_search
+
+
+def test_rules_alone_are_enough_to_monitor(servers, make_manager):
+    imap_server, smtp_server = servers
+    imap_server.inbox.append(build_message('Hola', sender='uno@example.com'))
+    imap_server.inbox.append(build_message('Hola', sender='dos@otro.org'))
+    manager = make_manager(rules=[{'case': 'caso2', 'domain': 'example.com'}])
+
+    # Mismo camino que el monitoreo: validación y ciclo del planificador de cuentas
+    service = MonitorService(manager, ConfigManager(), ListLogger())
+    assert service.validate() is None
+    assert service.run_cycle()
+    manager.send_queue.wait_empty()
+
+    assert recipients(smtp_server) == ['uno@example.com']
+
+
+def test_body_keywords_alone_are_enough_to_monitor(servers, make_manager):
+    imap_server, smtp_server = servers
+    imap_server.inbox.append(build_message('Consulta', sender='uno@example.com', body='Quiero la factura de mayo'))
+    imap_server.inbox.append(build_message('Consulta', sender='dos@example.com', body='Solo saludar'))
+    manager = make_manager(body_params={'caso1': 'factura'})
+
+    service = MonitorService(manager, ConfigManager(), ListLogger())
+    assert service.validate() is None
+    assert service.run_cycle()
+    manager.send_queue.wait_empty()
+
+    assert recipients(smtp_server) == ['uno@example.com']
+
+
+def test_data_files_live_next_to_the_config_file(servers, tmp_path, monkeypatch, make_manager):
+    imap_server, smtp_server = servers
+    imap_server.inbox.append(build_message('Mi pedido 4', sender='uno@example.com'))
+    # Como bajo systemd: el directorio de trabajo no es el de la configuración
+    workdir = tmp_path / 'cwd'
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    manager = make_manager({'caso1': 'pedido'}, outbox_file='respuestas.db')
+
+    ok, _ = run_cycle(manager)
+    manager.sync_state.flush()
+
+    assert ok
+    assert manager.outbox.db_file == str(tmp_path / 'respuestas.db')
+    assert (tmp_path / 'respuestas.db').exists()
+    assert (tmp_path / 'sync_state.json').exists()
+    assert (tmp_path / 'dedup_cache.log').exists()
+    assert list(workdir.iterdir()) == []
+
+
+def test_idle_wakes_up_when_mail_arrives(servers, make_manager):
+    imap_server, smtp_server = servers
+    manager = make_manager({'caso1': 'pedido'})
+    assert run_cycle(manager)[0]
+
+    timer = threading.Timer(0.2, imap_server.inbox.append, [build_message('Mi pedido 5', sender='uno@example.com')])
+    timer.start()
+    started = time.monotonic()
+    assert manager.wait_for_new_mail(PROVIDER, EMAIL, PASSWORD, timeout=10) is True
+    assert time.monotonic() - started < 5
+    timer.join()
+
+    # La sesión sigue sirviendo tras el IDLE
+    run_cycle(manager)
+    assert recipients(smtp_server) == ['uno@example.com']
+
+    # Sin correo nuevo vence el plazo; una parada pedida lo corta antes
+    assert manager.wait_for_new_mail(PROVIDER, EMAIL, PASSWORD, timeout=0.3) is False
+    stop = threading.Event()
+    stop.set()
+    assert manager.wait_for_new_mail(PROVIDER, EMAIL, PASSWORD, timeout=10, should_stop=stop.is_set) is False
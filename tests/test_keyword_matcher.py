@@ -0,0 +1,51 @@
+# Archivo: tests/test_keyword_matcher.py
+# Ubicación: tests
+# Descripción: Prioridades, empates y casefold del buscador Aho-Corasick de palabras clave
+
+from keyword_matcher import KeywordMatcher
+
+
+def test_lower_priority_wins_wherever_it_appears():
+    matcher = KeywordMatcher([(2, 'general', ['pedido']), (1, 'urgente', ['urgente'])])
+    assert matcher.find_best('Pedido número 5 - URGENTE') == ('urgente', 'urgente')
+    assert matcher.find_best('otro pedido') == ('general', 'pedido')
+
+
+def test_priority_ties_go_to_the_case_registered_first():
+    matcher = KeywordMatcher([(1, 'primero', ['factura']), (1, 'segundo', ['pago'])])
+    assert matcher.find_best('pago de la factura') == ('primero', 'factura')
+
+    matcher = KeywordMatcher([(1, 'segundo', ['pago']), (1, 'primero', ['factura'])])
+    assert matcher.find_best('pago de la factura') == ('segundo', 'pago')
+
+
+def test_same_keyword_in_two_cases_goes_to_the_best_ranked():
+    matcher = KeywordMatcher([(5, 'a', ['envío']), (3, 'b', ['ENVÍO']), (3, 'c', ['envío'])])
+    assert matcher.find_best('Su envío') == ('b', 'ENVÍO')
+
+
+def test_matching_ignores_case_with_casefold():
+    matcher = KeywordMatcher([(1, 'calle', ['Straße']), (1, 'sigma', ['ΟΔΟΣ'])])
+    assert matcher.find_best('nueva STRASSE') == ('calle', 'Straße')
+    # casefold iguala la sigma final y la normal, que lower() distingue
+    assert matcher.find_best('la οδος principal') == ('sigma', 'ΟΔΟΣ')
+    assert matcher.find_best('ÉNFASIS') is None
+
+
+def test_keywords_inside_other_keywords_are_found():
+    matcher = KeywordMatcher([(2, 'largo', ['reclamación']), (1, 'corto', ['mación'])])
+    # "mación" solo se alcanza por el enlace de fallo desde "reclamación"
+    assert matcher.find_best('una reclamación') == ('corto', 'mación')
+
+
+def test_find_all_reports_every_match_with_its_end_position():
+    matcher = KeywordMatcher([(1, 'a', ['he', 'hers']), (2, 'b', ['she'])])
+    assert sorted(matcher.find_all('USHERS')) == [(3, 'a', 'he'), (3, 'b', 'she'), (5, 'a', 'hers')]
+    assert matcher.find_all('nada') == []
+
+
+def test_blank_keywords_and_texts_never_match():
+    matcher = KeywordMatcher([(1, 'vacío', ['', '   ', None])])
+    assert len(matcher) == 0
+    assert matcher.find_best('cualquier cosa') is None
+    assert KeywordMatcher([(1, 'a', ['x'])]).find_best('') is None
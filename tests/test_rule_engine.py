@@ -0,0 +1,58 @@
+# Archivo: tests/test_rule_engine.py
+# Ubicación: tests
+# Descripción: Índices del motor de reglas (remitente, dominio, palabras del asunto, expresiones regulares)
+
+import time
+from rule_engine import RuleEngine, MessageRow, REGEX_BLOCK_SIZE
+
+ALIASES = {'caso1': 'case1', 'caso2': 'case2'}
+
+
+def row(subject, sender='cliente@example.com', **headers):
+    return MessageRow(dict({'from': sender, 'subject': subject}, **headers))
+
+
+def test_subject_contains_is_case_insensitive_and_respects_priority():
+    engine = RuleEngine([
+        {'name': 'general', 'case': 'caso1', 'subject_contains': ['pedido'], 'priority': 50},
+        {'name': 'urgente', 'case': 'caso2', 'subject_contains': ['URGENTE', 'prioridad'], 'priority': 10},
+        {'name': 'vip', 'case': 'caso1', 'domain': 'vip.com', 'subject_contains': 'pedido', 'priority': 5},
+    ], ALIASES)
+
+    results = engine.evaluate_batch([
+        row('Mi PEDIDO'),
+        row('Pedido urgente'),
+        row('Pedido', sender='ana@vip.com'),
+        row('Consulta', sender='ana@vip.com'),
+    ])
+
+    assert results == [('case1', 'general'), ('case2', 'urgente'), ('case1', 'vip'), None]
+
+
+def test_regex_rules_keep_priority_across_blocks():
+    rules = [{'name': f'r{index}', 'case': 'caso1', 'subject_regex': rf'^ticket-{index}$', 'priority': 100}
+             for index in range(REGEX_BLOCK_SIZE * 3)]
+    # Las referencias a grupos impiden unir el bloque: sus reglas se prueban una a una
+    rules.append({'name': 'repetida', 'case': 'caso2', 'subject_regex': r'(\w+) \1', 'priority': 1})
+    rules.append({'name': 'prioritaria', 'case': 'caso2', 'subject_regex': r'ticket-1\d\d', 'priority': 2})
+    engine = RuleEngine(rules, ALIASES)
+
+    results = engine.evaluate_batch([row('ticket-7'), row('ticket-150'), row('hola hola'), row('nada')])
+
+    assert results == [('case1', 'r7'), ('case2', 'prioritaria'), ('case2', 'repetida'), None]
+
+
+def test_generic_rules_evaluate_in_milliseconds():
+    rules = [{'name': f'r{index}', 'case': 'caso1', 'subject_contains': [f'producto{index}x', f'ref{index}x']}
+             for index in range(3000)]
+    rules += [{'name': f'e{index}', 'case': 'caso2', 'subject_regex': rf'\bexp{index}-\d+\b'} for index in range(3000)]
+    engine = RuleEngine(rules, ALIASES)
+    rows = [row(f'Consulta sobre producto{index * 3}x y otros') for index in range(1000)]
+
+    started = time.perf_counter()
+    results = engine.evaluate_batch(rows)
+    elapsed = time.perf_counter() - started
+
+    assert results[10] == ('case1', 'r30')
+    # Antes, cada regla general se probaba mensaje a mensaje: varios segundos para este lote
+    assert elapsed < 1.0
@@ -0,0 +1,87 @@
+# Archivo: tests/test_search_planner.py
+# Ubicación: tests
+# Descripción: Planes de plan_search: árboles OR, división en varios SEARCH, literales UTF-8 y respaldo en el cliente
+
+from search_planner import or_tree, plan_search, quote
+
+BASE = ['UNSEEN']
+
+
+def term(keyword):
+    return ['SUBJECT', quote(keyword)]
+
+
+def test_or_tree_of_three_terms():
+    assert or_tree([['A'], ['B'], ['C']]) == ['OR', 'A', 'OR', 'B', 'C']
+
+
+def test_or_tree_of_five_terms_is_balanced():
+    tree = or_tree([['A'], ['B'], ['C'], ['D'], ['E']])
+    assert tree == ['OR', 'OR', 'A', 'B', 'OR', 'C', 'OR', 'D', 'E']
+    # Cada OR une exactamente dos operandos: n términos necesitan n - 1
+    assert tree.count('OR') == 4
+
+
+def test_ascii_keywords_go_quoted_in_one_search():
+    plan = plan_search(BASE, ['uno', 'dos', 'tres'])
+    assert not plan.client_side
+    [command] = plan.commands
+    assert command.charset is None
+    assert command.criteria == BASE + ['OR', 'SUBJECT', '"uno"', 'OR', 'SUBJECT', '"dos"', 'SUBJECT', '"tres"']
+
+
+def test_keywords_are_split_at_max_keywords():
+    keywords = [f'k{number}' for number in range(7)]
+    plan = plan_search(BASE, keywords, max_keywords=3)
+    assert [command.criteria.count('SUBJECT') for command in plan.commands] == [3, 3, 1]
+    assert plan.commands[2].criteria == BASE + term('k6')
+    searched = [token for command in plan.commands for token in command.criteria if token.startswith('"')]
+    assert searched == [quote(keyword) for keyword in keywords]
+
+
+def test_single_literal_gives_one_search_per_utf8_keyword():
+    plan = plan_search(BASE, ['pedido', 'reclamación', 'añadir'], single_literal=True)
+    assert not plan.client_side
+    ascii_command, *utf8_commands = plan.commands
+    assert ascii_command.charset is None and ascii_command.criteria == BASE + term('pedido')
+    assert [command.charset for command in utf8_commands] == ['UTF-8', 'UTF-8']
+    assert [command.criteria for command in utf8_commands] == [
+        BASE + ['SUBJECT', 'reclamación'.encode('utf-8')],
+        BASE + ['SUBJECT', 'añadir'.encode('utf-8')],
+    ]
+
+
+def test_utf8_keywords_share_a_search_without_single_literal():
+    plan = plan_search(BASE, ['reclamación', 'añadir'])
+    [command] = plan.commands
+    assert command.charset == 'UTF-8'
+    assert command.criteria == BASE + ['OR', 'SUBJECT', 'reclamación'.encode(), 'SUBJECT', 'añadir'.encode()]
+
+
+def test_too_many_commands_fall_back_to_client_side_matching():
+    keywords = [f'palabra{number}ñ' for number in range(5)]
+    plan = plan_search(BASE, keywords, single_literal=True, max_commands=4)
+    assert plan.client_side
+    [command] = plan.commands
+    assert command.criteria == BASE and command.charset is None
+
+    # Con un comando más de margen sí se busca en el servidor
+    assert not plan_search(BASE, keywords, single_literal=True, max_commands=5).client_side
+
+
+def test_utf8_keywords_fall_back_when_the_server_rejects_utf8():
+    plan = plan_search(BASE, ['pedido', 'reclamación'], utf8_search=False)
+    assert plan.client_side
+    assert [command.criteria for command in plan.commands] == [BASE]
+
+
+def test_quotes_and_backslashes_are_escaped():
+    assert quote('di "hola"') == '"di \\"hola\\""'
+    assert quote('C:\\temp') == '"C:\\\\temp"'
+    [command] = plan_search(BASE, ['a"b\\c']).commands
+    assert command.criteria == BASE + ['SUBJECT', '"a\\"b\\\\c"']
+
+
+def test_duplicates_and_line_breaks_are_dropped():
+    [command] = plan_search(BASE, ['pedido', ' pedido ', 'mal\r\nformado', '']).commands
+    assert command.criteria == BASE + term('pedido')
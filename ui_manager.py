@@ -5,10 +5,9 @@
 import tkinter as tk
 from tkinter import ttk
 import tkinter.font as tkfont
-import threading
-import time
 from email_manager import EmailManager
-from config_manager import ConfigManager
+from monitor_service import MonitorService
+from config_manager import ConfigManager, normalize_keywords
 from logger import Logger
 
 
@@ -27,7 +26,7 @@ class UIManager:
 
         # Control del monitoreo de emails
         self.monitoring = False
-        self.monitor_thread = None
+        self.monitor_service = MonitorService(self.email_manager, self.config_manager, self.logger)
 
         # Configurar el marco principal
         self.setup_main_frame()
@@ -141,10 +140,10 @@ class UIManager:
             emails_text = cc_text.get("1.0", tk.END).strip()
             emails_list = [email.strip() for email in emails_text.split("\n") if email.strip()]
 
-            current_config = self.config_manager.load_config()
-            current_config['cc_users'] = emails_list
+            with self.config_manager.transaction() as tx:
+                tx.config['cc_users'] = emails_list
 
-            if self.config_manager.save_config(current_config):
+            if tx.saved:
                 self.logger.log("Lista de usuarios CC guardada correctamente.", level="INFO")
                 modal.destroy()
             else:
@@ -230,18 +229,21 @@ class UIManager:
         # Función para guardar la configuración desde la ventana modal
         def save_config_modal():
             # MODIFICADO: Mantener la configuración de CC al guardar
-            current_config = self.config_manager.load_config()
-            current_config.update({
+            new_values = {
                 'provider': provider_var.get(),
                 'email': email_var.get(),
                 'password': password_var.get()
-            })
+            }
 
-            if not all([current_config['provider'], current_config['email'], current_config['password']]):
+            if not all(new_values.values()):
                 self.logger.log("Error: Todos los campos son obligatorios para guardar", level="ERROR")
                 return
 
-            if self.config_manager.save_config(current_config):
+            # Una sola lectura y una sola escritura atómica para todo el formulario
+            with self.config_manager.transaction() as tx:
+                tx.config.update(new_values)
+
+            if tx.saved:
                 self.logger.log("Configuración guardada correctamente", level="INFO")
                 modal.destroy()  # Cerrar la ventana modal
             else:
@@ -289,15 +291,15 @@ class UIManager:
         params_frame = ttk.Frame(modal, padding="10")
         params_frame.pack(fill=tk.BOTH, expand=True)
 
-        # Caso 1
+        # Caso 1 (varias palabras clave se separan con ';')
         ttk.Label(params_frame, text="Caso 1:").grid(row=0, column=0, sticky="w", padx=5, pady=5)
-        caso1_var = tk.StringVar(value=search_params.get('caso1', ''))
+        caso1_var = tk.StringVar(value=self._format_keywords(search_params.get('caso1', '')))
         caso1_entry = ttk.Entry(params_frame, textvariable=caso1_var)
         caso1_entry.grid(row=0, column=1, sticky="ew", padx=5, pady=5)
 
         # Caso 2
         ttk.Label(params_frame, text="Caso 2:").grid(row=1, column=0, sticky="w", padx=5, pady=5)
-        caso2_var = tk.StringVar(value=search_params.get('caso2', ''))
+        caso2_var = tk.StringVar(value=self._format_keywords(search_params.get('caso2', '')))
         caso2_entry = ttk.Entry(params_frame, textvariable=caso2_var)
         caso2_entry.grid(row=1, column=1, sticky="ew", padx=5, pady=5)
 
@@ -307,16 +309,14 @@ class UIManager:
 
         # Función para guardar parámetros
         def save_search_params():
-            # Cargar configuración actual
-            current_config = self.config_manager.load_config()
-
-            # Actualizar solo los parámetros de búsqueda
-            current_config['search_params'] = {
-                'caso1': caso1_var.get().strip(),
-                'caso2': caso2_var.get().strip()
-            }
-
-            if self.config_manager.save_config(current_config):
+            # Actualizar solo los parámetros de búsqueda de estos casos, conservando los de otros casos
+            with self.config_manager.transaction() as tx:
+                tx.config.setdefault('search_params', {}).update({
+                    'caso1': self._parse_keywords(caso1_var.get()),
+                    'caso2': self._parse_keywords(caso2_var.get())
+                })
+
+            if tx.saved:
                 self.logger.log("Parámetros de búsqueda guardados correctamente", level="INFO")
                 modal.destroy()
             else:
@@ -334,19 +334,26 @@ class UIManager:
         button_frame.columnconfigure(0, weight=1)
         button_frame.columnconfigure(1, weight=1)
 
+    @staticmethod
+    def _format_keywords(value):
+        """Muestra una o varias palabras clave en un único campo separadas por ';'"""
+        return "; ".join(normalize_keywords(value))
+
+    @staticmethod
+    def _parse_keywords(text):
+        """Convierte el texto del campo en una palabra clave o en una lista si hay varias"""
+        keywords = normalize_keywords(text.split(';'))
+        if len(keywords) == 1:
+            return keywords[0]
+        return keywords or ''
+
     def toggle_monitoring(self):
         """Inicia o detiene el monitoreo de emails"""
         if not self.monitoring:
-            # Verificar que hay configuración de correo
-            config = self.config_manager.load_config()
-            if not all([config.get('provider'), config.get('email'), config.get('password')]):
-                self.logger.log("Error: Configure primero los datos de correo", level="ERROR")
-                return
-
-            # Verificar que hay parámetros de búsqueda
-            search_params = config.get('search_params', {})
-            if not any([search_params.get('caso1', '').strip(), search_params.get('caso2', '').strip()]):
-                self.logger.log("Error: Configure primero los parámetros de búsqueda", level="ERROR")
+            # Verificar que hay configuración de correo y parámetros de búsqueda
+            error = self.monitor_service.validate()
+            if error:
+                self.logger.log(f"Error: {error}", level="ERROR")
                 return
 
             # Iniciar monitoreo
@@ -354,9 +361,8 @@ class UIManager:
             self.monitor_button.config(text="Detener Monitoreo")
             self.status_label.config(text="Estado: Monitoreando", foreground="green")
 
-            # Crear y iniciar hilo de monitoreo
-            self.monitor_thread = threading.Thread(target=self.monitor_emails, daemon=True)
-            self.monitor_thread.start()
+            # Iniciar el hilo de monitoreo
+            self.monitor_service.start()
 
             self.logger.log("Monitoreo de emails iniciado", level="INFO")
         else:
@@ -364,45 +370,9 @@ class UIManager:
             self.monitoring = False
             self.monitor_button.config(text="Iniciar Monitoreo")
             self.status_label.config(text="Estado: Detenido", foreground="red")
+            self.monitor_service.stop()
             self.logger.log("Monitoreo de emails detenido", level="INFO")
 
-    def monitor_emails(self):
-        """Función que se ejecuta en un hilo separado para monitorear emails"""
-        while self.monitoring:
-            try:
-                # Cargar configuración actual
-                config = self.config_manager.load_config()
-                search_params = config.get('search_params', {})
-                # --- MODIFICADO: Cargar lista de CC ---
-                cc_list = config.get('cc_users', [])
-                # --- FIN MODIFICADO ---
-
-                # Obtener títulos a buscar
-                search_titles = []
-                if search_params.get('caso1', '').strip():
-                    search_titles.append(search_params['caso1'].strip())
-                if search_params.get('caso2', '').strip():
-                    search_titles.append(search_params['caso2'].strip())
-
-                if search_titles:
-                    # --- MODIFICADO: Pasar la lista de CC al procesador de emails ---
-                    self.email_manager.check_and_process_emails(
-                        config['provider'],
-                        config['email'],
-                        config['password'],
-                        search_titles,
-                        self.logger,
-                        cc_list  # Nuevo argumento
-                    )
-                    # --- FIN MODIFICADO ---
-
-                # Esperar 30 segundos antes de la siguiente verificación
-                time.sleep(30)
-
-            except Exception as e:
-                self.logger.log(f"Error en el monitoreo: {str(e)}", level="ERROR")
-                time.sleep(60)  # Esperar más tiempo si hay error
-
     def setup_bottom_right_panel(self):
         """Configura el panel inferior derecho para logs"""
         self.bottom_right_panel = ttk.LabelFrame(self.main_frame, text="Log del Sistema")